@@ -1,47 +1,245 @@
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
-from langchain.docstore.document import Document
-from typing import List, Dict, Optional
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+from langchain.chains.question_answering.stuff_prompt import PROMPT_SELECTOR
+from typing import IO, AsyncIterator, List, Dict, Optional, Tuple
 import os
+import threading
+import time
 from pathlib import Path
 import json
 from dotenv import load_dotenv
+from core.embedding_cache import cached_embeddings_from_env
+from core.bm25 import BM25Index
+from core.cache import content_hash
+from core.executor import run_blocking
+from core.facets import FacetIndex, MetadataFilters, chroma_where
+from core.ingestion import IngestReport, IngestionPipeline, iter_json_documents
+from core.llm_backend import chat_model, embedding_model
+from core.metrics import InstrumentedEmbeddings, run_config
+from core.retrieval import HybridRetriever, reranker_from_env
+from core.semantic_cache import semantic_cache_from_env
+from core.sessions import session_store_from_env
+from core.singleflight import SingleFlight, normalize_text
+from core.vector_index import (
+    MmapVectorIndex, MmapVectorStore, WriterLock, append_index, build_index, current_generation, vector_index_from_env
+)
 load_dotenv()
 
 class AskGTMAgent:
-    def __init__(self, persist_directory: str = "./chroma_db"):
-        self.llm = ChatOpenAI(
+    def __init__(self, persist_directory: str = "./chroma_db", llm=None, embeddings=None, answer_cache=None):
+        self.llm = llm or chat_model(
             model="gpt-4o-mini",
-            temperature=0.2
+            temperature=0.2,
+            # Streamed answers report token usage on their last chunk
+            stream_usage=True
+        )
+        # Identical texts are embedded once; ASKGTM_EMBEDDING_CACHE=off disables the cache.
+        # Only calls that miss the cache reach the provider and are timed.
+        self.embeddings = cached_embeddings_from_env(
+            "ASKGTM",
+            InstrumentedEmbeddings(embeddings or embedding_model("text-embedding-3-small"))
         )
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
         self.persist_directory = persist_directory
         self.vectorstore = None
         self.conversation_chain = None
-        self.chat_history = []
+        
+        # ASKGTM_VECTOR_STORE=mmap serves searches from a memory-mapped snapshot of Chroma shared by all workers.
+        # Writes go to Chroma one process at a time (writer_lock), each publishing a new snapshot generation
+        # that the other workers switch to on their next request. Plain Chroma is only safe in one worker.
+        self.vector_index = vector_index_from_env("ASKGTM")
+        if not self.vector_index and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+            raise RuntimeError("Workers cannot share a Chroma directory: set ASKGTM_VECTOR_STORE=mmap when WEB_CONCURRENCY > 1")
+        self.writer_lock = WriterLock(self.vector_index[0]) if self.vector_index else None
+        self._chroma = None
+        self._ingestion = None
+        self._chroma_lock = threading.Lock()
+        self._generation_lock = threading.Lock()
+        
+        # Per-session, bounded conversation history (the chain itself is stateless and shared)
+        self.sessions = session_store_from_env("ASKGTM")
+        
+        # Semantic cache of recent answers; ASKGTM_SEMANTIC_CACHE=off disables it
+        self.answer_cache = answer_cache if answer_cache is not None else semantic_cache_from_env("ASKGTM")
+        
+        # Identical questions asked at the same time (same history and filters) share one answer
+        self.inflight = SingleFlight("askgtm")
         
         # Initialize or load existing vectorstore
         self._initialize_vectorstore()
     
     def _initialize_vectorstore(self):
-        """Initialize ChromaDB vectorstore"""
-        if os.path.exists(self.persist_directory):
-            # Load existing vectorstore
-            self.vectorstore = Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embeddings
-            )
+        """Initialize ChromaDB vectorstore, or the memory-mapped index over it"""
+        if self.vector_index:
+            directory, dtype = self.vector_index
+            # First start of the first worker: snapshot whatever Chroma holds
+            if current_generation(directory) is None:
+                with self.writer_lock:
+                    if current_generation(directory) is None:
+                        chroma = self._open_chroma()
+                        try:
+                            build_index(chroma._collection, directory, dtype)
+                        finally:
+                            self._close_chroma(chroma)
+            self.vectorstore = MmapVectorStore(MmapVectorIndex.open(directory), self.embeddings)
         else:
-            # Create new vectorstore with sample docs
-            self.vectorstore = Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embeddings
-            )
+            self.vectorstore = self._chroma_store()
+        self._build_lexical_index()
+        
+        # Seed an empty store with sample docs (also covers a first start whose seeding failed midway)
+        if self._stored_count() == 0:
             self._add_sample_documents()
     
+    def _chroma_store(self) -> Chroma:
+        """The Chroma collection this (single) worker searches and writes"""
+        with self._chroma_lock:
+            if self._chroma is None:
+                self._chroma = Chroma(
+                    persist_directory=self.persist_directory,
+                    embedding_function=self.embeddings
+                )
+            return self._chroma
+    
+    def _open_chroma(self) -> Chroma:
+        """A Chroma client for one locked write in mmap mode, seeing everything written by any worker so far"""
+        return Chroma(persist_directory=self.persist_directory, embedding_function=self.embeddings)
+    
+    @staticmethod
+    def _close_chroma(chroma: Chroma):
+        # Chroma caches one client per directory, with its HNSW index in memory: drop it so the
+        # next write reloads the collection from disk, including what other workers wrote since
+        chroma._client._system.stop()
+        chroma._client.clear_system_cache()
+    
+    def _stored_count(self) -> int:
+        if self.vector_index:
+            return self.vectorstore.count()
+        return self.vectorstore._collection.count()
+    
+    def _build_lexical_index(self):
+        """Load existing chunks into the in-process BM25 and facet indexes"""
+        self.bm25 = BM25Index()
+        self.facets = FacetIndex()
+        if self.vector_index:
+            for ids, texts, metadatas in self.vectorstore.index.iter_chunks():
+                self._index_chunks(ids, texts, metadatas)
+            return
+        stored = self.vectorstore._collection.get(include=["documents", "metadatas"])
+        self._index_chunks(stored["ids"], stored["documents"], stored["metadatas"])
+    
+    def _index_chunks(
+        self,
+        ids: List[str],
+        texts: List[str],
+        metadatas: Optional[List[dict]],
+        vectors: Optional[List[List[float]]] = None
+    ):
+        """Keep the side indexes (and the memory-mapped store's pending chunks) in sync with chunks written to Chroma"""
+        added = self.bm25.add(ids, texts, metadatas)
+        self.facets.add([ids[i] for i in added], [metadatas[i] if metadatas else None for i in added])
+        if vectors is not None and self.vector_index and added:
+            self.vectorstore.add_vectors(
+                [ids[i] for i in added], [texts[i] for i in added],
+                [metadatas[i] if metadatas else None for i in added], [vectors[i] for i in added]
+            )
+    
+    @property
+    def ingestion(self) -> IngestionPipeline:
+        """Batched, content-deduplicated writer for Chroma (keeps BM25 in sync), built on first use (single worker)"""
+        if self._ingestion is None:
+            chroma = self._chroma_store()
+            self._ingestion = IngestionPipeline(
+                chroma,
+                self.embeddings,
+                persist=chroma.persist,
+                on_write=self._index_chunks
+            )
+        return self._ingestion
+    
+    def _begin_write(self) -> IngestionPipeline:
+        """Blocking: exclusive write access; in mmap mode the writer lock and a freshly opened Chroma"""
+        if not self.vector_index:
+            return self.ingestion
+        self.writer_lock.acquire()
+        try:
+            chroma = self._open_chroma()
+            return IngestionPipeline(chroma, self.embeddings, persist=chroma.persist, on_write=self._index_chunks)
+        except BaseException:
+            self.writer_lock.release()
+            raise
+    
+    def _end_write(self, ingestion: IngestionPipeline, report: Optional[IngestReport]):
+        """Blocking: publish what was embedded as the next index generation, then close Chroma and release the lock.
+        
+        The generation adds a segment with just the chunks this process wrote that none holds yet, including
+        those of an earlier failed write. If Chroma holds chunks no generation has (another worker failed
+        before publishing), it is snapshotted whole instead.
+        """
+        if not self.vector_index:
+            return
+        try:
+            directory, dtype = self.vector_index
+            # Other workers' generations first, so only this process's unpublished chunks are pending
+            self.refresh()
+            collection = ingestion.vectorstore._collection
+            ids, texts, metadatas, vectors = self.vectorstore.pending()
+            if self.vectorstore.index.count + len(ids) != collection.count():
+                build_index(collection, directory, dtype)
+            elif ids:
+                append_index(directory, ids, texts, metadatas, vectors, dtype, source=collection.name)
+        finally:
+            ingestion.close()
+            self._close_chroma(ingestion.vectorstore)
+            self.writer_lock.release()
+        self.refresh()
+    
+    def _use_generation(self, index: MmapVectorIndex):
+        """Search a newer index generation, adding the chunks first published since this process's to BM25 and facets"""
+        with self._generation_lock:
+            previous = self.vectorstore.index
+            if index.generation <= previous.generation:
+                index.close()
+                return
+            self.vectorstore.use_index(index)
+            for ids, texts, metadatas in index.iter_chunks(skip=previous.covered):
+                self._index_chunks(ids, texts, metadatas)
+    
+    def _stale(self) -> bool:
+        """Whether another worker published a newer generation: one small file read"""
+        if not self.vector_index:
+            return False
+        return (current_generation(self.vector_index[0]) or 0) > self.vectorstore.index.generation
+    
+    def refresh(self) -> bool:
+        """Switch to the latest generation published by any worker; False if already on it"""
+        if not self._stale():
+            return False
+        self._use_generation(MmapVectorIndex.open(self.vector_index[0]))
+        # Cached answers may no longer reflect the knowledge base
+        if self.answer_cache:
+            self.answer_cache.invalidate()
+        return True
+    
+    async def _refresh_async(self):
+        if self._stale():
+            await run_blocking(self.refresh)
+    
+    def _build_retriever(self):
+        """Hybrid BM25 + vector retriever, or plain similarity with ASKGTM_RETRIEVER=vector"""
+        if os.getenv("ASKGTM_RETRIEVER", "hybrid").lower() == "vector":
+            return self.vectorstore.as_retriever(
+                search_type="similarity",
+                search_kwargs={"k": 4}
+            )
+        
+        return HybridRetriever(
+            vectorstore=self.vectorstore,
+            bm25=self.bm25,
+            k=4,
+            reranker=reranker_from_env("ASKGTM")
+        )
+    
     def _add_sample_documents(self):
         """Add sample GTM knowledge documents"""
         sample_docs = [
@@ -188,86 +386,260 @@ class AskGTMAgent:
             }
         ]
         
-        documents = [
-            Document(page_content=doc["content"], metadata=doc["metadata"])
-            for doc in sample_docs
-        ]
-        
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len
+        self.add_documents(
+            [doc["content"] for doc in sample_docs],
+            [doc["metadata"] for doc in sample_docs]
         )
-        
-        splits = text_splitter.split_documents(documents)
-        self.vectorstore.add_documents(splits)
-        self.vectorstore.persist()
     
-    def add_documents(self, texts: List[str], metadatas: Optional[List[dict]] = None):
+    def add_documents(self, texts: List[str], metadatas: Optional[List[dict]] = None) -> IngestReport:
         """Add new documents to knowledge base"""
-        documents = [
-            Document(page_content=text, metadata=meta or {})
-            for text, meta in zip(texts, metadatas or [{}] * len(texts))
-        ]
-        
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
-        
-        splits = text_splitter.split_documents(documents)
-        self.vectorstore.add_documents(splits)
-        self.vectorstore.persist()
+        ingestion, report = self._begin_write(), None
+        try:
+            report = ingestion.ingest(zip(texts, metadatas or [{}] * len(texts)))
+        finally:
+            self._end_write(ingestion, report)
+        self._knowledge_base_changed(report)
+        return report
+    
+    async def add_documents_async(self, texts: List[str], metadatas: Optional[List[dict]] = None) -> IngestReport:
+        """Add new documents without blocking the event loop"""
+        ingestion, report = await run_blocking(self._begin_write), None
+        try:
+            report = await ingestion.aingest(zip(texts, metadatas or [{}] * len(texts)))
+        finally:
+            await run_blocking(self._end_write, ingestion, report)
+        self._knowledge_base_changed(report)
+        return report
+    
+    async def ingest_file(self, stream: IO[bytes]) -> IngestReport:
+        """Stream a JSON array or JSONL file of {"content", "metadata"} documents into the knowledge base"""
+        ingestion, report = await run_blocking(self._begin_write), None
+        try:
+            report = await ingestion.aingest(iter_json_documents(stream))
+        finally:
+            await run_blocking(self._end_write, ingestion, report)
+        self._knowledge_base_changed(report)
+        return report
+    
+    def _knowledge_base_changed(self, report: IngestReport):
+        # Cached answers may no longer reflect the knowledge base
+        if report.chunks_embedded and self.answer_cache:
+            self.answer_cache.invalidate()
     
     def setup_conversation_chain(self):
         """Setup conversational retrieval chain"""
-        memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True,
-            output_key="answer"
-        )
-        
         self.conversation_chain = ConversationalRetrievalChain.from_llm(
-            llm=self.llm,
-            retriever=self.vectorstore.as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": 4}
-            ),
-            memory=memory,
+            llm=self.llm.with_config(tags=["stage:answer"]),
+            condense_question_llm=self.llm.with_config(tags=["stage:condense"]),
+            retriever=self._build_retriever(),
             return_source_documents=True,
             verbose=False
         )
     
-    def ask(self, question: str) -> Dict:
-        """Ask a question and get answer with sources"""
+    def _retriever_for(self, filters: Optional[MetadataFilters]):
+        """The chain's retriever, narrowed to chunks whose metadata matches the filters"""
+        retriever = self.conversation_chain.retriever
+        if not filters:
+            return retriever
+        if isinstance(retriever, HybridRetriever):
+            return retriever.model_copy(update={"filters": filters})
+        return retriever.model_copy(update={"search_kwargs": {**retriever.search_kwargs, "filter": chroma_where(filters)}})
+    
+    def _chain_for(self, filters: Optional[MetadataFilters]):
+        if not filters:
+            return self.conversation_chain
+        return self.conversation_chain.model_copy(update={"retriever": self._retriever_for(filters)})
+    
+    def ask(self, question: str, session_id: Optional[str] = None, filters: Optional[MetadataFilters] = None) -> Dict:
+        """Ask a question and get answer with sources, optionally searching only chunks matching metadata filters"""
+        self.refresh()
         if not self.conversation_chain:
             self.setup_conversation_chain()
         
-        result = self.conversation_chain.invoke({"question": question})
+        session = self.sessions.get(session_id)
+        cache = self._answer_cache_for(session.history(), filters)
+        
+        if cache:
+            vector = self.embeddings.embed_query(question)
+            cached = self._cached_answer(session, question, vector)
+            if cached:
+                return cached
+            generation = cache.generation
+        
+        result = self._chain_for(filters).invoke({
+            "question": question,
+            "chat_history": session.history()
+        }, config=run_config())
+        response = self._format_response(result)
+        
+        if cache:
+            cache.store(vector, response, generation)
+        
+        session.add_turn(question, response["answer"])
+        return {**response, "session_id": session.session_id}
+    
+    async def ask_async(
+        self,
+        question: str,
+        session_id: Optional[str] = None,
+        filters: Optional[MetadataFilters] = None
+    ) -> Dict:
+        """Ask a question without blocking the event loop"""
+        await self._refresh_async()
+        if not self.conversation_chain:
+            self.setup_conversation_chain()
+        
+        session = self.sessions.get(session_id)
+        history = session.history()
+        # Requests arriving after a new generation was published do not join answers retrieved before it
+        generation = self.vectorstore.index.generation if self.vector_index else None
+        key = content_hash(normalize_text(question).casefold(), history, filters, generation)
+        response = await self.inflight.do(key, lambda: self._answer_async(question, history, filters))
+        
+        session.add_turn(question, response["answer"])
+        return {**response, "session_id": session.session_id}
+    
+    async def _answer_async(self, question: str, history: List[Tuple[str, str]], filters: Optional[MetadataFilters]) -> Dict:
+        """Answer from the semantic cache or the chain, without touching any session"""
+        cache = self._answer_cache_for(history, filters)
+        
+        if cache:
+            vector = await self.embeddings.aembed_query(question)
+            cached = cache.lookup(vector)
+            if cached is not None:
+                return {**cached, "cached": True}
+            generation = cache.generation
+        
+        result = await self._chain_for(filters).ainvoke({
+            "question": question,
+            "chat_history": history
+        }, config=run_config())
+        response = self._format_response(result)
+        
+        if cache:
+            cache.store(vector, response, generation)
+        return response
+    
+    def _answer_cache_for(self, history: List[Tuple[str, str]], filters: Optional[MetadataFilters]):
+        """The semantic cache if it applies: cached answers are for standalone questions without filters,
+        since a follow-up's answer depends on its session's history"""
+        return self.answer_cache if not filters and not history else None
+    
+    def _cached_answer(self, session, question: str, vector: List[float]) -> Optional[Dict]:
+        """Answer from the semantic cache, recording the turn in the session history"""
+        cached = self.answer_cache.lookup(vector)
+        if cached is None:
+            return None
         
-        # Format response
+        session.add_turn(question, cached["answer"])
+        return {**cached, "cached": True, "session_id": session.session_id}
+    
+    async def astream_ask(
+        self,
+        question: str,
+        session_id: Optional[str] = None,
+        filters: Optional[MetadataFilters] = None
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """Answer as a stream of (event, data): "sources" once retrieval finishes, "token" per LLM chunk, then "done" with timings.
+        
+        Mirrors the ConversationalRetrievalChain steps (condense, retrieve,
+        stuff-and-answer) so the answer LLM call can be streamed.
+        """
+        await self._refresh_async()
+        if not self.conversation_chain:
+            self.setup_conversation_chain()
+        
+        started = time.perf_counter()
+        elapsed_ms = lambda: round((time.perf_counter() - started) * 1000, 1)
+        session = self.sessions.get(session_id)
+        cache = self._answer_cache_for(session.history(), filters)
+        
+        if cache:
+            vector = await self.embeddings.aembed_query(question)
+            cached = self._cached_answer(session, question, vector)
+            if cached:
+                yield "sources", {"sources": cached["sources"]}
+                yield "token", {"text": cached["answer"]}
+                yield "done", {"session_id": session.session_id, "cached": True, "timing_ms": {"total": elapsed_ms()}}
+                return
+            generation = cache.generation
+        
+        # Rephrase follow-ups into a standalone question, as the chain does
+        standalone = question
+        history = _get_chat_history(session.history())
+        if history:
+            condensed = await self.llm.ainvoke(
+                CONDENSE_QUESTION_PROMPT.format(chat_history=history, question=question),
+                config=run_config("condense")
+            )
+            standalone = condensed.content
+        
+        docs = await self._retriever_for(filters).ainvoke(standalone, config=run_config("retrieve"))
+        sources = self._format_sources(docs)
+        retrieval_ms = elapsed_ms()
+        yield "sources", {"sources": sources}
+        
+        prompt = PROMPT_SELECTOR.get_prompt(self.llm).format_prompt(
+            context="\n\n".join(doc.page_content for doc in docs),
+            question=standalone
+        )
+        answer = []
+        first_token_ms = None
+        async for chunk in self.llm.astream(prompt.to_messages(), config=run_config("answer")):
+            if not chunk.content:
+                continue
+            if first_token_ms is None:
+                first_token_ms = elapsed_ms()
+            answer.append(chunk.content)
+            yield "token", {"text": chunk.content}
+        
+        response = {"answer": "".join(answer), "sources": sources}
+        if cache:
+            cache.store(vector, response, generation)
+        session.add_turn(question, response["answer"])
+        
+        yield "done", {
+            "session_id": session.session_id,
+            "cached": False,
+            "timing_ms": {"retrieval": retrieval_ms, "first_token": first_token_ms, "total": elapsed_ms()}
+        }
+    
+    def _format_response(self, result: Dict) -> Dict:
+        """Format chain output as answer with sources"""
         response = {
             "answer": result["answer"],
-            "sources": [
-                {
-                    "content": doc.page_content[:200] + "...",
-                    "source": doc.metadata.get("source", "unknown"),
-                    "category": doc.metadata.get("category", "general")
-                }
-                for doc in result["source_documents"]
-            ]
+            "sources": self._format_sources(result["source_documents"])
         }
         
         return response
     
-    def reset_conversation(self):
-        """Reset conversation history"""
-        self.chat_history = []
-        self.conversation_chain = None
+    def _format_sources(self, docs) -> List[Dict]:
+        """Source citations for retrieved chunks"""
+        return [
+            {
+                "content": doc.page_content[:200] + "...",
+                "source": doc.metadata.get("source", "unknown"),
+                "category": doc.metadata.get("category", "general")
+            }
+            for doc in docs
+        ]
+    
+    def reset_conversation(self, session_id: str) -> bool:
+        """Reset one session's conversation history"""
+        return self.sessions.reset(session_id)
     
     def get_stats(self) -> Dict:
-        """Get knowledge base statistics"""
+        """Get knowledge base statistics (from counters kept up to date on write, not a collection scan)"""
+        self.refresh()
+        index = self.facets.snapshot()
         return {
-            "total_documents": 8,
-            "categories": ["sales", "product", "customer-success", "technical"]
+            "total_documents": index["documents"],
+            "total_chunks": index["chunks"],
+            "categories": list(index["facets"]["category"]),
+            "facets": index["facets"],
+            "answer_cache": self.answer_cache.stats() if self.answer_cache else None,
+            "active_sessions": len(self.sessions),
+            "embedding_cache": self.embeddings.stats() if hasattr(self.embeddings, "stats") else None,
+            "coalescing": self.inflight.stats(),
+            "vector_store": self.vectorstore.stats() if self.vector_index else {"backend": "chroma"}
         }
\ No newline at end of file
@@ -0,0 +1,124 @@
+import os
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+# Baseline close probability by pipeline stage (lowercased)
+STAGE_BASELINES = {
+    "prospecting": 10, "lead": 10, "qualification": 20, "discovery": 20,
+    "demo": 35, "evaluation": 40, "proposal": 50, "negotiation": 70,
+    "contract": 85, "closed won": 100, "closed lost": 0,
+}
+UNKNOWN_STAGE_BASELINE = 30
+
+TRUTHY = {"true": 1.0, "yes": 1.0, "y": 1.0, "1": 1.0, "1.0": 1.0,
+          "false": 0.0, "no": 0.0, "n": 0.0, "0": 0.0, "0.0": 0.0}
+
+# Probability at or above which a deal is Low risk, and below which it is High risk
+LOW_RISK_AT = 65
+HIGH_RISK_BELOW = 40
+
+
+@dataclass
+class EscalationPolicy:
+    """Deals whose baseline falls inside [low, high], or whose band is wider than max_band, go to the LLM"""
+    low: float = 40
+    high: float = 65
+    max_band: float = 20
+
+    @classmethod
+    def from_env(cls) -> "EscalationPolicy":
+        return cls(
+            low=float(os.getenv("DEALSENSE_ESCALATE_LOW", "40")),
+            high=float(os.getenv("DEALSENSE_ESCALATE_HIGH", "65")),
+            max_band=float(os.getenv("DEALSENSE_ESCALATE_MAX_BAND", "20"))
+        )
+
+
+def _flag(df: pd.DataFrame, column: str) -> pd.Series:
+    """Yes/No style column as 1.0 / 0.0, NaN when missing or unparseable"""
+    if column not in df.columns:
+        return pd.Series(np.nan, index=df.index)
+    values = df[column]
+    if values.dtype == bool:
+        return values.astype(float)
+    return values.astype(str).str.strip().str.lower().map(TRUTHY)
+
+
+def _number(df: pd.DataFrame, column: str) -> pd.Series:
+    if column not in df.columns:
+        return pd.Series(np.nan, index=df.index)
+    return pd.to_numeric(df[column], errors="coerce")
+
+
+def prescore(df: pd.DataFrame, policy: EscalationPolicy) -> pd.DataFrame:
+    """Deterministic baseline for every deal, computed column-wise over the whole frame.
+
+    Returns probability, band (half-width of the confidence interval),
+    risk_level and escalate, aligned with df's index.
+    """
+    stage = df["stage"].astype(str).str.strip().str.lower() if "stage" in df.columns else pd.Series("", index=df.index)
+    baseline = stage.map(STAGE_BASELINES)
+    unknown_stage = baseline.isna()
+    probability = baseline.fillna(UNKNOWN_STAGE_BASELINE).to_numpy(dtype=float)
+
+    dm = _flag(df, "decision_maker_engaged").to_numpy()
+    budget = _flag(df, "budget_confirmed").to_numpy()
+    competitor = _flag(df, "has_competitor").to_numpy()
+    last_contact = _number(df, "last_contact_days").to_numpy()
+    age = _number(df, "days_in_pipeline").to_numpy()
+
+    probability = probability + np.where(dm == 1, 10, np.where(dm == 0, -10, 0))
+    probability += np.where(budget == 1, 10, np.where(budget == 0, -10, 0))
+    probability += np.where(competitor == 1, -8, 0)
+    probability += np.select([last_contact > 30, last_contact > 14, last_contact <= 7], [-20, -10, 5], 0)
+    probability += np.select([age > 120, age > 90], [-15, -8], 0)
+
+    closed = stage.isin(["closed won", "closed lost"]).to_numpy()
+    probability = np.where(closed, baseline.fillna(0).to_numpy(), np.clip(probability, 1, 99))
+
+    # Every missing signal widens the band; an unrecognized stage widens it most
+    missing = sum(np.isnan(column).astype(int) for column in (dm, budget, competitor, last_contact, age))
+    band = 10 + 5 * missing + 10 * unknown_stage.to_numpy()
+    band = np.where(closed, 0, band)
+
+    risk = np.where(probability >= LOW_RISK_AT, "Low", np.where(probability < HIGH_RISK_BELOW, "High", "Medium"))
+    escalate = ~closed & (((probability >= policy.low) & (probability <= policy.high)) | (band > policy.max_band))
+
+    return pd.DataFrame(
+        {"probability": probability, "band": band, "risk_level": risk, "escalate": escalate},
+        index=df.index
+    )
+
+
+def rules_reasoning(deal: dict, probability: float, band: float) -> str:
+    """Plain-language explanation of a rules-based score"""
+    parts = [f"Rules-based score of {probability:.0f}% (+/-{band:.0f}) from the {deal.get('stage', 'unknown')} stage baseline"]
+    if TRUTHY.get(str(deal.get("decision_maker_engaged")).strip().lower()) == 0:
+        parts.append("no decision maker engaged yet")
+    if TRUTHY.get(str(deal.get("budget_confirmed")).strip().lower()) == 0:
+        parts.append("budget isn't confirmed")
+    if TRUTHY.get(str(deal.get("has_competitor")).strip().lower()) == 1:
+        parts.append("there's a competitor in the mix")
+    contact = pd.to_numeric(deal.get("last_contact_days"), errors="coerce")
+    if contact == contact and contact > 14:
+        parts.append(f"it's been {contact:.0f} days since last contact")
+    return ", ".join(parts) + "."
+
+
+def rules_next_actions(deal: dict) -> List[str]:
+    """Three next actions driven by the weakest signals"""
+    actions = []
+    if TRUTHY.get(str(deal.get("decision_maker_engaged")).strip().lower()) != 1:
+        actions.append("Get the economic buyer on the next call")
+    if TRUTHY.get(str(deal.get("budget_confirmed")).strip().lower()) != 1:
+        actions.append("Confirm budget and who signs off on it")
+    contact = pd.to_numeric(deal.get("last_contact_days"), errors="coerce")
+    if contact != contact or contact > 14:
+        actions.append("Reach out this week with something useful, not a check-in")
+    if TRUTHY.get(str(deal.get("has_competitor")).strip().lower()) == 1:
+        actions.append("Send a side-by-side against the competitor")
+    actions += ["Agree on a mutual close plan with dates", "Line up a reference customer", "Recap value and next steps in writing"]
+    return actions[:3]
@@ -0,0 +1,300 @@
+import asyncio
+import os
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pydantic import BaseModel, Field
+
+from agents.dealsense import DEAL_PROMPT_FIELDS, PIPELINE_ID_PATTERN, DealScore, DealSenseAgent
+from core.cache import CacheStats
+from core.executor import run_blocking
+
+# One Parquet file per pipeline holding its last scored snapshot
+SNAPSHOT_DIR = os.getenv("DEALSENSE_SNAPSHOT_DIR", "./dealsense_snapshots")
+
+SNAPSHOT_SCHEMA = pa.schema([
+    ("deal_id", pa.string()),
+    ("fingerprint", pa.int64()),
+    ("company_name", pa.string()),
+    ("deal_value", pa.float64()),
+    ("close_probability", pa.float64()),
+    ("risk_level", pa.string()),
+    ("reasoning", pa.string()),
+    ("next_actions", pa.list_(pa.string())),
+])
+
+
+class DealChange(BaseModel):
+    """A deal that was re-scored, with its previous score when it had one"""
+    deal_id: str
+    company_name: str
+    status: str = Field(description="new, changed, or rescored (the scoring setup changed since the snapshot)")
+    close_probability: float
+    previous_probability: Optional[float] = None
+    probability_delta: Optional[float] = None
+    risk_level: str
+    previous_risk_level: Optional[str] = None
+
+
+class PipelineDelta(BaseModel):
+    """What changed between a pipeline upload and its previous snapshot"""
+    pipeline_id: str
+    total: int = Field(description="Deals in this upload")
+    new: int
+    changed: int
+    unchanged: int = Field(description="Deals whose score was carried forward without re-scoring")
+    removed: List[str] = Field(description="deal_ids in the previous snapshot but not in this upload")
+    changes: List[DealChange] = Field(description="Re-scored deals, largest probability moves first, new deals last")
+    moved_to_high_risk: List[DealChange] = Field(description="Previously scored deals that are now High risk")
+    weighted_forecast: float = Field(description="Sum of deal_value x close probability over this upload")
+    previous_weighted_forecast: float
+    weighted_forecast_change: float
+    scores: List[DealScore] = Field(description="Full scores for the re-scored deals")
+
+
+@dataclass
+class Snapshot:
+    frame: pd.DataFrame
+    scorer: str
+    updated_at: float
+
+
+def deal_ids(deals_df: pd.DataFrame) -> pd.Series:
+    """deal_id column as stripped strings; raises ValueError if it is missing, blank or repeated"""
+    if "deal_id" not in deals_df.columns:
+        raise ValueError("Pipeline uploads need a deal_id column")
+    ids = deals_df["deal_id"].astype(str).str.strip()
+    if (deals_df["deal_id"].isna() | (ids == "")).any():
+        raise ValueError("Every deal needs a deal_id")
+    duplicated = ids[ids.duplicated()]
+    if len(duplicated):
+        raise ValueError(f"Duplicate deal_ids: {duplicated.unique()[:10].tolist()}")
+    return ids
+
+
+def deal_fingerprints(deals_df: pd.DataFrame) -> np.ndarray:
+    """Hash per row of the fields that feed the score, normalized so 50000 == 50000.0 and " Acme" == "Acme" """
+    columns = {}
+    for field in DEAL_PROMPT_FIELDS:
+        if field not in deals_df.columns:
+            columns[field] = pd.Series(np.nan, index=deals_df.index)
+        elif pd.api.types.is_bool_dtype(deals_df[field]) or pd.api.types.is_numeric_dtype(deals_df[field]):
+            columns[field] = deals_df[field].astype(float)
+        else:
+            columns[field] = deals_df[field].astype(str).str.strip()
+    hashes = pd.util.hash_pandas_object(pd.DataFrame(columns), index=False)
+    return hashes.to_numpy().view(np.int64)
+
+
+class DealSnapshotStore:
+    """Last scored snapshot per pipeline as Parquet, replaced atomically on save"""
+
+    def __init__(self, directory: str = SNAPSHOT_DIR):
+        self.directory = directory
+
+    def _path(self, pipeline_id: str) -> str:
+        if not re.match(PIPELINE_ID_PATTERN, pipeline_id):
+            raise ValueError(f"Invalid pipeline id {pipeline_id!r}")
+        return os.path.join(self.directory, f"{pipeline_id}.parquet")
+
+    def load(self, pipeline_id: str) -> Optional[Snapshot]:
+        path = self._path(pipeline_id)
+        if not os.path.exists(path):
+            return None
+        table = pq.read_table(path)
+        metadata = table.schema.metadata or {}
+        return Snapshot(
+            frame=table.to_pandas(),
+            scorer=metadata.get(b"scorer", b"").decode(),
+            updated_at=float(metadata.get(b"updated_at", b"0"))
+        )
+
+    def save(self, pipeline_id: str, frame: pd.DataFrame, scorer: str):
+        path = self._path(pipeline_id)
+        os.makedirs(self.directory, exist_ok=True)
+        table = pa.Table.from_pandas(frame, schema=SNAPSHOT_SCHEMA, preserve_index=False)
+        table = table.replace_schema_metadata({"scorer": scorer, "updated_at": repr(time.time())})
+        tmp = f"{path}.{os.getpid()}.tmp"
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+
+
+def snapshot_scores(frame: pd.DataFrame) -> List[DealScore]:
+    """DealScores from snapshot rows"""
+    return [
+        DealScore(
+            deal_id=deal_id,
+            company_name=company_name,
+            deal_value=0.0 if value != value else value,
+            close_probability=probability,
+            risk_level=risk_level,
+            reasoning=reasoning,
+            next_actions=list(next_actions)
+        )
+        for deal_id, company_name, value, probability, risk_level, reasoning, next_actions in zip(
+            frame["deal_id"], frame["company_name"], frame["deal_value"], frame["close_probability"],
+            frame["risk_level"], frame["reasoning"], frame["next_actions"]
+        )
+    ]
+
+
+def weighted_forecast(frame: pd.DataFrame) -> float:
+    return round(float(np.nansum(frame["deal_value"].to_numpy() * frame["close_probability"].to_numpy() / 100)), 2)
+
+
+@dataclass
+class _Diff:
+    current: pd.DataFrame
+    fingerprints: np.ndarray
+    positions: np.ndarray  # row in the previous snapshot, -1 for new deals
+    changed: np.ndarray
+    rescore: np.ndarray
+    previous: pd.DataFrame
+    removed: List[str]
+    scorer_changed: bool
+
+
+def _diff(deals_df: pd.DataFrame, previous: Optional[Snapshot], scorer: str) -> _Diff:
+    """Vectorized match of the upload against the snapshot by deal_id and input fingerprint"""
+    current = deals_df.reset_index(drop=True).assign(deal_id=deal_ids(deals_df).to_numpy())
+    fingerprints = deal_fingerprints(current)
+    frame = previous.frame if previous is not None else SNAPSHOT_SCHEMA.empty_table().to_pandas()
+
+    positions = pd.Index(frame["deal_id"]).get_indexer(current["deal_id"])
+    known = positions >= 0
+    changed = np.zeros(len(current), dtype=bool)
+    changed[known] = frame["fingerprint"].to_numpy()[positions[known]] != fingerprints[known]
+    scorer_changed = previous is not None and previous.scorer != scorer
+
+    return _Diff(
+        current=current,
+        fingerprints=fingerprints,
+        positions=positions,
+        changed=changed,
+        rescore=~known | changed | scorer_changed,
+        previous=frame,
+        removed=frame["deal_id"][~frame["deal_id"].isin(current["deal_id"])].tolist(),
+        scorer_changed=scorer_changed
+    )
+
+
+def _merge(diff: _Diff, scores: List[DealScore], pipeline_id: str) -> Tuple[pd.DataFrame, PipelineDelta]:
+    """New snapshot (carried rows plus fresh scores, in upload order) and the delta report"""
+    rescored_rows = np.flatnonzero(diff.rescore)
+    carried_rows = np.flatnonzero(~diff.rescore)
+    values = pd.to_numeric(diff.current["deal_value"], errors="coerce").to_numpy(dtype=float)
+
+    fresh = pd.DataFrame({
+        "deal_id": diff.current["deal_id"].to_numpy()[rescored_rows],
+        "fingerprint": diff.fingerprints[rescored_rows],
+        "company_name": [score.company_name for score in scores],
+        "deal_value": values[rescored_rows],
+        "close_probability": [score.close_probability for score in scores],
+        "risk_level": [score.risk_level for score in scores],
+        "reasoning": [score.reasoning for score in scores],
+        "next_actions": [score.next_actions for score in scores],
+        "_row": rescored_rows
+    })
+    carried = diff.previous.iloc[diff.positions[carried_rows]].assign(_row=carried_rows)
+    frames = [frame for frame in (carried, fresh) if len(frame)]
+    snapshot = (pd.concat(frames) if frames else fresh).sort_values("_row").drop(columns="_row").reset_index(drop=True)
+
+    previous_probability = diff.previous["close_probability"].to_numpy()
+    previous_risk = diff.previous["risk_level"].to_numpy()
+    changes = []
+    for row, score in zip(rescored_rows, scores):
+        position = diff.positions[row]
+        if position < 0:
+            changes.append(DealChange(
+                deal_id=score.deal_id, company_name=score.company_name, status="new",
+                close_probability=score.close_probability, risk_level=score.risk_level
+            ))
+            continue
+        before = float(previous_probability[position])
+        changes.append(DealChange(
+            deal_id=score.deal_id,
+            company_name=score.company_name,
+            status="changed" if diff.changed[row] else "rescored",
+            close_probability=score.close_probability,
+            previous_probability=before,
+            probability_delta=round(score.close_probability - before, 1),
+            risk_level=score.risk_level,
+            previous_risk_level=str(previous_risk[position])
+        ))
+    changes.sort(key=lambda change: -1 if change.probability_delta is None else abs(change.probability_delta), reverse=True)
+
+    forecast, previous_forecast = weighted_forecast(snapshot), weighted_forecast(diff.previous)
+    new = int((diff.positions < 0).sum())
+    delta = PipelineDelta(
+        pipeline_id=pipeline_id,
+        total=len(diff.current),
+        new=new,
+        changed=int(diff.changed.sum()),
+        unchanged=len(carried_rows),
+        removed=diff.removed,
+        changes=changes,
+        moved_to_high_risk=[
+            c for c in changes if c.risk_level == "High" and c.previous_risk_level not in (None, "High")
+        ],
+        weighted_forecast=forecast,
+        previous_weighted_forecast=previous_forecast,
+        weighted_forecast_change=round(forecast - previous_forecast, 2),
+        scores=scores
+    )
+    return snapshot, delta
+
+
+class PipelineSnapshots:
+    """Scores daily full-pipeline uploads incrementally: only new or changed deals go to the agent"""
+
+    def __init__(self, store: Optional[DealSnapshotStore] = None):
+        self.store = store or DealSnapshotStore()
+        # Uploads for the same pipeline are applied one at a time
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def analyze(
+        self,
+        agent: DealSenseAgent,
+        pipeline_id: str,
+        deals_df: pd.DataFrame,
+        stats: Optional[CacheStats] = None
+    ) -> PipelineDelta:
+        """Re-score what changed since the last snapshot, carry the rest forward and save the new snapshot"""
+        scorer = agent.scorer_key()
+        async with self._locks[pipeline_id]:
+            previous = await run_blocking(self.store.load, pipeline_id)
+            diff = await run_blocking(_diff, deals_df, previous, scorer)
+
+            to_score = diff.current[diff.rescore]
+            scores = await agent.analyze_pipeline_async(to_score, stats=stats) if len(to_score) else []
+            # Rules and cached scores may carry a row index or another deal's id; the upload's id wins
+            scores = [
+                score.model_copy(update={"deal_id": deal_id})
+                for score, deal_id in zip(scores, to_score["deal_id"])
+            ]
+
+            snapshot, delta = await run_blocking(_merge, diff, scores, pipeline_id)
+            await run_blocking(self.store.save, pipeline_id, snapshot, scorer)
+            return delta
+
+    async def scores(self, pipeline_id: str, offset: int = 0, limit: Optional[int] = None) -> Optional[dict]:
+        """A page of the pipeline's current snapshot, or None if it was never uploaded"""
+        snapshot = await run_blocking(self.store.load, pipeline_id)
+        if snapshot is None:
+            return None
+        frame = snapshot.frame
+        page = frame.iloc[offset:None if limit is None else offset + limit]
+        return {
+            "pipeline_id": pipeline_id,
+            "updated_at": snapshot.updated_at,
+            "total": len(frame),
+            "weighted_forecast": weighted_forecast(frame),
+            "scores": snapshot_scores(page)
+        }
@@ -1,36 +1,26 @@
-from langchain_openai import ChatOpenAI 
-from langchain.prompts import ChatPromptTemplate
-from langchain.output_parsers import PydanticOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.exceptions import OutputParserException
 from pydantic import BaseModel, Field
-from typing import List
-import pandas as pd
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator, Dict, List, Literal, Optional, Tuple, Union
+import asyncio
+import json
+import os
+from dataclasses import asdict, dataclass
 from dotenv import load_dotenv
+from core.cache import CacheStats, cache_from_env, canonical_value, content_hash
+from core.concurrency import map_bounded, stream_bounded
+from core.llm_backend import chat_model
+from core.routing import StructuredRouter, json_schema_format, tier_models
+from core.singleflight import SingleFlight
 
-load_dotenv()
+# pandas, the OpenAI client and the rules pre-scorer load on first use, not when the API imports this module
+if TYPE_CHECKING:
+    import pandas as pd
+    from agents.deal_rules import EscalationPolicy
 
-class DealScore(BaseModel):
-    """Model for a scored deal"""
-    deal_id: str = Field(description="Unique deal identifier")
-    company_name: str = Field(description="Company name")
-    deal_value: float = Field(description="Deal value in dollars")
-    close_probability: float = Field(description="Probability of closing (0-100)")
-    risk_level: str = Field(description="Risk level: Low, Medium, High")
-    reasoning: str = Field(description="AI reasoning for the score")
-    next_actions: List[str] = Field(description="Recommended next actions")
+load_dotenv()
 
-class DealSenseAgent:
-    def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",  # Use gpt-4o-mini for cost efficiency
-            temperature=0.3
-        )
-        self.parser = PydanticOutputParser(pydantic_object=DealScore)
-        
-    def analyze_deal(self, deal_data: dict) -> DealScore:
-        """Analyze a single deal and return scoring"""
-        
-        prompt = ChatPromptTemplate.from_template(
-            """You are an AI sales analyst. Analyze this deal and provide scoring.
+DEAL_PROMPT_TEMPLATE = """You are an AI sales analyst. Analyze this deal and provide scoring.
 
 Deal Information:
 - Company: {company_name}
@@ -49,31 +39,484 @@ Analyze this deal and provide:
 4. 3 specific next actions
 
 Regarding your reasoning and "3 specific next actions" responses, respond in simple, to the point, laymans terms, and like you are a friend and fellow sales colleauge speaking to the user in a bar after work.
+"""
+
+# Deal fields that feed the prompt, and therefore the cache key
+DEAL_PROMPT_FIELDS = [
+    "company_name", "deal_value", "stage", "days_in_pipeline", "last_contact_days",
+    "decision_maker_engaged", "has_competitor", "budget_confirmed"
+]
+
+# Pipelines scored incrementally are keyed by an id that becomes their snapshot file name
+PIPELINE_ID_PATTERN = r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,99}$"
+
+# Batch mode: the instructions and format block are sent once, followed by one short block per deal
+DEAL_BATCH_PROMPT_TEMPLATE = """You are an AI sales analyst. Analyze each deal below and provide scoring.
+
+For every deal provide:
+1. Close probability (0-100)
+2. Risk level (Low/Medium/High)
+3. Reasoning for your assessment
+4. 3 specific next actions
+
+Regarding your reasoning and "3 specific next actions" responses, respond in simple, to the point, laymans terms, and like you are a friend and fellow sales colleauge speaking to the user in a bar after work.
+
+Return exactly one entry in "scores" per deal, with deal_id copied from the deal's "Deal ID" line.
 
-{format_instructions}
+Deals:
+
+{deals}
+"""
+
+DEAL_BATCH_ITEM_TEMPLATE = """Deal ID: {deal_id}
+- Company: {company_name}
+- Deal Value: ${deal_value}
+- Stage: {stage}
+- Days in Pipeline: {days_in_pipeline}
+- Last Contact: {last_contact_days} days ago
+- Decision Maker Engaged: {decision_maker_engaged}
+- Competitor: {has_competitor}
+- Budget Confirmed: {budget_confirmed}
 """
+
+# Rough size of one DealScore in the response, reserved from the batch token budget per deal
+BATCH_OUTPUT_TOKENS_PER_DEAL = 200
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) for batch sizing"""
+    return len(text) // 4 + 1
+
+class DealScore(BaseModel):
+    """Model for a scored deal"""
+    deal_id: str = Field(description="Unique deal identifier")
+    company_name: str = Field(description="Company name")
+    deal_value: float = Field(description="Deal value in dollars")
+    close_probability: float = Field(description="Probability of closing (0-100)")
+    risk_level: str = Field(description="Risk level: Low, Medium, High")
+    reasoning: str = Field(description="AI reasoning for the score")
+    next_actions: List[str] = Field(description="Recommended next actions")
+
+class DealAssessment(BaseModel):
+    """The LLM's part of a DealScore; deal_id, company and value come from the input"""
+    close_probability: float = Field(description="Probability of closing (0-100)")
+    risk_level: Literal["Low", "Medium", "High"] = Field(description="Risk level")
+    reasoning: str = Field(description="AI reasoning for the score")
+    next_actions: List[str] = Field(description="Recommended next actions")
+
+class DealBatchEntry(DealAssessment):
+    """One deal's assessment in a batch response"""
+    deal_id: str = Field(description="The deal's Deal ID")
+
+class DealAssessmentBatch(BaseModel):
+    """Model for a batch of assessed deals"""
+    scores: List[DealBatchEntry] = Field(description="One entry per deal, in any order")
+
+def check_assessment(assessment: DealAssessment) -> None:
+    """Semantic checks on top of the schema; a failing answer is retried on the next tier"""
+    if not 0 <= assessment.close_probability <= 100:
+        raise ValueError(f"close_probability {assessment.close_probability} is outside 0-100")
+    if not assessment.reasoning.strip():
+        raise ValueError("empty reasoning")
+    if not assessment.next_actions:
+        raise ValueError("no next actions")
+
+def _deal_value(deal_data: dict) -> float:
+    try:
+        value = float(deal_data.get("deal_value") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    return value if value == value else 0.0
+
+def to_score(deal_data: dict, assessment: DealAssessment) -> DealScore:
+    """DealScore for a deal from the LLM's assessment of it"""
+    return DealScore(
+        deal_id=str(deal_data.get("deal_id", "")),
+        company_name=str(deal_data.get("company_name", "")),
+        deal_value=_deal_value(deal_data),
+        **assessment.model_dump(include=set(DealAssessment.model_fields))
+    )
+
+@dataclass
+class PipelineStats(CacheStats):
+    """Per-request counters: score cache hits/misses, deals needing the LLM, batch entries retried alone"""
+    deals: int = 0
+    escalated: int = 0
+    retried: int = 0
+    
+    @property
+    def escalated_fraction(self) -> float:
+        return round(self.escalated / self.deals, 4) if self.deals else 0.0
+
+def with_row_id(index: int, deal: dict) -> dict:
+    """Deal with deal_id defaulting to its row index, matching rules-decided scores"""
+    return deal if deal.get("deal_id") is not None else {**deal, "deal_id": index}
+
+class DealSenseAgent:
+    def __init__(
+        self,
+        llm=None,
+        tiers: Optional[Dict[str, object]] = None,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        cache=None,
+        escalation: Optional["EscalationPolicy"] = None,
+        batching: Optional[bool] = None,
+        batch_token_budget: Optional[int] = None,
+        batch_max_deals: Optional[int] = None
+    ):
+        # Model per tier (an injected model serves every tier); deals worth at least quality_deal_value get the quality tier
+        if tiers is None:
+            tiers = {tier: llm or chat_model(model=model, temperature=0.3) for tier, model in tier_models().items()}
+        self.tiers = tiers
+        self.llm = self.tiers["fast"]
+        self.quality_deal_value = float(os.getenv("DEALSENSE_QUALITY_DEAL_VALUE", "100000"))
+        # Schema-constrained scoring chains, compiled once per tier
+        self.router = StructuredRouter(
+            "dealsense", DealAssessment, self.tiers,
+            prompt=ChatPromptTemplate.from_template(DEAL_PROMPT_TEMPLATE), check=check_assessment
+        )
+        
+        # Pipeline scoring limits (deals in flight, seconds per LLM attempt, retries on rate limits)
+        self.concurrency = concurrency or int(os.getenv("DEALSENSE_CONCURRENCY", "8"))
+        self.timeout = timeout or float(os.getenv("DEALSENSE_TIMEOUT", "60"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("DEALSENSE_MAX_RETRIES", "3"))
+        
+        # Scores are cached by content; DEALSENSE_CACHE=off disables the default tiers
+        self.cache = cache if cache is not None else cache_from_env("DEALSENSE", "dealsense_cache")
+        # Deals with the same cache key scored at the same time share one LLM call
+        self.inflight = SingleFlight("dealsense")
+        
+        # Rules-based pre-scoring; only ambiguous deals go to the LLM (DEALSENSE_PRESCORE=off sends all)
+        if escalation is None and os.getenv("DEALSENSE_PRESCORE", "on").lower() != "off":
+            from agents.deal_rules import EscalationPolicy
+            escalation = EscalationPolicy.from_env()
+        self.escalation = escalation
+        
+        # Multi-deal prompts (DEALSENSE_BATCH=on); batches are packed up to a prompt + response token budget
+        self.batching = batching if batching is not None else os.getenv("DEALSENSE_BATCH", "off").lower() == "on"
+        self.batch_token_budget = batch_token_budget or int(os.getenv("DEALSENSE_BATCH_TOKEN_BUDGET", "8000"))
+        self.batch_max_deals = batch_max_deals or int(os.getenv("DEALSENSE_BATCH_MAX_DEALS", "20"))
+        # Batch entries are validated one by one, so the batch router has no check of its own
+        self.batch_router = StructuredRouter(
+            "dealsense", DealAssessmentBatch, self.tiers, prompt=ChatPromptTemplate.from_template(DEAL_BATCH_PROMPT_TEMPLATE)
         )
+        self._batch_overhead = estimate_tokens(DEAL_BATCH_PROMPT_TEMPLATE + json.dumps(json_schema_format(DealAssessmentBatch)))
+    
+    def tier(self, deal_data: dict) -> str:
+        """Model tier that scores the deal"""
+        return "quality" if _deal_value(deal_data) >= self.quality_deal_value else "fast"
+    
+    def _model_key(self, tier: str) -> tuple:
+        llm = self.tiers[tier]
+        return getattr(llm, "model_name", type(llm).__name__), getattr(llm, "temperature", None)
+    
+    def cache_key(self, deal_data: dict) -> str:
+        """Content hash of the prompt inputs plus everything else that shapes the answer"""
+        deal = {field: canonical_value(deal_data.get(field)) for field in DEAL_PROMPT_FIELDS}
+        return content_hash(
+            deal,
+            DEAL_PROMPT_TEMPLATE,
+            *self._model_key(self.tier(deal_data))
+        )
+        
+    def scorer_key(self) -> str:
+        """Hash of everything besides the deal itself that shapes a score (prompt, models, tier routing, rules policy)"""
+        return content_hash(
+            DEAL_PROMPT_TEMPLATE,
+            [self._model_key(tier) for tier in self.tiers],
+            self.quality_deal_value,
+            asdict(self.escalation) if self.escalation else None
+        )
+    
+    def analyze_deal(self, deal_data: dict, stats: Optional[CacheStats] = None) -> DealScore:
+        """Analyze a single deal and return scoring"""
+        key = self.cache_key(deal_data) if self.cache else None
+        if key:
+            cached = self.cache.get(key)
+            if stats:
+                stats.record(cached is not None)
+            if cached is not None:
+                return self._for_deal(DealScore.model_validate_json(cached), deal_data)
         
-        chain = prompt | self.llm | self.parser
+        routed = self.router.invoke(deal_data, self.tier(deal_data), "deal_score")
+        result = to_score(deal_data, routed.value)
         
-        result = chain.invoke({
-            **deal_data,
-            "format_instructions": self.parser.get_format_instructions()
-        })
+        if key:
+            self.cache.set(key, result.model_dump_json())
         
         return result
     
-    def analyze_pipeline(self, deals_df: pd.DataFrame) -> List[DealScore]:
-        """Analyze entire pipeline"""
-        results = []
+    async def analyze_deal_async(self, deal_data: dict, stats: Optional[CacheStats] = None) -> DealScore:
+        """Analyze a single deal without blocking, with timeout and rate-limit retries"""
+        key = self.cache_key(deal_data)
+        if self.cache:
+            cached = await self.cache.aget(key)
+            if stats:
+                stats.record(cached is not None)
+            if cached is not None:
+                return self._for_deal(DealScore.model_validate_json(cached), deal_data)
         
-        for _, deal in deals_df.iterrows():
-            deal_dict = deal.to_dict()
-            score = self.analyze_deal(deal_dict)
-            results.append(score)
+        # Duplicate rows and repeated requests in flight at the same time share one LLM call
+        result = await self.inflight.do(key, lambda: self._score_async(deal_data, key))
+        return self._for_deal(result, deal_data)
+    
+    @staticmethod
+    def _for_deal(score: DealScore, deal_data: dict) -> DealScore:
+        """A cached, shared or batch-labelled score carries the requesting deal's own deal_id ("" if it has none)"""
+        deal_id = str(deal_data["deal_id"]) if deal_data.get("deal_id") is not None else ""
+        return score if score.deal_id == deal_id else score.model_copy(update={"deal_id": deal_id})
+    
+    async def _score_async(self, deal_data: dict, key: str) -> DealScore:
+        routed = await self.router.ainvoke(
+            deal_data, self.tier(deal_data), "deal_score", timeout=self.timeout, max_retries=self.max_retries
+        )
+        result = to_score(deal_data, routed.value)
         
+        if self.cache:
+            await self.cache.aset(key, result.model_dump_json())
+        
+        return result
+    
+    def _render_batch_item(self, deal_data: dict, label: str) -> str:
+        return DEAL_BATCH_ITEM_TEMPLATE.format(
+            deal_id=label, **{field: deal_data.get(field, "Unknown") for field in DEAL_PROMPT_FIELDS}
+        )
+    
+    def pack_batches(self, deals: List[dict]) -> List[List[dict]]:
+        """Split deals into batches that fit the token budget (prompt plus expected response)"""
+        budget = max(self.batch_token_budget - self._batch_overhead, 1)
+        batches, current, used = [], [], 0
+        for deal in deals:
+            cost = estimate_tokens(self._render_batch_item(deal, str(deal.get("deal_id", "")))) + BATCH_OUTPUT_TOKENS_PER_DEAL
+            if current and (used + cost > budget or len(current) >= self.batch_max_deals):
+                batches.append(current)
+                current, used = [], 0
+            current.append(deal)
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+    
+    @staticmethod
+    def _batch_labels(deals: List[dict]) -> List[str]:
+        """Prompt-only labels matching response entries to deals: deal_id per deal, falling back to positions when
+        ids are missing or repeated. Results carry each deal's own deal_id, never these labels."""
+        labels = [str(deal["deal_id"]) if deal.get("deal_id") is not None else "" for deal in deals]
+        if "" in labels or len(set(labels)) < len(labels):
+            return [f"D{i + 1}" for i in range(len(deals))]
+        return labels
+    
+    @staticmethod
+    def _valid_entries(batch: DealAssessmentBatch, labels: set) -> Dict[str, DealAssessment]:
+        """Assessments from a batch response by deal_id; entries failing the checks or with unknown ids are dropped"""
+        parsed = {}
+        for entry in batch.scores:
+            try:
+                check_assessment(entry)
+            except ValueError:
+                continue
+            if entry.deal_id in labels:
+                parsed.setdefault(entry.deal_id, entry)
+        return parsed
+    
+    async def _score_batch(
+        self,
+        deals: List[dict],
+        stats: Optional[CacheStats] = None
+    ) -> List[Union[DealScore, Exception]]:
+        """Score deals with one LLM request; entries missing from the response are retried one by one"""
+        labels = self._batch_labels(deals)
+        results: List[Union[DealScore, Exception, None]] = [None] * len(deals)
+        keys = [self.cache_key(deal) if self.cache else None for deal in deals]
+        
+        pending = []
+        for i, key in enumerate(keys):
+            cached = await self.cache.aget(key) if key else None
+            if key and stats:
+                stats.record(cached is not None)
+            if cached is not None:
+                results[i] = self._for_deal(DealScore.model_validate_json(cached), deals[i])
+            else:
+                pending.append(i)
+        if not pending:
+            return results
+        
+        # One request per model tier among the pending deals
+        by_tier: Dict[str, List[int]] = {}
+        for i in pending:
+            by_tier.setdefault(self.tier(deals[i]), []).append(i)
+        
+        async def request(tier: str, indices: List[int]) -> Dict[str, DealAssessment]:
+            inputs = {"deals": "\n".join(self._render_batch_item(deals[i], labels[i]) for i in indices)}
+            try:
+                routed = await self.batch_router.ainvoke(
+                    inputs, tier, "deal_score_batch", timeout=self.timeout, max_retries=self.max_retries
+                )
+            except OutputParserException:
+                # No tier produced a valid batch; every deal is retried on its own
+                return {}
+            return self._valid_entries(routed.value, {labels[i] for i in indices})
+        
+        responses = await asyncio.gather(*(request(tier, indices) for tier, indices in by_tier.items()), return_exceptions=True)
+        failed = []
+        for indices, parsed in zip(by_tier.values(), responses):
+            for i in indices:
+                if isinstance(parsed, Exception):
+                    # The request itself failed (not a malformed answer); retrying per deal would only multiply it
+                    results[i] = parsed
+                    continue
+                assessment = parsed.get(labels[i])
+                if assessment is None:
+                    failed.append(i)
+                    continue
+                score = self._for_deal(to_score(deals[i], assessment), deals[i])
+                results[i] = score
+                if keys[i]:
+                    await self.cache.aset(keys[i], score.model_dump_json())
+        
+        if isinstance(stats, PipelineStats):
+            stats.retried += len(failed)
+        retried = await asyncio.gather(*(self.analyze_deal_async(deals[i]) for i in failed), return_exceptions=True)
+        # analyze_deal_async already gives each deal its own deal_id
+        for i, score in zip(failed, retried):
+            results[i] = score
         return results
     
+    async def analyze_batch_async(self, deals: List[dict], stats: Optional[CacheStats] = None) -> List[DealScore]:
+        """Score several deals in one request; results keep the input order and carry each deal's deal_id"""
+        results = await self._score_batch(deals, stats)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+    
+    def analyze_batch(self, deals: List[dict], stats: Optional[CacheStats] = None) -> List[DealScore]:
+        """Score several deals in one request (blocking wrapper)"""
+        return asyncio.run(self.analyze_batch_async(deals, stats))
+    
+    def prescore(self, deals_df: "pd.DataFrame") -> Optional["pd.DataFrame"]:
+        """Vectorized baseline probability, band, risk and escalation flag for every deal"""
+        from agents.deal_rules import prescore
+        return prescore(deals_df, self.escalation) if self.escalation else None
+    
+    def _rules_score(self, index: int, deal: dict, probability: float, band: float, risk_level: str) -> DealScore:
+        """DealScore for a deal the rules decided on their own"""
+        import pandas as pd
+        from agents.deal_rules import rules_next_actions, rules_reasoning
+        value = pd.to_numeric(deal.get("deal_value"), errors="coerce")
+        return DealScore(
+            deal_id=str(deal.get("deal_id", index)),
+            company_name=str(deal.get("company_name", "")),
+            deal_value=float(value) if value == value else 0.0,
+            close_probability=round(float(probability), 1),
+            risk_level=str(risk_level),
+            reasoning=rules_reasoning(deal, probability, band),
+            next_actions=rules_next_actions(deal)
+        )
+    
+    def _triage(
+        self,
+        deals_df: "pd.DataFrame",
+        offset: int = 0,
+        stats: Optional[PipelineStats] = None
+    ) -> List[Tuple[int, dict, Optional[DealScore]]]:
+        """(row_index, deal, rules_score) per row; rules_score is None when the deal needs the LLM"""
+        deals = deals_df.to_dict(orient="records")
+        scored = self.prescore(deals_df)
+        
+        if scored is None:
+            triaged = [(offset + i, deal, None) for i, deal in enumerate(deals)]
+        else:
+            triaged = [
+                (offset + i, deal, None if escalate else self._rules_score(offset + i, deal, probability, band, risk))
+                for i, (deal, probability, band, risk, escalate) in enumerate(zip(
+                    deals, scored["probability"], scored["band"], scored["risk_level"], scored["escalate"]
+                ))
+            ]
+        
+        if isinstance(stats, PipelineStats):
+            stats.deals += len(triaged)
+            stats.escalated += sum(1 for _, _, rules in triaged if rules is None)
+        return triaged
+    
+    async def analyze_pipeline_async(
+        self,
+        deals_df: "pd.DataFrame",
+        concurrency: Optional[int] = None,
+        stats: Optional[CacheStats] = None
+    ) -> List[DealScore]:
+        """Analyze entire pipeline concurrently; results keep the input row order"""
+        triaged = self._triage(deals_df, stats=stats)
+        escalated = [with_row_id(index, deal) for index, deal, rules in triaged if rules is None]
+        
+        if self.batching:
+            batch_scores = await map_bounded(
+                lambda batch: self.analyze_batch_async(batch, stats),
+                self.pack_batches(escalated),
+                concurrency or self.concurrency
+            )
+            llm_scores = iter([score for scores in batch_scores for score in scores])
+        else:
+            llm_scores = iter(await map_bounded(
+                lambda deal: self.analyze_deal_async(deal, stats),
+                escalated,
+                concurrency or self.concurrency
+            ))
+        
+        return [rules if rules is not None else next(llm_scores) for _, _, rules in triaged]
+    
+    async def stream_pipeline(
+        self,
+        chunks: AsyncIterable[Tuple[int, "pd.DataFrame"]],
+        concurrency: Optional[int] = None,
+        stats: Optional[CacheStats] = None
+    ) -> AsyncIterator[Tuple[int, Optional[DealScore], Optional[Exception]]]:
+        """Score (row_offset, DataFrame) chunks as they arrive, yielding (row_index, score, error) as each finishes"""
+        
+        async def work():
+            # (rows, rules_score): a rules-decided row, a single escalated row, or a batch of them
+            async for offset, chunk in chunks:
+                escalated = []
+                for index, deal, rules in self._triage(chunk, offset, stats):
+                    if rules is not None:
+                        yield [(index, deal)], rules
+                    else:
+                        escalated.append((index, with_row_id(index, deal)))
+                
+                if self.batching:
+                    by_id = {id(deal): index for index, deal in escalated}
+                    for batch in self.pack_batches([deal for _, deal in escalated]):
+                        yield [(by_id[id(deal)], deal) for deal in batch], None
+                else:
+                    for row in escalated:
+                        yield [row], None
+        
+        async def score(item: Tuple[List[Tuple[int, dict]], Optional[DealScore]]):
+            rows, rules = item
+            if rules is not None:
+                return [(rows[0][0], rules, None)]
+            if len(rows) == 1 and not self.batching:
+                index, deal = rows[0]
+                try:
+                    return [(index, await self.analyze_deal_async(deal, stats), None)]
+                except Exception as e:
+                    return [(index, None, e)]
+            
+            results = await self._score_batch([deal for _, deal in rows], stats)
+            return [
+                (index, None, result) if isinstance(result, Exception) else (index, result, None)
+                for (index, _), result in zip(rows, results)
+            ]
+        
+        async for results in stream_bounded(score, work(), concurrency or self.concurrency):
+            for result in results:
+                yield result
+    
+    def analyze_pipeline(self, deals_df: "pd.DataFrame", stats: Optional[CacheStats] = None) -> List[DealScore]:
+        """Analyze entire pipeline (blocking wrapper for scripts and notebooks)"""
+        return asyncio.run(self.analyze_pipeline_async(deals_df, stats=stats))
+    
     def get_risk_deals(self, scored_deals: List[DealScore]) -> List[DealScore]:
         """Filter deals with high risk"""
         return [d for d in scored_deals if d.risk_level == "High"]
\ No newline at end of file
@@ -0,0 +1,341 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from agents.dealsense import DealSenseAgent, PipelineStats, with_row_id
+from core.cache import DB_PATH
+from core.executor import run_blocking
+from core.metrics import endpoint
+from core.scheduler import llm_lane
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised when submitting while the queue already holds its maximum number of unfinished jobs"""
+
+
+class DealJobStore:
+    """DealSense jobs and their per-deal inputs and scores in SQLite"""
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dealsense_jobs ("
+                "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, total INTEGER NOT NULL, error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, owner TEXT, lease_until REAL, "
+                "attempts INTEGER NOT NULL DEFAULT 0)"
+            )
+            # Stores created before jobs were claimed and retried
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(dealsense_jobs)")}
+            for column, kind in (("owner", "TEXT"), ("lease_until", "REAL"), ("attempts", "INTEGER NOT NULL DEFAULT 0")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE dealsense_jobs ADD COLUMN {column} {kind}")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dealsense_job_deals ("
+                "job_id TEXT NOT NULL, row INTEGER NOT NULL, deal TEXT NOT NULL, score TEXT, error TEXT, "
+                "PRIMARY KEY (job_id, row))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def submit(self, deals: List[dict], max_unfinished: Optional[int] = None) -> str:
+        """Store a new queued job with its deals; raises JobQueueFull past max_unfinished"""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            conn = self._connection()
+            if max_unfinished is not None and self._unfinished_count(conn) >= max_unfinished:
+                raise JobQueueFull(f"{max_unfinished} jobs are already queued or running")
+            now = time.time()
+            conn.execute(
+                "INSERT INTO dealsense_jobs (job_id, status, total, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, len(deals), now, now)
+            )
+            conn.executemany(
+                "INSERT INTO dealsense_job_deals (job_id, row, deal) VALUES (?, ?, ?)",
+                ((job_id, row, json.dumps(deal, default=str)) for row, deal in enumerate(deals))
+            )
+            conn.commit()
+        return job_id
+
+    def _unfinished_count(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COUNT(*) FROM dealsense_jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    def unfinished(self) -> List[str]:
+        """Queued or interrupted jobs, oldest first"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT job_id FROM dealsense_jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def claim(self, job_id: str, owner: str, lease: float) -> bool:
+        """Mark a job running under owner until now + lease, if it is queued, its lease ran out or owner holds it.
+
+        A single UPDATE, so of several processes claiming the same job only one
+        gets it; the holder calls this again to renew before the lease ends.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            claimed = conn.execute(
+                "UPDATE dealsense_jobs SET status = 'running', owner = ?, lease_until = ?, updated_at = ? "
+                "WHERE job_id = ? AND (status = 'queued' "
+                "OR (status = 'running' AND (owner = ? OR lease_until IS NULL OR lease_until < ?)))",
+                (owner, now + lease, now, job_id, owner, now)
+            ).rowcount
+            conn.commit()
+        return claimed == 1
+
+    def release(self, owner: str):
+        """End owner's leases now, so its interrupted jobs can be claimed without waiting them out"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "UPDATE dealsense_jobs SET lease_until = 0 WHERE owner = ? AND status = 'running'", (owner,)
+            )
+            conn.commit()
+
+    def attempt_failed(self, job_id: str, owner: str, error: str, max_attempts: int) -> bool:
+        """Count a failed run of owner's claimed job and release it for another attempt; True if that was the
+        last attempt and the job is now failed"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "UPDATE dealsense_jobs SET attempts = attempts + 1, error = ?, lease_until = 0, updated_at = ? "
+                "WHERE job_id = ? AND owner = ? AND status = 'running'",
+                (error, time.time(), job_id, owner)
+            )
+            failed = conn.execute(
+                "UPDATE dealsense_jobs SET status = 'failed', lease_until = NULL "
+                "WHERE job_id = ? AND owner = ? AND status = 'running' AND attempts >= ?",
+                (job_id, owner, max_attempts)
+            ).rowcount
+            conn.commit()
+        return failed == 1
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "UPDATE dealsense_jobs SET status = ?, error = ?, updated_at = ?, lease_until = NULL WHERE job_id = ?",
+                (status, error, time.time(), job_id)
+            )
+            conn.commit()
+
+    def pending(self, job_id: str, after_row: int = -1, limit: int = 500) -> List[Tuple[int, dict]]:
+        """A page of deals with neither a score nor an error yet"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT row, deal FROM dealsense_job_deals "
+                "WHERE job_id = ? AND row > ? AND score IS NULL AND error IS NULL ORDER BY row LIMIT ?",
+                (job_id, after_row, limit)
+            ).fetchall()
+        return [(row, json.loads(deal)) for row, deal in rows]
+
+    def record(self, job_id: str, row: int, score: Optional[str] = None, error: Optional[str] = None):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "UPDATE dealsense_job_deals SET score = ?, error = ? WHERE job_id = ? AND row = ?",
+                (score, error, job_id, row)
+            )
+            conn.commit()
+
+    def progress(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            conn = self._connection()
+            job = conn.execute(
+                "SELECT status, total, error, created_at, updated_at FROM dealsense_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            scored, failed = conn.execute(
+                "SELECT COUNT(score), COUNT(error) FROM dealsense_job_deals WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        status, total, error, created_at, updated_at = job
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total": total,
+            "scored": scored,
+            "failed": failed,
+            "percent": round(100 * (scored + failed) / total, 1) if total else 100.0,
+            "error": error,
+            "created_at": created_at,
+            "updated_at": updated_at
+        }
+
+    def results(self, job_id: str, after_row: int = -1, limit: int = 500) -> List[dict]:
+        """A page of finished deals in row order: {"row", "deal"} or {"row", "error"}"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT row, score, error FROM dealsense_job_deals "
+                "WHERE job_id = ? AND row > ? AND (score IS NOT NULL OR error IS NOT NULL) ORDER BY row LIMIT ?",
+                (job_id, after_row, limit)
+            ).fetchall()
+        return [
+            {"row": row, "deal": json.loads(score)} if score is not None else {"row": row, "error": error}
+            for row, score, error in rows
+        ]
+
+
+class DealJobQueue:
+    """Background workers that score queued DealSense jobs, storing each deal as it completes.
+
+    Several processes (e.g. `uvicorn --workers N`) may share one store: a
+    worker claims a job with a lease before running it and renews the lease
+    while it runs, so each job runs in one process at a time. Unfinished jobs,
+    including those submitted by other processes and those whose owner died
+    (its lease ran out), are picked up by polling the store, continuing from
+    the deals that have no stored result yet. A job waits while the agent
+    cannot be built (e.g. a cold-start network error) and is retried after a
+    failed run; it only fails once max_attempts runs have failed. Errors
+    scoring single deals are stored with those deals and do not fail the job.
+    """
+
+    def __init__(
+        self,
+        get_agent: Callable[[], Awaitable[DealSenseAgent]],
+        store: DealJobStore,
+        workers: int = 1,
+        max_unfinished: int = 20,
+        chunk_rows: int = 500,
+        lease: float = 60.0,
+        max_attempts: int = 3
+    ):
+        self.get_agent = get_agent
+        self.store = store
+        self.workers = workers
+        self.max_unfinished = max_unfinished
+        self.chunk_rows = chunk_rows
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        if self.workers <= 0:
+            return  # submit-only process; another process runs the jobs
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._poll()))
+
+    async def stop(self):
+        # Interrupted jobs stay 'running' in the store, released for the next process to claim
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queued.clear()
+        await run_blocking(self.store.release, self.owner)
+
+    async def submit(self, deals: List[dict]) -> str:
+        job_id = await run_blocking(self.store.submit, deals, self.max_unfinished)
+        self._enqueue(job_id)
+        return job_id
+
+    def _enqueue(self, job_id: str):
+        if self._queue is not None and job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _poll(self):
+        """Queue unfinished jobs from the store now and every half lease; claiming decides who runs them"""
+        while True:
+            for job_id in await run_blocking(self.store.unfinished):
+                self._enqueue(job_id)
+            await asyncio.sleep(self.lease / 2)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._attempt(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Store errors: the job is left as it was, for the next poll
+                logger.exception("DealSense job %s could not be started", job_id)
+            finally:
+                self._queued.discard(job_id)
+                self._queue.task_done()
+
+    async def _attempt(self, job_id: str):
+        """Claim and run a job once; a failed run is released for a retry until max_attempts"""
+        try:
+            # Before claiming: while the agent cannot be built the job stays unclaimed, for any process's next poll
+            agent = await self.get_agent()
+        except Exception:
+            logger.warning("DealSense job %s waits for the agent", job_id, exc_info=True)
+            return
+        if not await run_blocking(self.store.claim, job_id, self.owner, self.lease):
+            return
+        try:
+            with endpoint("dealsense.jobs"), llm_lane("batch", client=f"job:{job_id}"):
+                await self._run_claimed(job_id, agent)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failed = await run_blocking(self.store.attempt_failed, job_id, self.owner, str(e), self.max_attempts)
+            logger.warning("DealSense job %s run failed%s", job_id, "; giving up" if failed else ", will retry",
+                           exc_info=True)
+
+    async def _run_claimed(self, job_id: str, agent: DealSenseAgent):
+        """run_job while renewing the lease; stops if another process took the job over"""
+        run = asyncio.create_task(self.run_job(job_id, agent))
+        try:
+            while True:
+                done, _ = await asyncio.wait({run}, timeout=self.lease / 3)
+                if done:
+                    return run.result()
+                if not await run_blocking(self.store.claim, job_id, self.owner, self.lease):
+                    return None
+        finally:
+            if not run.done():
+                run.cancel()
+                await asyncio.gather(run, return_exceptions=True)
+
+    async def run_job(self, job_id: str, agent: Optional[DealSenseAgent] = None) -> PipelineStats:
+        """Score every deal of a job that has no stored result yet; the caller holds the job's claim"""
+        import pandas as pd
+        agent = agent or await self.get_agent()
+        rows: List[int] = []  # pipeline position -> job row
+
+        async def chunks():
+            after_row = -1
+            while True:
+                page = await run_blocking(self.store.pending, job_id, after_row, self.chunk_rows)
+                if not page:
+                    return
+                offset = len(rows)
+                rows.extend(row for row, _ in page)
+                after_row = page[-1][0]
+                # Missing deal_ids default to the job row, not the position among this run's pending deals
+                yield offset, pd.DataFrame([with_row_id(row, deal) for row, deal in page])
+
+        stats = PipelineStats()
+        async for index, score, error in agent.stream_pipeline(chunks(), stats=stats):
+            if error is not None:
+                await run_blocking(self.store.record, job_id, rows[index], None, str(error))
+            else:
+                await run_blocking(self.store.record, job_id, rows[index], score.model_dump_json())
+
+        await run_blocking(self.store.set_status, job_id, "completed")
+        return stats
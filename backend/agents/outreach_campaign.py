@@ -0,0 +1,198 @@
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import IO, AsyncIterable, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from agents.outreachai import OutreachAIAgent, OutreachRequest
+from core.cache import DB_PATH, content_hash
+from core.concurrency import call_with_retry, stream_bounded
+from core.executor import run_blocking
+from core.usage import TokenUsage
+
+# (row_number, raw row) pairs read from an uploaded campaign file
+CampaignRow = Tuple[int, dict]
+
+
+class CampaignStore:
+    """Completed campaign rows in SQLite, so a crashed or interrupted campaign can resume by id"""
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outreach_campaigns ("
+                "campaign_id TEXT PRIMARY KEY, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outreach_campaign_results ("
+                "campaign_id TEXT NOT NULL, row INTEGER NOT NULL, row_hash TEXT NOT NULL, "
+                "result TEXT NOT NULL, PRIMARY KEY (campaign_id, row))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def start(self, campaign_id: str):
+        with self._lock:
+            conn = self._connection()
+            now = time.time()
+            conn.execute(
+                "INSERT OR IGNORE INTO outreach_campaigns (campaign_id, created_at, updated_at) VALUES (?, ?, ?)",
+                (campaign_id, now, now)
+            )
+            conn.commit()
+
+    def completed(self, campaign_id: str) -> Dict[int, str]:
+        """row -> hash of the request that produced its stored result"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT row, row_hash FROM outreach_campaign_results WHERE campaign_id = ?", (campaign_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def record(self, campaign_id: str, row: int, row_hash: str, result: str):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO outreach_campaign_results (campaign_id, row, row_hash, result) VALUES (?, ?, ?, ?)",
+                (campaign_id, row, row_hash, result)
+            )
+            conn.execute("UPDATE outreach_campaigns SET updated_at = ? WHERE campaign_id = ?", (time.time(), campaign_id))
+            conn.commit()
+
+    def progress(self, campaign_id: str) -> Optional[dict]:
+        with self._lock:
+            conn = self._connection()
+            campaign = conn.execute(
+                "SELECT created_at, updated_at FROM outreach_campaigns WHERE campaign_id = ?", (campaign_id,)
+            ).fetchone()
+            if campaign is None:
+                return None
+            completed = conn.execute(
+                "SELECT COUNT(*) FROM outreach_campaign_results WHERE campaign_id = ?", (campaign_id,)
+            ).fetchone()[0]
+        return {"campaign_id": campaign_id, "completed": completed, "created_at": campaign[0], "updated_at": campaign[1]}
+
+    def results(self, campaign_id: str, after_row: int = -1, limit: int = 500) -> List[Tuple[int, dict]]:
+        """A page of stored results in row order"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT row, result FROM outreach_campaign_results WHERE campaign_id = ? AND row > ? "
+                "ORDER BY row LIMIT ?",
+                (campaign_id, after_row, limit)
+            ).fetchall()
+        return [(row, json.loads(result)) for row, result in rows]
+
+
+def iter_campaign_rows(stream: IO[bytes], fmt: str, chunk_rows: int = 500) -> Iterator[List[CampaignRow]]:
+    """Read a CSV or JSONL campaign file in chunks of (row_number, row) pairs"""
+    if fmt == "csv":
+        import pandas as pd
+        offset = 0
+        for chunk in pd.read_csv(stream, chunksize=chunk_rows, dtype=str, keep_default_na=False):
+            yield list(enumerate(chunk.to_dict(orient="records"), start=offset))
+            offset += len(chunk)
+        return
+
+    batch, row = [], 0
+    for line in stream:
+        line = line.decode("utf-8") if isinstance(line, bytes) else line
+        if not line.strip():
+            continue
+        try:
+            batch.append((row, json.loads(line)))
+        except json.JSONDecodeError as e:
+            batch.append((row, {"_error": f"Invalid JSON: {e}"}))
+        row += 1
+        if len(batch) >= chunk_rows:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def campaign_request(row: dict) -> OutreachRequest:
+    """OutreachRequest from a CSV/JSONL row; CSV pain points are separated by ';' or '|'"""
+    if "_error" in row:
+        raise ValueError(row["_error"])
+    data = {
+        key: value for key, value in row.items()
+        if value is not None and value != "" and not (isinstance(value, float) and math.isnan(value))
+    }
+    if isinstance(data.get("pain_points"), str):
+        data["pain_points"] = [p.strip() for p in re.split(r"[;|]", data["pain_points"]) if p.strip()]
+    if "company_size" in data:
+        data["company_size"] = str(data["company_size"])
+    return OutreachRequest(**data)
+
+
+async def run_campaign(
+    agent: OutreachAIAgent,
+    rows: AsyncIterable[CampaignRow],
+    store: CampaignStore,
+    campaign_id: Optional[str] = None,
+    concurrency: int = 16,
+    timeout: float = 60,
+    max_retries: int = 3
+) -> AsyncIterator[Tuple[str, dict]]:
+    """Generate outreach for every row, yielding (event, data) as each finishes.
+
+    Results are stored as they complete. Re-running with the same campaign_id
+    skips rows whose stored result came from an identical request.
+    """
+    campaign_id = campaign_id or uuid.uuid4().hex
+    await run_blocking(store.start, campaign_id)
+    done = await run_blocking(store.completed, campaign_id)
+    yield "campaign", {"campaign_id": campaign_id, "previously_completed": len(done)}
+
+    started = time.perf_counter()
+    usage = TokenUsage()
+    summary = {"total": 0, "generated": 0, "skipped": 0, "failed": 0}
+
+    async def generate(item: CampaignRow):
+        row, data = item
+        try:
+            request = campaign_request(data)
+        except (ValidationError, ValueError, TypeError) as e:
+            return "error", {"row": row, "detail": str(e)}
+
+        row_hash = content_hash(request.model_dump())
+        if done.get(row) == row_hash:
+            return "skipped", {"row": row}
+        try:
+            result = await call_with_retry(
+                lambda: agent.generate_outreach_async(request, usage),
+                timeout=timeout,
+                max_retries=max_retries
+            )
+        except Exception as e:
+            return "error", {"row": row, "detail": str(e)}
+
+        await run_blocking(store.record, campaign_id, row, row_hash, result.model_dump_json())
+        return "result", {"row": row, "result": result.model_dump()}
+
+    async for event, data in stream_bounded(generate, rows, concurrency):
+        summary["total"] += 1
+        if event == "skipped":
+            summary["skipped"] += 1
+            continue
+        summary["generated" if event == "result" else "failed"] += 1
+        yield event, data
+
+    elapsed = time.perf_counter() - started
+    summary["campaign_id"] = campaign_id
+    summary["elapsed_seconds"] = round(elapsed, 3)
+    summary["messages_per_minute"] = round(summary["generated"] / elapsed * 60, 1) if elapsed else 0.0
+    summary["tokens"] = usage.as_dict()
+    yield "summary", summary
@@ -1,12 +1,66 @@
-from crewai import Agent, Task, Crew, Process
-from langchain_openai import ChatOpenAI
-from typing import List, Dict, Optional
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from typing import List, Dict, Optional, Tuple
 from pydantic import BaseModel
-import json
-import re
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+import asyncio
+import logging
+import os
 from dotenv import load_dotenv
+from core.llm_backend import chat_model
+from core.cache import content_hash
+from core.routing import StructuredRouter, tier_models
+from core.singleflight import SingleFlight, normalize_text
+from core.usage import TokenUsage
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Shared instruction prefix; per-prospect details go after it so the prefix is byte-identical across calls
+OUTREACH_INSTRUCTIONS = """You write personalized B2B sales outreach messages.
+
+REQUIREMENTS:
+1. Hook them in the first sentence with a relevant insight about their industry or pain point
+2. Keep it conversational and human (not salesy)
+3. Reference their specific pain points
+4. Clear call-to-action: book a 15-min discovery call
+5. Include 2-3 personalization elements (company name, industry, specific pain point)
+
+OUTPUT FIELDS:
+- subject: the subject line for email, otherwise an empty string
+- body: the full message body
+- reasoning: why you chose this approach
+- personalization_elements: the personalization elements you used
+- call_to_action: the specific CTA you used
+"""
+
+CHANNEL_GUIDES = {
+    "email": "Write a professional email with subject line. Keep body under 150 words.",
+    "linkedin": "Write a LinkedIn connection message. No subject needed. Keep under 100 words. Casual tone.",
+    "slack": "Write a casual Slack message. No subject needed. Under 75 words. Use 1-2 emojis max."
+}
+
+# Body word limits from the guides above; drafts past CHANNEL_WORD_SLACK times the limit are rejected
+CHANNEL_WORD_LIMITS = {"email": 150, "linkedin": 100, "slack": 75}
+CHANNEL_WORD_SLACK = 1.5
+
+# (temperature, angle) per A/B variant; the first is the plain single-version prompt
+VARIANT_ANGLES = [
+    (0.7, None),
+    (0.9, "Open with a sharp insight or trend from their industry."),
+    (0.8, "Open with a concrete result a similar company got after fixing the same pain point."),
+    (1.0, "Open with their recent activity, or a timely trigger if there is none."),
+    (1.1, "Open with a short, curiosity-driven question. Be more playful than usual."),
+]
+
+def text_similarity(a: str, b: str, threshold: float = 0.0) -> float:
+    """0-1 similarity of two message bodies, ignoring case and whitespace; below threshold, only an upper bound"""
+    a, b = " ".join(a.lower().split()), " ".join(b.lower().split())
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    # quick_ratio() bounds ratio() from above and is linear, so clearly distinct bodies skip the quadratic match
+    upper = matcher.quick_ratio()
+    return matcher.ratio() if upper >= threshold else upper
+
 class OutreachRequest(BaseModel):
     company_name: str
     industry: str
@@ -25,15 +79,139 @@ class OutreachResult(BaseModel):
     call_to_action: str
     alternative_versions: Optional[List[Dict]] = None
 
-class OutreachAIAgent:
-    def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gpt-4o",
-            temperature=0.7
+class OutreachDraft(BaseModel):
+    """A generated message, as the model returns it"""
+    subject: str
+    body: str
+    reasoning: str
+    personalization_elements: List[str]
+    call_to_action: str
+
+@dataclass
+class TierPolicy:
+    """Which model tier writes a message: short-form channels get the fast tier,
+    quality channels with at least min_detail_chars of prospect detail the quality tier"""
+    quality_channels: Tuple[str, ...] = ("email",)
+    min_detail_chars: int = 150
+    
+    @classmethod
+    def from_env(cls) -> "TierPolicy":
+        return cls(
+            quality_channels=tuple(c.strip() for c in os.getenv("OUTREACH_QUALITY_CHANNELS", "email").split(",") if c.strip()),
+            min_detail_chars=int(os.getenv("OUTREACH_QUALITY_DETAIL_CHARS", "150"))
         )
     
+    def tier(self, request: "OutreachRequest") -> str:
+        detail = sum(len(p) for p in request.pain_points) + len(request.recent_activity or "")
+        return "quality" if request.channel in self.quality_channels and detail >= self.min_detail_chars else "fast"
+
+def check_draft(channel: str):
+    """Semantic checks on top of the schema; a failing draft is rewritten on the next tier"""
+    limit = CHANNEL_WORD_LIMITS.get(channel, CHANNEL_WORD_LIMITS["email"]) * CHANNEL_WORD_SLACK
+    
+    def check(draft: OutreachDraft) -> None:
+        if not draft.body.strip():
+            raise ValueError("empty body")
+        if len(draft.body.split()) > limit:
+            raise ValueError(f"body is {len(draft.body.split())} words, limit {limit:.0f} for {channel}")
+        if channel == "email" and not draft.subject.strip():
+            raise ValueError("email without a subject")
+    return check
+
+class OutreachAIAgent:
+    def __init__(self, llm=None, tiers: Optional[Dict[str, object]] = None, policy: Optional[TierPolicy] = None):
+        if tiers is None:
+            # An injected model serves every tier
+            tiers = {tier: llm or chat_model(model=model, temperature=0.7) for tier, model in tier_models().items()}
+        self.tiers = tiers
+        self.llm = tiers["quality"]
+        self.policy = policy or TierPolicy.from_env()
+        # Schema-constrained chains, compiled once per channel check and tier
+        self.routers = {
+            channel: StructuredRouter("outreachai", OutreachDraft, tiers, check=check_draft(channel))
+            for channel in CHANNEL_WORD_LIMITS
+        }
+        # Variants whose bodies are at least this similar to an earlier one are dropped
+        self.duplicate_threshold = float(os.getenv("OUTREACH_DUPLICATE_THRESHOLD", "0.85"))
+        # Identical requests made at the same time share one generation
+        self.inflight = SingleFlight("outreachai")
+    
     def generate_outreach(self, request: OutreachRequest) -> OutreachResult:
         """Generate personalized outreach - SIMPLIFIED VERSION"""
+        routed = self._router(request).invoke(self._build_messages(request), self.policy.tier(request), "outreach")
+        return OutreachResult(**routed.value.model_dump())
+    
+    async def generate_outreach_async(self, request: OutreachRequest, usage: Optional[TokenUsage] = None) -> OutreachResult:
+        """Generate personalized outreach without blocking the event loop"""
+        messages = self._build_messages(request)
+        tier = self.policy.tier(request)
+        
+        async def generate() -> OutreachResult:
+            # Only the caller that made the LLM call is charged for it
+            routed = await self._router(request).ainvoke(messages, tier, "outreach", usage=usage)
+            return OutreachResult(**routed.value.model_dump())
+        
+        return await self.inflight.do(self._flight_key(messages, tier, request.channel), generate)
+    
+    def _router(self, request: OutreachRequest) -> StructuredRouter:
+        return self.routers.get(request.channel, self.routers["email"])
+    
+    def _flight_key(self, messages: List[BaseMessage], tier: str, *extra) -> str:
+        """Model settings of the tier plus the whitespace-normalized prompt"""
+        llm = self.tiers[tier]
+        return content_hash(
+            getattr(llm, "model_name", type(llm).__name__),
+            getattr(llm, "temperature", None),
+            [(message.type, normalize_text(message.content)) for message in messages],
+            *extra
+        )
+    
+    async def generate_multiple_versions_async(self, request: OutreachRequest, versions_count: int = 3) -> List[OutreachResult]:
+        """Generate A/B variants concurrently, one angle and temperature each, minus near-duplicates"""
+        tier = self.policy.tier(request)
+        key = self._flight_key(self._build_messages(request), tier, request.channel, "versions", versions_count)
+        return await self.inflight.do(key, lambda: self._generate_versions(request, tier, versions_count))
+    
+    async def _generate_versions(self, request: OutreachRequest, tier: str, versions_count: int) -> List[OutreachResult]:
+        variants = [VARIANT_ANGLES[i % len(VARIANT_ANGLES)] for i in range(max(versions_count, 1))]
+        router = self._router(request)
+        
+        responses = await asyncio.gather(*(
+            router.ainvoke(self._build_messages(request, angle), tier, "outreach_variant", temperature=temperature)
+            for temperature, angle in variants
+        ), return_exceptions=True)
+        
+        results, tags = [], []
+        for (temperature, angle), response in zip(variants, responses):
+            if isinstance(response, Exception):
+                logger.warning("Outreach variant (angle %r) failed", angle, exc_info=response)
+                continue
+            result = OutreachResult(**response.value.model_dump())
+            if any(text_similarity(result.body, kept.body, self.duplicate_threshold) >= self.duplicate_threshold for kept in results):
+                continue
+            results.append(result)
+            tags.append({"angle": angle or "default", "temperature": temperature})
+        
+        if not results:
+            raise next(r for r in responses if isinstance(r, Exception))
+        
+        # The first variant carries the rest, so /generate callers can switch to A/B without a new shape
+        results[0].alternative_versions = [
+            {**result.model_dump(exclude={"alternative_versions"}), **tag}
+            for result, tag in zip(results[1:], tags[1:])
+        ]
+        return results
+    
+    def generate_multiple_versions(self, request: OutreachRequest, versions_count: int = 3) -> List[OutreachResult]:
+        """Generate A/B variants (blocking wrapper)"""
+        return asyncio.run(self.generate_multiple_versions_async(request, versions_count))
+    
+    def _build_messages(self, request: OutreachRequest, angle: Optional[str] = None) -> List[BaseMessage]:
+        """Static instructions first (identical across prospects, so provider prompt caching applies), prospect last"""
+        return [SystemMessage(content=OUTREACH_INSTRUCTIONS), HumanMessage(content=self._build_prompt(request, angle))]
+    
+    def _build_prompt(self, request: OutreachRequest, angle: Optional[str] = None) -> str:
+        """Build the per-prospect part of the outreach prompt"""
         
         # Build the prompt directly
         dm_info = ""
@@ -42,13 +220,11 @@ class OutreachAIAgent:
         
         pain_points_str = ", ".join(request.pain_points)
         
-        channel_guide = {
-            "email": "Write a professional email with subject line. Keep body under 150 words.",
-            "linkedin": "Write a LinkedIn connection message. No subject needed. Keep under 100 words. Casual tone.",
-            "slack": "Write a casual Slack message. No subject needed. Under 75 words. Use 1-2 emojis max."
-        }
+        angle_guide = f"\nANGLE: {angle}\n" if angle else ""
         
-        prompt = f"""You are writing a personalized {request.channel} outreach message{dm_info}.
+        prompt = f"""{CHANNEL_GUIDES.get(request.channel, CHANNEL_GUIDES['email'])}
+{angle_guide}
+Write a personalized {request.channel} outreach message{dm_info}.
 
 PROSPECT INFO:
 - Company: {request.company_name}
@@ -56,66 +232,6 @@ PROSPECT INFO:
 - Size: {request.company_size} employees
 - Pain Points: {pain_points_str}
 - Recent Activity: {request.recent_activity or "None"}
-
-{channel_guide.get(request.channel, channel_guide['email'])}
-
-REQUIREMENTS:
-1. Hook them in the first sentence with a relevant insight about their industry or pain point
-2. Keep it conversational and human (not salesy)
-3. Reference their specific pain points
-4. Clear call-to-action: book a 15-min discovery call
-5. Include 2-3 personalization elements (company name, industry, specific pain point)
-
-OUTPUT FORMAT (respond ONLY with valid JSON):
-{{
-  "subject": "subject line here" (if email, otherwise empty string),
-  "body": "full message body here",
-  "reasoning": "why you chose this approach",
-  "personalization_elements": ["element1", "element2", "element3"],
-  "call_to_action": "the specific CTA you used"
-}}
 """
         
-        # Get response from LLM
-        from langchain.schema import HumanMessage
-        response = self.llm.invoke([HumanMessage(content=prompt)])
-        
-        # Parse the response
-        return self._parse_llm_response(response.content, request.channel)
-    
-    def _parse_llm_response(self, response_text: str, channel: str) -> OutreachResult:
-        """Parse LLM response into OutreachResult"""
-        try:
-            # Try to extract JSON from response
-            json_match = re.search(r'\{[\s\S]*\}', response_text)
-            
-            if json_match:
-                data = json.loads(json_match.group())
-                
-                return OutreachResult(
-                    subject=data.get("subject", ""),
-                    body=data.get("body", ""),
-                    reasoning=data.get("reasoning", ""),
-                    personalization_elements=data.get("personalization_elements", []),
-                    call_to_action=data.get("call_to_action", "")
-                )
-            else:
-                # Fallback: use the raw text as body
-                return OutreachResult(
-                    subject="Quick question" if channel == "email" else "",
-                    body=response_text,
-                    reasoning="Direct LLM output",
-                    personalization_elements=["Company mentioned"],
-                    call_to_action="Book a call"
-                )
-                
-        except Exception as e:
-            print(f"Parse error: {e}")
-            # Return minimal valid result
-            return OutreachResult(
-                subject="Quick question" if channel == "email" else "",
-                body=response_text[:500] if response_text else "Error generating outreach",
-                reasoning=f"Parsing failed: {str(e)}",
-                personalization_elements=[],
-                call_to_action="Let's connect"
-            )
\ No newline at end of file
+        return prompt
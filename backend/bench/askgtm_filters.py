@@ -0,0 +1,110 @@
+"""Precision@k and latency of retrieval with and without metadata filters, plus indexed vs scanned stats.
+
+Synthetic corpus: every chunk belongs to a category (sales, product, ...)
+and discusses a topic shared across categories (pricing, security, ...),
+so an unfiltered product question about pricing also pulls sales pricing
+chunks. The "filter in Chroma" rows show the cost of Chroma's own
+pre-filter on a broad filter; the hybrid retriever over-fetches and trims
+instead when the facet index says a filter is broad.
+Run from backend/:  python -m bench.askgtm_filters
+"""
+import argparse
+import random
+import statistics
+import time
+import uuid
+from collections import Counter
+
+from langchain_community.vectorstores import Chroma
+
+from bench.askgtm_retrieval import TOPICS
+from bench.stubs import HashingEmbeddings
+from core.bm25 import BM25Index
+from core.facets import FacetIndex, chroma_where
+from core.retrieval import HybridRetriever
+
+CATEGORIES = {
+    "sales": "deal prospect quota pipeline rep close buyer",
+    "product": "feature roadmap release capability module dashboard workflow",
+    "customer-success": "renewal adoption health churn account csm expansion",
+    "technical": "endpoint latency deployment architecture schema token version",
+    "legal": "contract clause liability indemnity msa terms counsel",
+    "marketing": "campaign webinar persona messaging launch brand content",
+}
+
+
+def corpus(size: int, seed: int = 7):
+    rng = random.Random(seed)
+    categories, topics = list(CATEGORIES), list(TOPICS)
+    docs = []
+    for i in range(size):
+        category, topic = categories[i % len(categories)], topics[(i // len(categories)) % len(topics)]
+        framing, words = CATEGORIES[category].split(), TOPICS[topic].split()
+        body = " ".join(rng.choice(framing) if rng.random() < 0.15 else rng.choice(words) for _ in range(50))
+        docs.append((f"{category} / {topic}: {body}", {"category": category, "source": f"{category}-{topic}-{i % 50}"}))
+    return docs
+
+
+def queries(count: int, seed: int = 3):
+    """(question, category, topic): topic words plus one word that hints at the category"""
+    rng = random.Random(seed)
+    result = []
+    for _ in range(count):
+        category, topic = rng.choice(list(CATEGORIES)), rng.choice(list(TOPICS))
+        words = rng.sample(TOPICS[topic].split(), 5) + rng.sample(CATEGORIES[category].split(), 1)
+        result.append((" ".join(words), category, topic))
+    return result
+
+
+def evaluate(label, retrieve, query_set, k, filtered):
+    precise, timings = 0, []
+    for question, category, topic in query_set:
+        start = time.perf_counter()
+        results = retrieve(question, {"category": category} if filtered else None)[:k]
+        timings.append((time.perf_counter() - start) * 1000)
+        precise += sum(doc.page_content.startswith(f"{category} / {topic}:") for doc in results)
+    timings.sort()
+    print(f"  {label:<46} precision@{k} {precise / (k * len(query_set)):6.1%}   "
+          f"p50 {statistics.median(timings):6.2f} ms   p95 {timings[int(len(timings) * 0.95)]:6.2f} ms")
+
+
+def run(size: int, count: int, k: int) -> None:
+    docs = corpus(size)
+    ids = [uuid.uuid4().hex for _ in docs]
+    store = Chroma(collection_name=f"bench-{uuid.uuid4().hex[:8]}", embedding_function=HashingEmbeddings())
+    for i in range(0, size, 5000):
+        store.add_texts([d[0] for d in docs[i:i + 5000]], metadatas=[d[1] for d in docs[i:i + 5000]], ids=ids[i:i + 5000])
+    bm25 = BM25Index()
+    bm25.add(ids, [d[0] for d in docs], [d[1] for d in docs])
+    facets = FacetIndex()
+    facets.add(ids, [d[1] for d in docs])
+
+    hybrid = HybridRetriever(vectorstore=store, bm25=bm25, k=k)
+    retrievers = {
+        "vector (filter in Chroma)": lambda q, filters: store.similarity_search(q, k=k, filter=chroma_where(filters)),
+        "hybrid (BM25 + vector)": lambda q, filters: hybrid.model_copy(update={"filters": filters}).invoke(q),
+    }
+
+    query_set = queries(count)
+    print(f"{size:,} chunks in {len(CATEGORIES)} categories x {len(TOPICS)} topics, {count} queries")
+    for label, retrieve in retrievers.items():
+        evaluate(f"{label}, unfiltered", retrieve, query_set, k, filtered=False)
+        evaluate(f"{label}, category filter", retrieve, query_set, k, filtered=True)
+
+    start = time.perf_counter()
+    scanned = Counter(m["category"] for m in store._collection.get(include=["metadatas"])["metadatas"])
+    scan_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    indexed = facets.snapshot()
+    index_ms = (time.perf_counter() - start) * 1000
+    assert indexed["facets"]["category"] == dict(scanned.most_common())
+    print(f"  stats: collection scan {scan_ms:,.1f} ms, facet index {index_ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=30000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+    run(args.size, args.queries, args.k)
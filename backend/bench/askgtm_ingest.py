@@ -0,0 +1,62 @@
+"""Docs/sec and embedding calls for AskGTM bulk ingestion with a fake embedding function.
+
+Ingests a synthetic JSONL corpus, re-ingests it unchanged, then with a
+fraction of documents edited. Run from backend/:  python -m bench.askgtm_ingest
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import tempfile
+
+from langchain_community.vectorstores import Chroma
+
+from bench.stubs import HashingEmbeddings
+from core.ingestion import IngestionPipeline, iter_json_documents
+
+TOPICS = ["pricing", "objections", "competitive", "implementation", "security", "integrations", "case-studies"]
+
+
+def synthetic_corpus(size: int, seed: int = 3):
+    rng = random.Random(seed)
+    words = "pipeline forecast quota renewal onboarding Salesforce HubSpot SOC2 GDPR discount champion budget".split()
+    for i in range(size):
+        topic = TOPICS[i % len(TOPICS)]
+        body = " ".join(rng.choice(words) for _ in range(rng.randint(80, 400)))
+        yield {"content": f"{topic.title()} note {i}: {body}", "metadata": {"source": f"doc-{i}", "category": topic}}
+
+
+def as_jsonl(docs) -> io.BytesIO:
+    return io.BytesIO("".join(json.dumps(doc) + "\n" for doc in docs).encode())
+
+
+async def run(size: int, changed: float, latency: float, processes: int) -> None:
+    docs = list(synthetic_corpus(size))
+    edited = [dict(doc, content=doc["content"] + " (updated)") if i % int(1 / changed) == 0 else doc
+              for i, doc in enumerate(docs)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        embeddings = HashingEmbeddings(latency=latency)
+        store = Chroma(collection_name="bench", persist_directory=tmp, embedding_function=embeddings)
+        pipeline = IngestionPipeline(store, embeddings, processes=processes)
+
+        print(f"{size} documents, fake embeddings with {latency * 1000:.0f} ms per call, {processes} split processes")
+        for label, corpus in [("initial ingest", docs), ("unchanged re-ingest", docs),
+                              (f"re-ingest, {changed:.0%} edited", edited)]:
+            report = (await pipeline.aingest(iter_json_documents(as_jsonl(corpus)))).as_dict()
+            print(f"  {label:<24} {report['docs_per_second']:>9} docs/s  {report['chunks']:>6} chunks  "
+                  f"{report['chunks_skipped']:>6} skipped  {report['embedding_calls']:>4} embedding calls  "
+                  f"{report['embedding_calls_saved']:>4} saved")
+        pipeline.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=5000)
+    parser.add_argument("--changed", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    asyncio.run(run(args.size, args.changed, args.latency, args.processes))
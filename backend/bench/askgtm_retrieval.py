@@ -0,0 +1,108 @@
+"""Recall@k and per-query latency of vector-only vs hybrid (BM25 + vector, RRF) retrieval.
+
+Uses a synthetic GTM corpus where every chunk carries an exact identifier
+(API version, SOC/ISO control, SKU) and bag-of-words stub embeddings that
+keep every query term; --ignore-codes drops identifiers from the embeddings
+instead, like a dense model with a weak grip on them. --embed-latency adds a
+per-call embedding delay, which the async hybrid path overlaps with BM25.
+Run from backend/:  python -m bench.askgtm_retrieval [--ignore-codes] [--embed-latency S] [--rerank MODEL]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+from langchain_community.vectorstores import Chroma
+
+from bench.stubs import HashingEmbeddings
+from core.bm25 import BM25Index
+from core.retrieval import CrossEncoderReranker, HybridRetriever
+
+TOPICS = {
+    "pricing": "pricing discount tier seats annual monthly invoice enterprise starter professional budget",
+    "security": "security compliance audit encryption sso saml gdpr certification controls penetration",
+    "integrations": "integration salesforce hubspot slack teams webhook sync connector api field mapping",
+    "implementation": "implementation onboarding kickoff training rollout pilot migration csm workshop timeline",
+    "competitive": "competitor clari gong comparison differentiator cheaper faster orchestration displacement",
+    "objections": "objection expensive complex tools roi productivity response concern pushback value",
+}
+CODES = ["API v{n}", "SOC {n}", "ISO {n}", "SKU-{n}", "GTM-{n}"]
+
+
+def corpus(size: int, seed: int = 11):
+    rng = random.Random(seed)
+    names = list(TOPICS)
+    # Account/product names and jargon that make each chunk distinguishable
+    jargon = ["".join(rng.choice("bcdfghjklmnprstvz") + rng.choice("aeiou") for _ in range(3)) for _ in range(3000)]
+    docs = []
+    for i in range(size):
+        topic = names[i % len(names)]
+        words = TOPICS[topic].split()
+        code = CODES[i % len(CODES)].format(n=1000 + i)
+        body = " ".join(rng.choice(words) if rng.random() < 0.6 else rng.choice(jargon) for _ in range(60))
+        docs.append((f"{topic.title()} note: {body}. Applies to {code}.", {"category": topic}, code, body))
+    return docs
+
+
+def queries(docs, count: int, seed: int = 5):
+    rng = random.Random(seed)
+    picked = rng.sample(range(len(docs)), count)
+    exact = [(f"Which note covers {docs[i][2]}?", docs[i][0]) for i in picked[: count // 2]]
+    topical = [(" ".join(rng.sample(docs[i][3].split(), 12)), docs[i][0]) for i in picked[count // 2:]]
+    return exact, topical
+
+
+def evaluate(label, retrieve, query_set, k):
+    hits, timings = 0, []
+    for question, expected in query_set:
+        start = time.perf_counter()
+        results = retrieve(question)[:k]
+        timings.append((time.perf_counter() - start) * 1000)
+        hits += any(doc.page_content == expected for doc in results)
+    print(f"  {label:<30} recall@{k} {hits / len(query_set):6.1%}   p50 {statistics.median(timings):6.2f} ms")
+
+
+def run(size: int, count: int, k: int, rerank: str, ignore_codes: bool, embed_latency: float) -> None:
+    docs = corpus(size)
+    ids = [uuid.uuid4().hex for _ in docs]
+    embeddings = HashingEmbeddings(ignore_codes=ignore_codes)
+    store = Chroma(collection_name=f"bench-{uuid.uuid4().hex[:8]}", embedding_function=embeddings)
+    store.add_texts([d[0] for d in docs], metadatas=[d[1] for d in docs], ids=ids)
+    # Only queries pay the delay
+    embeddings.latency = embed_latency
+    bm25 = BM25Index()
+    bm25.add(ids, [d[0] for d in docs], [d[1] for d in docs])
+
+    hybrid = HybridRetriever(vectorstore=store, bm25=bm25, k=k)
+    loop = asyncio.new_event_loop()
+    retrievers = {
+        "vector only": lambda q: store.similarity_search(q, k=k),
+        "hybrid (BM25 + vector, RRF)": hybrid.invoke,
+        "hybrid, async": lambda q: loop.run_until_complete(hybrid.ainvoke(q)),
+    }
+    if rerank:
+        reranked = HybridRetriever(vectorstore=store, bm25=bm25, k=k, reranker=CrossEncoderReranker(rerank))
+        retrievers["hybrid + cross-encoder"] = reranked.invoke
+
+    exact, topical = queries(docs, count)
+    print(f"{size} chunks, {count} queries, embeddings {'without' if ignore_codes else 'with'} identifiers, "
+          f"{embed_latency * 1000:.0f} ms per query embedding")
+    for name, query_set in [("exact-term queries", exact), ("topical queries", topical)]:
+        print(f" {name}")
+        for label, retrieve in retrievers.items():
+            evaluate(label, retrieve, query_set, k)
+    loop.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--rerank", default="", help="cross-encoder model name, e.g. cross-encoder/ms-marco-MiniLM-L-6-v2")
+    parser.add_argument("--ignore-codes", action="store_true", help="embeddings drop tokens containing digits")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="seconds per query embedding call")
+    args = parser.parse_args()
+    run(args.size, args.queries, args.k, args.rerank, args.ignore_codes, args.embed_latency)
@@ -0,0 +1,66 @@
+"""Replay a paraphrased question log through AskGTMAgent with and without the semantic cache.
+
+Reports hit rate, p50 latency and (approximate) LLM tokens spent.
+Run from backend/:  python -m bench.askgtm_semantic_cache
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("ASKGTM_EMBEDDING_CACHE", "off")
+
+from agents.askgtm import AskGTMAgent
+from bench.stubs import HashingEmbeddings, SlowChatModel
+from core.semantic_cache import SemanticCache
+
+INTENTS = [
+    ["What's enterprise pricing?", "How much is enterprise pricing?", "Enterprise pricing please", "what is the enterprise pricing"],
+    ["Are we SOC 2 certified?", "Is the product SOC 2 certified?", "SOC 2 certification status?", "do we have SOC 2 certification"],
+    ["How long does onboarding take?", "Onboarding takes how long?", "how long is onboarding", "What's the onboarding timeline?"],
+    ["How do we compare to Clari?", "Compare us with Clari", "Clari comparison?", "how do we stack up against Clari"],
+    ["Which CRM integrations exist?", "What CRM integrations are supported?", "CRM integrations list", "CRM integrations available?"],
+    ["How to handle the too expensive objection?", "Objection: too expensive, how to respond?", "Responding to too expensive objection", "too expensive objection handling"],
+]
+
+
+def query_log(size: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [rng.choice(rng.choice(INTENTS)) for _ in range(size)]
+
+
+async def replay(questions, cache, latency: float):
+    llm = SlowChatModel(latency=latency, reply=lambda messages: "Stub answer about the knowledge base. " * 20)
+    with tempfile.TemporaryDirectory() as tmp:
+        agent = AskGTMAgent(persist_directory=os.path.join(tmp, "chroma"), llm=llm, embeddings=HashingEmbeddings(), answer_cache=cache or False)
+        timings = []
+        for question in questions:
+            # Each replayed question is a fresh single-turn conversation (no session id)
+            start = time.perf_counter()
+            await agent.ask_async(question)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings, llm.prompt_tokens + llm.completion_tokens
+
+
+async def run(size: int, latency: float, threshold: float) -> None:
+    questions = query_log(size)
+    baseline, baseline_tokens = await replay(questions, None, latency)
+    cache = SemanticCache(threshold=threshold)
+    cached, cached_tokens = await replay(questions, cache, latency)
+
+    print(f"{size} replayed questions, stub LLM latency {latency * 1000:.0f} ms, threshold {threshold}")
+    print(f"  no cache      p50 {statistics.median(baseline):8.2f} ms   tokens {baseline_tokens:>8}")
+    print(f"  semantic      p50 {statistics.median(cached):8.2f} ms   tokens {cached_tokens:>8}   "
+          f"hit rate {cache.stats()['hit_rate']:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    args = parser.parse_args()
+    asyncio.run(run(args.size, args.latency, args.threshold))
@@ -0,0 +1,90 @@
+"""Time to first byte and first token for /askgtm/ask/stream vs the buffered /askgtm/ask.
+
+Serves the real app in-process with an AskGTM agent built on a stub LLM
+that streams tokens on a delay. Run from backend/:  python -m bench.askgtm_stream
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("ASKGTM_EMBEDDING_CACHE", "off")
+os.environ.setdefault("ASKGTM_SEMANTIC_CACHE", "off")
+os.environ.setdefault("DEALSENSE_CACHE", "off")
+os.environ.setdefault("GTM_WARMUP", "off")
+
+import httpx
+import uvicorn
+
+import main
+from agents.askgtm import AskGTMAgent
+from bench.stubs import HashingEmbeddings, SlowChatModel
+from routers import askgtm
+
+ANSWER = ("Enterprise is custom priced with unlimited users, every feature and a dedicated CSM. "
+          "Professional is $149 a month for up to 20 users with priority support. ") * 3
+
+
+async def buffered(client: httpx.AsyncClient, question: str) -> dict:
+    start = time.perf_counter()
+    response = await client.post("/askgtm/ask", json={"question": question})
+    response.raise_for_status()
+    return {"first_byte": (time.perf_counter() - start) * 1000, "total": (time.perf_counter() - start) * 1000}
+
+
+async def streamed(client: httpx.AsyncClient, question: str) -> dict:
+    start = time.perf_counter()
+    timings = {}
+    async with client.stream("POST", "/askgtm/ask/stream", json={"question": question}) as response:
+        async for line in response.aiter_lines():
+            now = (time.perf_counter() - start) * 1000
+            timings.setdefault("first_byte", now)
+            if line == "event: token":
+                timings.setdefault("first_token", now)
+    timings["total"] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+async def run(rounds: int, latency: float, token_latency: float, embed_latency: float, port: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        llm = SlowChatModel(latency=latency, token_latency=token_latency, reply=lambda messages: ANSWER)
+        askgtm.askgtm_agent.set(AskGTMAgent(persist_directory=os.path.join(tmp, "chroma"), llm=llm,
+                                            embeddings=HashingEmbeddings(latency=embed_latency)))
+
+        server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+        serve_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+
+        results = {"buffered": [], "streamed": []}
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            for i in range(rounds):
+                results["buffered"].append(await buffered(client, f"What is enterprise pricing? {i}"))
+                results["streamed"].append(await streamed(client, f"What is enterprise pricing? {i}"))
+
+        server.should_exit = True
+        await serve_task
+
+    print(f"stub LLM: {latency * 1000:.0f} ms to first token, {token_latency * 1000:.0f} ms/token; "
+          f"embedding {embed_latency * 1000:.0f} ms")
+    for mode, samples in results.items():
+        line = f"  {mode:<9}"
+        for key in ("first_byte", "first_token", "total"):
+            values = [s[key] for s in samples if key in s]
+            if values:
+                line += f"  {key} p50 {statistics.median(values):7.1f} ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    asyncio.run(run(args.rounds, args.latency, args.token_latency, args.embed_latency, args.port))
@@ -0,0 +1,258 @@
+"""AskGTM behind `uvicorn --workers N`: ingest through every worker while all of them serve queries.
+
+Every worker gets an AskGTM agent with a stub LLM and hashing embeddings
+over one Chroma directory and, with --store mmap (the multi-worker mode),
+one memory-mapped index. Writers upload documents carrying unique markers,
+each first asked about so stale answers get cached; readers keep asking
+about markers whose upload has returned, over fresh connections so requests
+spread across workers. An answer that does not cite its marker is a stale
+read. Afterwards Chroma (reopened from disk) and the published index must
+each hold every upload exactly once. --store chroma shows the per-worker
+Chroma handles this replaces. Run from backend/:  python -m bench.askgtm_workers
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+
+from bench.stubs import HashingEmbeddings, SlowChatModel
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FEATURES = ["forecasting", "lead scoring", "Slack alerts", "CRM sync", "renewal tracking", "territory planning"]
+
+
+def create_app():
+    """uvicorn --factory entry point, run in each worker process"""
+    import main
+    from agents.askgtm import AskGTMAgent
+    from routers import askgtm
+
+    llm = SlowChatModel(latency=float(os.environ["BENCH_LLM_LATENCY"]), reply=lambda messages: "Stub answer.")
+    askgtm.askgtm_agent.set(AskGTMAgent(persist_directory=os.environ["BENCH_CHROMA_DIR"], llm=llm,
+                                        embeddings=HashingEmbeddings()))
+
+    @main.app.middleware("http")
+    async def worker_header(request, call_next):
+        response = await call_next(request)
+        response.headers["x-worker-pid"] = str(os.getpid())
+        return response
+
+    return main.app
+
+
+def document(marker: str) -> str:
+    return (f"Release note {marker}: {FEATURES[int(marker[2:]) % len(FEATURES)]} now supports {marker} workflows "
+            f"for accounts on the Professional plan.")
+
+
+def question(marker: str) -> str:
+    return f"Which release note covers {marker}?"
+
+
+def unique_markers(count: int) -> List[str]:
+    """Markers that no other word shares a hashing-embedding bucket with, so each question and document is distinct
+    (a collision would make the semantic cache treat two questions as one)"""
+    embeddings = HashingEmbeddings()
+    bucket = lambda text: max(range(embeddings.size), key=embeddings.embed_query(text).__getitem__)
+    common = " ".join([document("zq0"), question("zq0")] + FEATURES).replace("zq0", "")
+    taken = {bucket(word) for word in common.split()}
+    markers, n = [], 0
+    while len(markers) < count:
+        if len(taken) == embeddings.size:
+            raise ValueError(f"At most {len(markers)} distinct markers with {embeddings.size}-dimensional stub embeddings")
+        marker = f"zq{n}"
+        if bucket(marker) not in taken:
+            taken.add(bucket(marker))
+            markers.append(marker)
+        n += 1
+    return markers
+
+
+def cites(response: httpx.Response, marker: str) -> bool:
+    return any(marker in source["content"] for source in response.json()["sources"])
+
+
+class Run:
+    def __init__(self):
+        self.acknowledged: List[str] = []
+        self.reads: List[float] = []
+        self.writes: List[float] = []
+        self.stale: List[str] = []
+        self.errors: Counter = Counter()
+        self.pids: Dict[str, Counter] = {"read": Counter(), "write": Counter()}
+
+    def served(self, kind: str, response: httpx.Response):
+        self.pids[kind][response.headers.get("x-worker-pid")] += 1
+
+
+async def writer(client: httpx.AsyncClient, run: Run, markers: List[str]):
+    for marker in markers:
+        # Cache an answer that cannot cite the marker yet, on whichever worker takes it
+        await client.post("/askgtm/ask", json={"question": question(marker)})
+        start = time.perf_counter()
+        response = await client.post("/askgtm/add-document", json={
+            "text": document(marker), "metadata": {"source": f"release-{marker}", "category": "product"}
+        })
+        if response.status_code != 200:
+            run.errors[f"add-document {response.status_code}"] += 1
+            continue
+        run.writes.append((time.perf_counter() - start) * 1000)
+        run.served("write", response)
+        run.acknowledged.append(marker)
+
+
+async def reader(client: httpx.AsyncClient, run: Run, done: asyncio.Event, rng: random.Random):
+    while not done.is_set():
+        if not run.acknowledged:
+            await asyncio.sleep(0.01)
+            continue
+        # Mostly the newest uploads, where a stale worker would show
+        marker = run.acknowledged[-1] if rng.random() < 0.5 else rng.choice(run.acknowledged)
+        start = time.perf_counter()
+        response = await client.post("/askgtm/ask", json={"question": question(marker)})
+        if response.status_code != 200:
+            run.errors[f"ask {response.status_code}"] += 1
+            continue
+        run.reads.append((time.perf_counter() - start) * 1000)
+        run.served("read", response)
+        if not cites(response, marker):
+            run.stale.append(marker)
+
+
+async def wait_for_workers(client: httpx.AsyncClient, workers: int, timeout: float = 180) -> None:
+    """Until every worker has answered (each builds its agent before serving)"""
+    seen = set()
+    deadline = time.monotonic() + timeout
+    while len(seen) < workers:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Only {len(seen)} of {workers} workers came up")
+        try:
+            response = await client.get("/askgtm/stats")
+            if response.status_code == 200:
+                seen.add(response.headers.get("x-worker-pid"))
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+
+
+async def worker_stats(client: httpx.AsyncClient, workers: int, attempts: int = 500) -> Dict[str, dict]:
+    """/askgtm/stats from each worker"""
+    stats = {}
+    for _ in range(attempts):
+        response = await client.get("/askgtm/stats")
+        stats[response.headers.get("x-worker-pid")] = response.json()
+        if len(stats) == workers:
+            break
+    return stats
+
+
+def check_storage(tmp: str, store: str, markers: List[str], expected: int) -> List[str]:
+    """Problems with what is on disk once the workers have exited"""
+    from langchain_community.vectorstores import Chroma
+    from core.vector_index import MmapVectorIndex
+
+    problems = []
+    embeddings = HashingEmbeddings()
+    chroma = Chroma(persist_directory=os.path.join(tmp, "chroma"), embedding_function=embeddings)
+    if chroma._collection.count() != expected:
+        problems.append(f"Chroma holds {chroma._collection.count()} chunks, expected {expected}")
+    for marker in markers:
+        stored = chroma._collection.get(where={"source": f"release-{marker}"})["ids"]
+        if len(stored) != 1:
+            problems.append(f"{marker}: {len(stored)} copies in Chroma")
+        # The HNSW index too, not just Chroma's SQLite tables
+        top = chroma.similarity_search(document(marker), k=1)
+        if not top or marker not in top[0].page_content:
+            problems.append(f"{marker}: missing from Chroma's vector index")
+    if store == "mmap":
+        index = MmapVectorIndex.open(os.path.join(tmp, "index"))
+        if index.count != expected:
+            problems.append(f"index generation {index.generation} holds {index.count} chunks, expected {expected}")
+    return problems
+
+
+async def run(args) -> bool:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ, "OPENAI_API_KEY": "sk-bench", "GTM_WARMUP": "off", "ASKGTM_EMBEDDING_CACHE": "off",
+            "GTM_DB_PATH": os.path.join(tmp, "gtm.db"), "BENCH_CHROMA_DIR": os.path.join(tmp, "chroma"),
+            "BENCH_LLM_LATENCY": str(args.llm_latency), "ASKGTM_VECTOR_STORE": args.store,
+            "ASKGTM_VECTOR_INDEX_DIR": os.path.join(tmp, "index")
+        }
+        # Plain Chroma refuses to start with WEB_CONCURRENCY > 1; leave it unset to show why
+        if args.store == "mmap":
+            env["WEB_CONCURRENCY"] = str(args.workers)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "bench.askgtm_workers:create_app", "--factory", "--port", str(args.port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env, stderr=None if args.verbose else subprocess.DEVNULL
+        )
+        run = Run()
+        try:
+            # No keep-alive: every request is a new connection, accepted by whichever worker is free
+            limits = httpx.Limits(max_keepalive_connections=0)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=120) as client:
+                started = time.perf_counter()
+                await wait_for_workers(client, args.workers)
+                print(f"{args.workers} workers up in {time.perf_counter() - started:.1f}s ({args.store}); "
+                      f"{args.writers} writers x {args.documents} documents, {args.readers} readers")
+
+                done = asyncio.Event()
+                rng = random.Random(args.seed)
+                readers = [asyncio.create_task(reader(client, run, done, rng)) for _ in range(args.readers)]
+                started = time.perf_counter()
+                markers = unique_markers(args.writers * args.documents)
+                await asyncio.gather(*(writer(client, run, markers[w::args.writers]) for w in range(args.writers)))
+                done.set()
+                await asyncio.gather(*readers)
+                elapsed = time.perf_counter() - started
+
+                # Every acknowledged upload, once more, after all writes finished
+                final_stale = 0
+                for marker in run.acknowledged:
+                    response = await client.post("/askgtm/ask", json={"question": question(marker)})
+                    final_stale += response.status_code != 200 or not cites(response, marker)
+                stats = await worker_stats(client, args.workers)
+        finally:
+            server.terminate()
+            server.wait()
+
+        expected = 8 + len(run.acknowledged)  # sample documents + one chunk per upload
+        problems = check_storage(tmp, args.store, run.acknowledged, expected)
+
+    print(f"  {len(run.reads)} asks in {elapsed:.1f}s ({len(run.reads) / elapsed:.0f}/s), "
+          f"p50 {statistics.median(run.reads):.0f} ms, p95 {sorted(run.reads)[int(len(run.reads) * 0.95)]:.0f} ms; "
+          f"uploads p50 {statistics.median(run.writes):.0f} ms")
+    print(f"  asks per worker {sorted(run.pids['read'].values())}, uploads per worker {sorted(run.pids['write'].values())}")
+    print(f"  stale answers {len(run.stale)} during ingestion, {final_stale} after; errors {dict(run.errors) or 0}")
+    for pid, worker in sorted(stats.items()):
+        print(f"  worker {pid}: {worker['total_chunks']} chunks, vector store {worker['vector_store']}")
+    consistent = {worker["total_chunks"] for worker in stats.values()} == {expected}
+    print(f"  every worker reports {expected} chunks: {consistent}")
+    for problem in problems[:10]:
+        print(f"  on disk: {problem}")
+    print(f"  on disk: {'Chroma and index hold every upload once' if not problems else f'{len(problems)} problems'}")
+    return not (run.stale or final_stale or run.errors or problems) and consistent
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--store", choices=["mmap", "chroma"], default="mmap")
+    parser.add_argument("--writers", type=int, default=3)
+    parser.add_argument("--documents", type=int, default=15, help="uploads per writer")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--verbose", action="store_true", help="show the workers' stderr")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
@@ -0,0 +1,91 @@
+"""Upstream LLM calls for a burst of identical requests, with in-flight coalescing.
+
+Fires `--burst` identical requests at once at /askgtm/ask, /outreachai/generate
+and /dealsense/analyze-deal through the real app (caches off, stub LLMs with
+a fixed latency), then the same burst against an LLM that fails, to check
+that every caller gets the error. Run from backend/:  python -m bench.coalescing
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("ASKGTM_EMBEDDING_CACHE", "off")
+os.environ.setdefault("ASKGTM_SEMANTIC_CACHE", "off")
+os.environ.setdefault("DEALSENSE_CACHE", "off")
+os.environ.setdefault("GTM_WARMUP", "off")
+
+import httpx
+
+import main
+from agents.askgtm import AskGTMAgent
+from agents.dealsense import DealSenseAgent
+from agents.outreachai import OutreachAIAgent
+from bench.stubs import HashingEmbeddings, SlowChatModel, deal_score_reply, outreach_reply
+from core.metrics import registry
+from routers import askgtm, dealsense, outreachai
+
+DEAL = {"company_name": "Acme", "deal_value": 50000, "stage": "Negotiation", "days_in_pipeline": 40,
+        "last_contact_days": 3, "decision_maker_engaged": True, "has_competitor": False, "budget_confirmed": True}
+PROSPECT = {"company_name": "Acme", "industry": "SaaS", "company_size": "200", "pain_points": ["Long sales cycles"],
+            "decision_maker_name": "Jordan Lee", "decision_maker_title": "VP Sales", "channel": "email"}
+
+
+class FailingChatModel(SlowChatModel):
+    """Fails after the usual latency, like a provider error mid-call"""
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        raise RuntimeError("upstream failure")
+
+
+def agents(llm_class, latency: float, directory: str) -> dict:
+    """Install fresh agents on stub LLMs; returns the LLM of each endpoint"""
+    llms = {
+        "/askgtm/ask": llm_class(latency=latency, reply=lambda messages: "Professional is $149 a month."),
+        "/outreachai/generate": llm_class(latency=latency, reply=outreach_reply),
+        "/dealsense/analyze-deal": llm_class(latency=latency, reply=deal_score_reply),
+    }
+    askgtm.askgtm_agent.set(AskGTMAgent(persist_directory=os.path.join(directory, "chroma"),
+                                        llm=llms["/askgtm/ask"], embeddings=HashingEmbeddings()))
+    outreachai.outreach_agent.set(OutreachAIAgent(llm=llms["/outreachai/generate"]))
+    dealsense.dealsense_agent.set(DealSenseAgent(llm=llms["/dealsense/analyze-deal"]))
+    return llms
+
+
+async def burst(client: httpx.AsyncClient, path: str, body: dict, count: int):
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(client.post(path, json=body) for _ in range(count)))
+    return [r.status_code for r in responses], (time.perf_counter() - start) * 1000
+
+
+async def run(count: int, latency: float) -> None:
+    bodies = {
+        "/askgtm/ask": {"question": "What does the Professional plan cost?"},
+        "/outreachai/generate": PROSPECT,
+        "/dealsense/analyze-deal": DEAL,
+    }
+    transport = httpx.ASGITransport(app=main.app)
+    print(f"{count} identical concurrent requests per endpoint, stub LLM latency {latency * 1000:.0f} ms")
+    with tempfile.TemporaryDirectory() as directory:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for label, llm_class in (("ok", SlowChatModel), ("failing", FailingChatModel)):
+                llms = agents(llm_class, latency, os.path.join(directory, label))
+                for path, body in bodies.items():
+                    before = registry.value("gtm_coalesced_requests_total", agent=path.split("/")[1])
+                    statuses, elapsed = await burst(client, path, body, count)
+                    coalesced = registry.value("gtm_coalesced_requests_total", agent=path.split("/")[1]) - before
+                    by_status = {status: statuses.count(status) for status in sorted(set(statuses))}
+                    print(f"  {label:<8} {path:<24} upstream LLM calls {llms[path].calls:>3}   "
+                          f"coalesced {coalesced:>4.0f}   statuses {by_status}   {elapsed:6.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--burst", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    asyncio.run(run(args.burst, args.latency))
@@ -0,0 +1,52 @@
+"""Tokens per deal and throughput: one deal per LLM call vs multi-deal batched prompts.
+
+Run from backend/:  python -m bench.dealsense_batching
+"""
+import argparse
+import asyncio
+import os
+import time
+from functools import partial
+
+os.environ.setdefault("DEALSENSE_CACHE", "off")
+os.environ.setdefault("DEALSENSE_PRESCORE", "off")
+
+from agents.dealsense import DealSenseAgent, PipelineStats
+from bench.dealsense_prescore import random_pipeline
+from bench.stubs import SlowChatModel, deal_batch_reply
+
+
+async def run(deals: int, latency: float, token_latency: float, concurrency: int, budgets: list, drop_every: int) -> None:
+    df = random_pipeline(deals)
+    print(f"{deals} deals, {latency * 1000:.0f} ms per call + {token_latency * 1000:.1f} ms per output token, "
+          f"concurrency {concurrency}")
+    print(f"{'mode':<26} {'calls':>6} {'retried':>8} {'prompt tok/deal':>16} {'output tok/deal':>16} {'deals/s':>9}")
+
+    modes = [("one deal per call", False, None)] + [(f"batched, budget {b}", True, b) for b in budgets]
+    for label, batching, budget in modes:
+        llm = SlowChatModel(
+            reply=partial(deal_batch_reply, drop_every=drop_every),
+            latency=latency,
+            token_latency=token_latency
+        )
+        agent = DealSenseAgent(llm=llm, concurrency=concurrency, batching=batching, batch_token_budget=budget)
+        stats = PipelineStats()
+        start = time.perf_counter()
+        scores = await agent.analyze_pipeline_async(df, stats=stats)
+        elapsed = time.perf_counter() - start
+        if batching:
+            assert [s.deal_id for s in scores] == list(df["deal_id"])
+        print(f"{label:<26} {llm.calls:>6} {stats.retried:>8} {llm.prompt_tokens / deals:>16.0f} "
+              f"{llm.completion_tokens / deals:>16.0f} {deals / elapsed:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--deals", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.002)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[2000, 4000, 8000])
+    parser.add_argument("--drop-every", type=int, default=0, help="omit every nth deal from batch replies")
+    args = parser.parse_args()
+    asyncio.run(run(args.deals, args.latency, args.token_latency, args.concurrency, args.budgets, args.drop_every))
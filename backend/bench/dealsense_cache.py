@@ -0,0 +1,55 @@
+"""LLM calls made when a pipeline is re-uploaded with a fraction of rows changed.
+
+Run from backend/:  python -m bench.dealsense_cache
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DEALSENSE_PRESCORE", "off")
+
+from agents.dealsense import DealSenseAgent
+from bench.dealsense_concurrency import sample_pipeline
+from bench.stubs import SlowChatModel
+from core.cache import CacheStats, LRUCache, SQLiteCache, TieredCache
+
+
+async def run(rows: int, changed: float, latency: float) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TieredCache([LRUCache(), SQLiteCache("dealsense_cache", path=os.path.join(tmp, "cache.db"))])
+        llm = SlowChatModel(latency=latency)
+        agent = DealSenseAgent(llm=llm, concurrency=32, cache=cache)
+        df = sample_pipeline(rows)
+
+        for label, upload in [("first upload", df), ("identical re-upload", df)]:
+            await report(agent, llm, label, upload)
+
+        edited = df.copy()
+        step = max(1, int(1 / changed))
+        edited.loc[::step, "last_contact_days"] += 7
+        await report(agent, llm, f"re-upload, {len(edited.loc[::step])} rows changed", edited)
+
+        # A fresh process only has the SQLite tier
+        cold = DealSenseAgent(llm=llm, concurrency=32, cache=TieredCache([LRUCache(), cache.tiers[1]]))
+        await report(cold, llm, "new process, same upload", edited)
+
+
+async def report(agent, llm, label, df) -> None:
+    stats = CacheStats()
+    calls = llm.calls
+    start = time.perf_counter()
+    await agent.analyze_pipeline_async(df, stats=stats)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<32} {llm.calls - calls:>5} LLM calls  "
+          f"{stats.hits:>5} hits / {stats.misses:>5} misses  {elapsed:6.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--changed", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.changed, args.latency))
@@ -0,0 +1,53 @@
+"""Deals/sec of DealSenseAgent.analyze_pipeline_async at increasing concurrency.
+
+Run from backend/:  python -m bench.dealsense_concurrency
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("DEALSENSE_CACHE", "off")
+os.environ.setdefault("DEALSENSE_PRESCORE", "off")
+
+import pandas as pd
+
+from agents.dealsense import DealSenseAgent
+from bench.stubs import SlowChatModel
+
+
+def sample_pipeline(rows: int) -> pd.DataFrame:
+    return pd.DataFrame([
+        {
+            "company_name": f"Company {i}",
+            "deal_value": 10000 + i * 250,
+            "stage": ["Discovery", "Proposal", "Negotiation"][i % 3],
+            "days_in_pipeline": 10 + i % 90,
+            "last_contact_days": i % 21,
+            "decision_maker_engaged": i % 2 == 0,
+            "has_competitor": i % 3 == 0,
+            "budget_confirmed": i % 4 != 0,
+        }
+        for i in range(rows)
+    ])
+
+
+async def run(rows: int, latency: float, levels) -> None:
+    df = sample_pipeline(rows)
+    print(f"{rows} deals, stub LLM latency {latency * 1000:.0f} ms")
+    for concurrency in levels:
+        agent = DealSenseAgent(llm=SlowChatModel(latency=latency), concurrency=concurrency)
+        start = time.perf_counter()
+        results = await agent.analyze_pipeline_async(df)
+        elapsed = time.perf_counter() - start
+        assert [r.company_name for r in results] == list(df["company_name"])
+        print(f"  concurrency {concurrency:>3}: {elapsed:6.2f}s  {rows / elapsed:8.1f} deals/sec")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.latency, args.levels))
@@ -0,0 +1,78 @@
+"""Daily pipeline upload: full re-score vs delta scoring against the previous snapshot, at several pipeline sizes.
+
+Day one seeds the snapshot with a zero-latency stub; day two changes a fixed
+number of deals, so delta time should stay flat as the pipeline grows.
+Run from backend/:  python -m bench.dealsense_delta
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DEALSENSE_CACHE", "off")
+
+import numpy as np
+import pandas as pd
+
+from agents.deal_rules import EscalationPolicy
+from agents.deal_snapshots import DealSnapshotStore, PipelineSnapshots
+from agents.dealsense import DealSenseAgent, PipelineStats
+from bench.dealsense_prescore import random_pipeline
+from bench.stubs import SlowChatModel, deal_batch_reply
+
+
+def next_day(df: pd.DataFrame, changed: int, added: int, removed: int, seed: int = 2) -> pd.DataFrame:
+    """Yesterday's export with `changed` deals touched, `added` new ones and `removed` closed out"""
+    rng = np.random.default_rng(seed)
+    today = df.copy()
+    rows = rng.choice(len(today), changed + removed, replace=False)
+    touched = today.index[rows[:changed]]
+    today.loc[touched, "last_contact_days"] = today.loc[touched, "last_contact_days"] + 7
+    today.loc[touched, "days_in_pipeline"] = today.loc[touched, "days_in_pipeline"] + 1
+    today = today.drop(index=today.index[rows[changed:]])
+    fresh = random_pipeline(added, seed=seed).assign(deal_id=[f"N-{i}" for i in range(added)])
+    return pd.concat([today, fresh], ignore_index=True)
+
+
+async def run(sizes, changed: int, latency: float, concurrency: int) -> None:
+    print(f"day two: {changed} changed, {changed // 4} new, {changed // 4} removed; LLM latency {latency}s, concurrency {concurrency}")
+    for rows in sizes:
+        day_one = random_pipeline(rows)
+        day_two = next_day(day_one, changed, changed // 4, changed // 4)
+
+        with tempfile.TemporaryDirectory() as directory:
+            snapshots = PipelineSnapshots(DealSnapshotStore(directory))
+
+            # Seed the snapshot; batching only changes how the stub is called, not the scorer key
+            seed_agent = DealSenseAgent(llm=SlowChatModel(latency=0.0, reply=deal_batch_reply), concurrency=64,
+                                        escalation=EscalationPolicy(), batching=True)
+            start = time.perf_counter()
+            seeded = PipelineStats()
+            await snapshots.analyze(seed_agent, "bench", day_one, stats=seeded)
+            seed_seconds = time.perf_counter() - start
+
+            llm = SlowChatModel(latency=latency)
+            agent = DealSenseAgent(llm=llm, concurrency=concurrency, escalation=EscalationPolicy())
+            start = time.perf_counter()
+            delta = await snapshots.analyze(agent, "bench", day_two)
+            elapsed = time.perf_counter() - start
+
+            snapshot_kb = os.path.getsize(os.path.join(directory, "bench.parquet")) / 1e3
+
+        # A full re-score sends every escalated deal to the LLM again
+        full_estimate = seeded.escalated * latency / concurrency
+        print(f"  {rows:>9,} deals  seed {seed_seconds:6.1f}s  "
+              f"delta: {delta.new + delta.changed:>5} re-scored, {llm.calls:>4} LLM calls, {elapsed:5.2f}s  "
+              f"(full re-score ~{seeded.escalated:,} LLM calls, ~{full_estimate:,.0f}s)  "
+              f"snapshot {snapshot_kb:,.0f} KB  forecast change {delta.weighted_forecast_change:+,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--changed", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(run([int(s) for s in args.sizes.split(",")], args.changed, args.latency, args.concurrency))
@@ -0,0 +1,66 @@
+"""Rules-based pre-scoring throughput and LLM escalation rate on a large synthetic pipeline.
+
+Run from backend/:  python -m bench.dealsense_prescore
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("DEALSENSE_CACHE", "off")
+
+import numpy as np
+import pandas as pd
+
+from agents.deal_rules import EscalationPolicy
+from agents.dealsense import DealSenseAgent, PipelineStats
+from bench.stubs import SlowChatModel
+
+
+def random_pipeline(rows: int, seed: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    stages = ["Prospecting", "Discovery", "Demo", "Proposal", "Negotiation", "Contract", "Closed Won", "Mystery"]
+    return pd.DataFrame({
+        "deal_id": [f"D-{i}" for i in range(rows)],
+        "company_name": [f"Company {i}" for i in range(rows)],
+        "deal_value": rng.integers(5_000, 500_000, rows),
+        "stage": rng.choice(stages, rows, p=[.2, .2, .15, .15, .12, .08, .05, .05]),
+        "days_in_pipeline": rng.integers(1, 200, rows),
+        "last_contact_days": rng.integers(0, 60, rows),
+        "decision_maker_engaged": rng.choice(["Yes", "No", ""], rows, p=[.5, .45, .05]),
+        "has_competitor": rng.choice([True, False], rows),
+        "budget_confirmed": rng.choice(["Yes", "No"], rows),
+    })
+
+
+async def run(rows: int, llm_rows: int, latency: float) -> None:
+    df = random_pipeline(rows)
+    agent = DealSenseAgent(llm=SlowChatModel(latency=latency), concurrency=32, escalation=EscalationPolicy())
+
+    start = time.perf_counter()
+    scored = agent.prescore(df)
+    elapsed = time.perf_counter() - start
+    print(f"prescore {rows:,} rows: {elapsed * 1000:.0f} ms ({rows / elapsed:,.0f} rows/s), "
+          f"{scored['escalate'].mean():.1%} inside the escalation window")
+    print(f"  risk mix: {scored['risk_level'].value_counts(normalize=True).round(3).to_dict()}")
+
+    # End to end on a smaller slice: rules-decided deals skip the LLM entirely
+    sample = df.head(llm_rows)
+    for label, policy in [("LLM for every deal", None), ("pre-scored, LLM for ambiguous only", EscalationPolicy())]:
+        llm = SlowChatModel(latency=latency)
+        agent = DealSenseAgent(llm=llm, concurrency=32)
+        agent.escalation = policy
+        stats = PipelineStats()
+        start = time.perf_counter()
+        await agent.analyze_pipeline_async(sample, stats=stats)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<36} {llm_rows} deals  {llm.calls:>5} LLM calls  {elapsed:6.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--llm-rows", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.1)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.llm_rows, args.latency))
@@ -0,0 +1,52 @@
+"""Provider embedding calls when rebuilding a Chroma store against a cold and a warm embedding cache.
+
+Run from backend/:  python -m bench.embedding_cache
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from langchain_community.vectorstores import Chroma
+
+from bench.askgtm_ingest import as_jsonl, synthetic_corpus
+from bench.stubs import HashingEmbeddings
+from core.embedding_cache import CachedEmbeddings
+from core.ingestion import IngestionPipeline, iter_json_documents
+
+
+async def rebuild(label: str, directory: str, corpus, embeddings: CachedEmbeddings, provider: HashingEmbeddings):
+    calls, texts = provider.calls, provider.texts
+    store = Chroma(collection_name="rebuild", persist_directory=directory, embedding_function=embeddings)
+    start = time.perf_counter()
+    report = await IngestionPipeline(store, embeddings).aingest(iter_json_documents(as_jsonl(corpus)))
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {report.chunks:>6} chunks  {provider.calls - calls:>4} provider calls  "
+          f"{provider.texts - texts:>6} texts sent  {elapsed:6.2f}s")
+
+
+async def run(size: int, latency: float) -> None:
+    corpus = list(synthetic_corpus(size))
+    with tempfile.TemporaryDirectory() as tmp:
+        provider = HashingEmbeddings(latency=latency)
+        cache_path = os.path.join(tmp, "embeddings.db")
+
+        print(f"{size} documents, fake provider with {latency * 1000:.0f} ms per call")
+        await rebuild("cold cache", os.path.join(tmp, "a"), corpus, CachedEmbeddings(provider, path=cache_path), provider)
+        # New store from scratch, new process-level cache object, same SQLite file
+        cached = CachedEmbeddings(provider, path=cache_path)
+        await rebuild("warm cache, fresh chroma_db", os.path.join(tmp, "b"), corpus, cached, provider)
+        cached.embed_query("What is enterprise pricing?")
+        cached.embed_query("What is enterprise pricing?")
+        print(f"  repeated query: {cached.stats()}")
+        size_mb = os.path.getsize(cache_path) / 1e6
+        print(f"  cache file {size_mb:.1f} MB ({provider.size}-dim float32 vectors)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+    asyncio.run(run(args.size, args.latency))
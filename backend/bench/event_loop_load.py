@@ -0,0 +1,114 @@
+"""GET / latency while 50 concurrent /askgtm/ask calls hit a slow stubbed LLM.
+
+Runs the real app under uvicorn in a subprocess with an AskGTM agent built on
+offline stubs (LLM, embeddings) over a temporary Chroma directory seeded with
+the sample documents, so the vector store, BM25 and retriever all see the same
+corpus and the client does not share the server's event loop. Then measures
+root-endpoint latency idle and under load.
+Run from backend/:  python -m bench.event_loop_load
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def create_app():
+    """uvicorn --factory entry point, run in the server process"""
+    import main
+    from agents.askgtm import AskGTMAgent
+    from bench.stubs import HashingEmbeddings, SlowChatModel
+    from routers import askgtm
+
+    llm = SlowChatModel(latency=float(os.environ["BENCH_LLM_LATENCY"]), reply=lambda messages: "Stub answer")
+    askgtm.askgtm_agent.set(AskGTMAgent(persist_directory=os.environ["BENCH_CHROMA_DIR"], llm=llm,
+                                        embeddings=HashingEmbeddings()))
+    return main.app
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def probe_root(client: httpx.AsyncClient, count: int, interval: float):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = await client.get("/")
+        response.raise_for_status()
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return samples
+
+
+def report(label: str, samples) -> None:
+    print(f"  {label:<24} p50 {statistics.median(samples):7.2f} ms   p99 {percentile(samples, 0.99):7.2f} ms")
+
+
+async def wait_for_server(client: httpx.AsyncClient, timeout: float = 120) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            (await client.get("/")).raise_for_status()
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Server did not come up")
+            await asyncio.sleep(0.2)
+
+
+async def run(concurrent_asks: int, latency: float, port: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ, "OPENAI_API_KEY": "sk-bench", "GTM_WARMUP": "off", "ASKGTM_EMBEDDING_CACHE": "off",
+            # Every ask should reach the stub LLM
+            "ASKGTM_SEMANTIC_CACHE": "off", "DEALSENSE_CACHE": "off",
+            "GTM_DB_PATH": os.path.join(tmp, "gtm.db"), "BENCH_CHROMA_DIR": os.path.join(tmp, "chroma"),
+            "BENCH_LLM_LATENCY": str(latency)
+        }
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "bench.event_loop_load:create_app", "--factory", "--port", str(port),
+             "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env
+        )
+        try:
+            limits = httpx.Limits(max_connections=concurrent_asks + 10)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+                await wait_for_server(client)
+                # One ask first so lazy imports and first-use setup are not counted as load
+                (await client.post("/askgtm/ask", json={"question": "What is enterprise pricing?"})).raise_for_status()
+                idle = await probe_root(client, 50, 0.01)
+
+                asks = [
+                    client.post("/askgtm/ask", json={"question": f"What is enterprise pricing? ({i})"})
+                    for i in range(concurrent_asks)
+                ]
+                ask_task = asyncio.gather(*asks)
+                loaded = await probe_root(client, 50, latency / 50)
+                responses = await ask_task
+        finally:
+            server.terminate()
+            server.wait()
+
+    failed = sum(r.status_code != 200 for r in responses)
+    print(f"{concurrent_asks} concurrent /askgtm/ask, stub LLM latency {latency * 1000:.0f} ms ({failed} failed)")
+    report("GET / idle", idle)
+    report("GET / under ask load", loaded)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--asks", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(run(args.asks, args.latency, args.port))
@@ -0,0 +1,189 @@
+"""Interactive latency during bulk jobs, with and without the shared LLM scheduler.
+
+A local stub of the OpenAI chat completions API enforces requests- and
+tokens-per-minute quotas the way OpenAI does (prompt + max_tokens counted
+up front, 429 with retry-after-ms and x-ratelimit-* headers). Two batch jobs
+share one process with an interactive caller; real ChatOpenAI clients talk to
+the stub, either directly (each retrying 429s on its own) or through
+core.scheduler_http. Run from backend/:  python -m bench.llm_scheduler
+"""
+import argparse
+import asyncio
+import random
+import socket
+import statistics
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from langchain_openai import ChatOpenAI
+
+from core.concurrency import call_with_retry
+from core.scheduler import LLMScheduler, TokenBucket, llm_lane
+from core.scheduler_http import ScheduledTransport
+
+MODEL = "gpt-4o-mini"
+MAX_TOKENS = 150
+
+
+class QuotaServer:
+    """Chat completions stub with OpenAI-style request and token quotas"""
+
+    def __init__(self, rpm: float, tpm: float, latency: float):
+        self.requests, self.tokens = TokenBucket(rpm), TokenBucket(tpm)
+        self.rpm, self.tpm, self.latency = rpm, tpm, latency
+        self.served = 0
+        self.rejected = 0
+        self.app = FastAPI()
+        self.app.post("/v1/chat/completions")(self.complete)
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "x-ratelimit-limit-requests": str(int(self.rpm)),
+            "x-ratelimit-limit-tokens": str(int(self.tpm)),
+            "x-ratelimit-remaining-requests": str(max(int(self.requests.level), 0)),
+            "x-ratelimit-remaining-tokens": str(max(int(self.tokens.level), 0)),
+        }
+
+    async def complete(self, request: Request):
+        body = await request.json()
+        cost = sum(len(str(m.get("content") or "")) for m in body["messages"]) / 4 + (body.get("max_tokens") or 500)
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(cost))
+        if wait > 0:
+            self.rejected += 1
+            headers = {**self._headers(), "retry-after-ms": str(int(wait * 1000) + 1)}
+            error = {"error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"}}
+            return JSONResponse(error, status_code=429, headers=headers)
+        self.requests.take(1)
+        self.tokens.take(cost)
+        await asyncio.sleep(self.latency * random.uniform(0.75, 1.25))
+        self.served += 1
+        return JSONResponse({
+            "id": f"chatcmpl-{self.served}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": int(cost) - MAX_TOKENS, "completion_tokens": 1, "total_tokens": int(cost) - MAX_TOKENS + 1}
+        }, headers=self._headers())
+
+
+def start_server(app: FastAPI) -> Tuple[uvicorn.Server, int]:
+    """Serve the stub on its own thread and event loop so client load does not slow it down"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, port
+
+
+def prompt(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(("deal", "renewal", "pipeline", "budget", "champion", "pricing")) for _ in range(words))
+
+
+async def batch_job(llm: ChatOpenAI, name: str, count: int, concurrency: int, delay: float, rng: random.Random) -> dict:
+    await asyncio.sleep(delay)
+    semaphore = asyncio.Semaphore(concurrency)
+    failed = 0
+
+    async def one(i: int):
+        nonlocal failed
+        async with semaphore:
+            try:
+                # Retried the way the agents retry rate limits
+                await call_with_retry(lambda: llm.ainvoke(prompt(rng, 160)))
+            except Exception:
+                failed += 1
+
+    start = time.perf_counter()
+    with llm_lane("batch", client=name):
+        await asyncio.gather(*(one(i) for i in range(count)))
+    return {"name": name, "seconds": time.perf_counter() - start, "failed": failed}
+
+
+async def interactive(llm: ChatOpenAI, interval: float, done: asyncio.Event, rng: random.Random) -> List[Optional[float]]:
+    """One interactive call every `interval` seconds until the jobs finish; None marks a failed call"""
+    async def one():
+        start = time.perf_counter()
+        try:
+            await call_with_retry(lambda: llm.ainvoke(prompt(rng, 240)))
+            return (time.perf_counter() - start) * 1000
+        except Exception:
+            return None
+
+    tasks = []
+    while not done.is_set():
+        tasks.append(asyncio.create_task(one()))
+        await asyncio.sleep(interval)
+    return await asyncio.gather(*tasks)
+
+
+async def scenario(base_url: str, assumed: Optional[float], args) -> dict:
+    """assumed: None for no scheduler, else the multiple of the real quota the scheduler is configured with"""
+    rng = random.Random(5)
+    http_client = None
+    if assumed is not None:
+        limits = {MODEL: (args.rpm * assumed, args.tpm * assumed)}
+        scheduler = LLMScheduler(limits=limits, batch_share=args.batch_share)
+        http_client = httpx.AsyncClient(transport=ScheduledTransport(scheduler), timeout=60)
+    llm = ChatOpenAI(model=MODEL, base_url=base_url, api_key="stub", max_tokens=MAX_TOKENS, http_async_client=http_client)
+
+    done = asyncio.Event()
+    start = time.perf_counter()
+    probe = asyncio.create_task(interactive(llm, args.interval, done, rng))
+    jobs = await asyncio.gather(
+        batch_job(llm, "job-a", args.job_a, args.concurrency, 0.0, rng),
+        batch_job(llm, "job-b", args.job_b, args.concurrency, args.job_b_delay, rng),
+    )
+    done.set()
+    latencies = await probe
+    if http_client is not None:
+        await http_client.aclose()
+    return {"jobs": jobs, "latencies": latencies, "seconds": time.perf_counter() - start}
+
+
+def report(label: str, result: dict, rejected: int, budget_ms: float):
+    ok = sorted(value for value in result["latencies"] if value is not None)
+    failed = len(result["latencies"]) - len(ok)
+    p95 = ok[min(int(len(ok) * 0.95), len(ok) - 1)] if ok else float("nan")
+    verdict = "within" if ok and not failed and p95 <= budget_ms else "OVER"
+    print(f"  {label:<22} interactive n={len(result['latencies']):>3}  p50 {statistics.median(ok) if ok else float('nan'):7.0f} ms  "
+          f"p95 {p95:7.0f} ms  max {ok[-1] if ok else float('nan'):7.0f} ms  failed {failed:>2}  "
+          f"({verdict} {budget_ms:.0f} ms budget)   429s from server {rejected:>4}")
+    jobs = "  ".join(f"{job['name']} {job['seconds']:5.1f}s ({job['failed']} failed)" for job in result["jobs"])
+    print(f"  {'':<22} batch: {jobs}   wall {result['seconds']:5.1f}s")
+
+
+async def run(args) -> None:
+    print(f"stub quota {args.rpm:.0f} RPM / {args.tpm:,.0f} TPM, latency {args.latency * 1000:.0f} ms; "
+          f"job-a {args.job_a} + job-b {args.job_b} requests at concurrency {args.concurrency}, "
+          f"interactive call every {args.interval}s")
+    # The last run starts the scheduler with twice the real quota; the x-ratelimit headers correct it
+    for label, assumed in (("unscheduled", None), ("scheduled", 1.0), ("scheduled, 2x limits", 2.0)):
+        quota = QuotaServer(args.rpm, args.tpm, args.latency)
+        server, port = start_server(quota.app)
+        result = await scenario(f"http://127.0.0.1:{port}/v1", assumed, args)
+        server.should_exit = True
+        report(label, result, quota.rejected, args.budget_ms)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rpm", type=float, default=1200)
+    parser.add_argument("--tpm", type=float, default=240_000)
+    parser.add_argument("--latency", type=float, default=0.4)
+    parser.add_argument("--job-a", type=int, default=150)
+    parser.add_argument("--job-b", type=int, default=80)
+    parser.add_argument("--job-b-delay", type=float, default=2.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--batch-share", type=float, default=0.8)
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,62 @@
+"""Cost of the metrics layer per LLM call, per span and per /metrics scrape, with recording on and off.
+
+Uses a zero-latency stub LLM so the measured time is LangChain plus
+instrumentation. Run from backend/:  python -m bench.metrics_overhead
+"""
+import argparse
+import asyncio
+import time
+
+import core.metrics as metrics
+from bench.stubs import SlowChatModel
+from core.metrics import endpoint, registry, run_config, span
+
+
+async def llm_calls(llm: SlowChatModel, calls: int) -> float:
+    start = time.perf_counter()
+    with endpoint("bench"):
+        for _ in range(calls):
+            await llm.ainvoke("Score this deal", config=run_config("deal_score"))
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def spans(calls: int) -> float:
+    start = time.perf_counter()
+    with endpoint("bench"):
+        for _ in range(calls):
+            with span("vectorstore", "similarity_search"):
+                pass
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def scrape(series: int) -> float:
+    for i in range(series):
+        registry.observe("gtm_stage_seconds", (("endpoint", f"/route/{i % 20}"), ("kind", "llm"), ("stage", f"s{i}")), 0.1)
+    start = time.perf_counter()
+    text = registry.render()
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"  /metrics render with {series} histogram series: {elapsed:.1f} ms, {len(text) / 1e3:.0f} KB")
+    return elapsed
+
+
+async def run(calls: int) -> None:
+    llm = SlowChatModel(latency=0.0, reply=lambda messages: "ok")
+    await llm_calls(llm, 50)  # warm up
+
+    print(f"{calls} calls each")
+    results = {}
+    for enabled in (False, True):
+        metrics.ENABLED = enabled
+        results[enabled] = (await llm_calls(llm, calls), spans(calls))
+        label = "on " if enabled else "off"
+        print(f"  metrics {label}: {results[enabled][0]:7.1f} us per LLM call   {results[enabled][1]:5.2f} us per span")
+    print(f"  overhead: {results[True][0] - results[False][0]:+.1f} us per LLM call "
+          f"(a real call takes 300,000+ us), {results[True][1] - results[False][1]:+.2f} us per span")
+    scrape(400)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.calls))
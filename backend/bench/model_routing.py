@@ -0,0 +1,194 @@
+"""Cost per request and latency per model tier, routed vs. everything on gpt-4o.
+
+A local stub of the OpenAI chat completions API answers with canned JSON at
+per-model latencies; the cheap model returns an invalid answer (an email far
+over its word limit, a probability above 100) a configurable fraction of the
+time. Real ChatOpenAI clients talk to it through the DealSense and OutreachAI
+agents, so the strict json_schema response_format is exercised end to end;
+cost and tiers are read from the X-LLM-Cost-USD and X-Model-Tiers headers.
+Run from backend/:  python -m bench.model_routing
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("DEALSENSE_CACHE", "off")
+os.environ.setdefault("GTM_WARMUP", "off")
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+
+import main
+from agents.dealsense import DealSenseAgent
+from agents.outreachai import OutreachAIAgent
+from bench.llm_scheduler import start_server
+from bench.stubs import deal_score_reply, outreach_reply
+from core.routing import tier_models
+from routers import dealsense, outreachai
+
+# (seconds to first token, seconds per output token) per model
+MODEL_LATENCY = {"gpt-4o-mini": (0.30, 0.004), "gpt-4o": (0.70, 0.012)}
+PAIN_POINTS = [
+    "Long sales cycles", "Manual CRM updates eat two hours of every rep's day",
+    "Forecasts miss by 20% because stage definitions differ between regions",
+    "Onboarding new SDRs takes a full quarter", "Pipeline visibility",
+    "Renewals slip because CS only hears about churn risk after the notice period",
+]
+
+
+class StructuredStub:
+    """Chat completions stub answering json_schema requests with canned JSON"""
+
+    def __init__(self, invalid: float, seed: int):
+        self.invalid = invalid
+        self.rng = random.Random(seed)
+        self.served = Counter()
+        self.unstructured = 0
+        self.app = FastAPI()
+        self.app.post("/v1/chat/completions")(self.complete)
+
+    def _content(self, schema: str, messages: List[HumanMessage], model: str) -> str:
+        broken = model == "gpt-4o-mini" and self.rng.random() < self.invalid
+        if schema == "OutreachDraft":
+            draft = json.loads(outreach_reply(messages))
+            if broken:
+                draft["body"] = " ".join([draft["body"]] * 20)
+            return json.dumps(draft)
+        score = json.loads(deal_score_reply(messages))
+        if broken:
+            score["close_probability"] = 140
+        return json.dumps({k: score[k] for k in ("close_probability", "risk_level", "reasoning", "next_actions")})
+
+    async def complete(self, request: Request):
+        body = await request.json()
+        model = body["model"]
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") != "json_schema":
+            self.unstructured += 1
+        messages = [HumanMessage(content=str(m.get("content") or "")) for m in body["messages"]]
+        content = self._content(response_format.get("json_schema", {}).get("name", ""), messages, model)
+        prompt_tokens, completion_tokens = sum(len(m.content) for m in messages) // 4, len(content) // 4
+        first, per_token = MODEL_LATENCY[model]
+        await asyncio.sleep((first + per_token * completion_tokens) * self.rng.uniform(0.85, 1.15))
+        self.served[model] += 1
+        return JSONResponse({
+            "id": f"chatcmpl-{sum(self.served.values())}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        })
+
+
+def workload(count: int, seed: int) -> List[tuple]:
+    """(path, body) pairs: deals with a long-tailed value mix and prospects across channels"""
+    rng = random.Random(seed)
+    requests = []
+    for i in range(count):
+        requests.append(("/dealsense/analyze-deal", {
+            "company_name": f"Deal Co {i}", "deal_value": round(rng.lognormvariate(10.8, 0.8), -2),
+            "stage": rng.choice(["Discovery", "Proposal", "Negotiation"]), "days_in_pipeline": rng.randint(5, 120),
+            "last_contact_days": rng.randint(0, 30), "decision_maker_engaged": rng.random() < 0.5,
+            "has_competitor": rng.random() < 0.4, "budget_confirmed": rng.random() < 0.5
+        }))
+        requests.append(("/outreachai/generate", {
+            "company_name": f"Prospect Co {i}", "industry": "SaaS", "company_size": "200",
+            "pain_points": rng.sample(PAIN_POINTS, rng.randint(1, 3)),
+            "recent_activity": rng.choice([None, "Raised a Series B and is hiring 30 AEs across EMEA"]),
+            "channel": rng.choice(["email", "email", "linkedin", "slack"])
+        }))
+    rng.shuffle(requests)
+    return requests
+
+
+def install(base_url: str, models: Dict[str, str]):
+    """Agents whose tiers are real ChatOpenAI clients pointed at the stub"""
+    def tiers(temperature: float):
+        return {tier: ChatOpenAI(model=model, temperature=temperature, base_url=base_url, api_key="stub", max_retries=0)
+                for tier, model in models.items()}
+    dealsense.dealsense_agent.set(DealSenseAgent(tiers=tiers(0.3)))
+    outreachai.outreach_agent.set(OutreachAIAgent(tiers=tiers(0.7)))
+
+
+async def drive(requests: List[tuple], concurrency: int) -> List[dict]:
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def one(path: str, body: dict) -> dict:
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(path, json=body)
+                tiers = response.headers.get("x-model-tiers", "")
+                return {
+                    "path": path, "status": response.status_code, "ms": (time.perf_counter() - start) * 1000,
+                    "cost": float(response.headers.get("x-llm-cost-usd", 0)),
+                    "tier": "escalated" if "," in tiers else tiers.split("=")[0] or "none"
+                }
+        return await asyncio.gather(*(one(path, body) for path, body in requests))
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else float("nan")
+
+
+def report(label: str, results: List[dict]) -> Dict[str, float]:
+    print(f"  {label}")
+    costs = {}
+    for path in sorted({r["path"] for r in results}):
+        rows = [r for r in results if r["path"] == path]
+        ok = [r for r in rows if r["status"] == 200]
+        costs[path] = statistics.mean(r["cost"] for r in ok) if ok else float("nan")
+        print(f"    {path:<24} ${costs[path]:.6f}/request  p50 {statistics.median(r['ms'] for r in ok):6.0f} ms  "
+              f"p95 {percentile([r['ms'] for r in ok], 0.95):6.0f} ms  errors {len(rows) - len(ok)}")
+        by_tier = defaultdict(list)
+        for r in ok:
+            by_tier[r["tier"]].append(r)
+        for tier in ("fast", "quality", "escalated"):
+            if by_tier[tier]:
+                latencies = [r["ms"] for r in by_tier[tier]]
+                print(f"      {tier:<10} {len(latencies):>4} requests  ${statistics.mean(r['cost'] for r in by_tier[tier]):.6f}/request  "
+                      f"p50 {statistics.median(latencies):6.0f} ms  p95 {percentile(latencies, 0.95):6.0f} ms")
+    return costs
+
+
+async def run(count: int, concurrency: int, invalid: float, seed: int) -> None:
+    routed = tier_models()
+    arms = (("routed " + ", ".join(f"{t}={m}" for t, m in routed.items()), routed),
+            ("baseline, gpt-4o for everything", {tier: "gpt-4o" for tier in routed}))
+    requests = workload(count, seed)
+    print(f"{count} deals + {count} prospects at concurrency {concurrency}; "
+          f"{invalid:.0%} of gpt-4o-mini answers fail validation")
+    costs = {}
+    for label, models in arms:
+        stub = StructuredStub(invalid, seed)
+        server, port = start_server(stub.app)
+        install(f"http://127.0.0.1:{port}/v1", models)
+        costs[label] = report(label, await drive(requests, concurrency))
+        print(f"    served {dict(stub.served)}, requests without json_schema response_format: {stub.unstructured}")
+        server.should_exit = True
+    (routed_label, baseline_label) = [label for label, _ in arms]
+    for path, cost in costs[routed_label].items():
+        print(f"  {path}: {1 - cost / costs[baseline_label][path]:.0%} cheaper per request than the baseline")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200, help="deals and prospects each")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--invalid", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.concurrency, args.invalid, args.seed))
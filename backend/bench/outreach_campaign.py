@@ -0,0 +1,96 @@
+"""Bulk outreach campaign throughput, cost per message and crash/resume against a stub LLM.
+
+Run from backend/:  python -m bench.outreach_campaign
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import tempfile
+import time
+
+import pandas as pd
+
+from agents.outreach_campaign import CampaignStore, iter_campaign_rows, run_campaign
+from agents.outreachai import OUTREACH_INSTRUCTIONS, OutreachAIAgent
+from bench.stubs import SlowChatModel, outreach_reply
+from core.usage import MODEL_PRICES
+
+INDUSTRIES = ["Logistics", "Fintech", "Healthcare", "Retail", "SaaS", "Manufacturing"]
+PAINS = ["manual reporting", "slow onboarding", "churn", "pipeline visibility", "forecast accuracy", "data silos"]
+
+
+def prospects_csv(rows: int, seed: int = 5) -> bytes:
+    rng = random.Random(seed)
+    df = pd.DataFrame({
+        "company_name": [f"Prospect {i}" for i in range(rows)],
+        "industry": [rng.choice(INDUSTRIES) for _ in range(rows)],
+        "company_size": [rng.choice(["10-50", "50-200", "200-500", "500+"]) for _ in range(rows)],
+        "pain_points": [";".join(rng.sample(PAINS, 2)) for _ in range(rows)],
+        "decision_maker_name": [f"Contact {i}" for i in range(rows)],
+        "decision_maker_title": [rng.choice(["VP Sales", "COO", "Head of RevOps"]) for _ in range(rows)],
+        "channel": [rng.choice(["email", "linkedin"]) for _ in range(rows)],
+    })
+    return df.to_csv(index=False).encode()
+
+
+async def rows_from(data: bytes):
+    for chunk in iter_campaign_rows(io.BytesIO(data), "csv"):
+        for row in chunk:
+            yield row
+
+
+async def drive(agent, data, store, campaign_id, concurrency, stop_after=None):
+    summary, seen = None, 0
+    async for event, payload in run_campaign(agent, rows_from(data), store, campaign_id, concurrency=concurrency):
+        if event == "result":
+            seen += 1
+            if stop_after and seen >= stop_after:
+                return None  # closing the generator cancels whatever is in flight, like a crash
+        if event == "summary":
+            summary = payload
+    return summary
+
+
+async def run(rows: int, latency: float, token_latency: float, concurrencies: list, model: str) -> None:
+    data = prospects_csv(rows)
+    input_price, cached_price, output_price = MODEL_PRICES[model]
+    prefix_tokens = len(OUTREACH_INSTRUCTIONS) // 4
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CampaignStore(os.path.join(tmp, "campaigns.db"))
+        print(f"{rows} prospects, stub LLM {latency * 1000:.0f} ms + {token_latency * 1000:.0f} ms/token, "
+              f"priced as {model}")
+        for concurrency in concurrencies:
+            agent = OutreachAIAgent(llm=SlowChatModel(reply=outreach_reply, latency=latency, token_latency=token_latency))
+            summary = await drive(agent, data, store, f"bench-{concurrency}", concurrency)
+            tokens = summary["tokens"]
+            per_message = (tokens["input_tokens"] * input_price + tokens["output_tokens"] * output_price) / 1e6 / summary["generated"]
+            cached = per_message - tokens["calls"] * prefix_tokens * (input_price - cached_price) / 1e6 / summary["generated"]
+            print(f"  concurrency {concurrency:>3}: {summary['messages_per_minute']:>8,.0f} msgs/min  "
+                  f"${per_message:.5f}/msg  (${cached:.5f} with the {prefix_tokens}-token prefix cached; "
+                  f"{prefix_tokens * tokens['calls'] / tokens['input_tokens']:.0%} of input)")
+
+        # Crash halfway, then resume with the same campaign id
+        concurrency = concurrencies[-1]
+        agent = OutreachAIAgent(llm=SlowChatModel(reply=outreach_reply, latency=latency, token_latency=token_latency))
+        start = time.perf_counter()
+        await drive(agent, data, store, "bench-resume", concurrency, stop_after=rows // 2)
+        crashed_calls = agent.llm.calls
+        agent = OutreachAIAgent(llm=SlowChatModel(reply=outreach_reply, latency=latency, token_latency=token_latency))
+        summary = await drive(agent, data, store, "bench-resume", concurrency)
+        print(f"  crash after {rows // 2} results ({crashed_calls} calls started), resume: "
+              f"{summary['skipped']} skipped, {summary['generated']} generated, "
+              f"{store.progress('bench-resume')['completed']} stored, {time.perf_counter() - start:.1f}s total")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.8)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64])
+    parser.add_argument("--model", default="gpt-4o", choices=sorted(MODEL_PRICES))
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.latency, args.token_latency, args.concurrency, args.model))
@@ -0,0 +1,46 @@
+"""Wall-clock time for N outreach variants vs a single version.
+
+Run from backend/:  python -m bench.outreach_versions
+"""
+import argparse
+import asyncio
+import time
+
+from agents.outreachai import OutreachAIAgent, OutreachRequest
+from bench.stubs import SlowChatModel, outreach_reply
+
+
+async def run(latency: float, token_latency: float, counts: list) -> None:
+    request = OutreachRequest(
+        company_name="Acme Logistics",
+        industry="Logistics",
+        company_size="200-500",
+        pain_points=["manual reporting", "slow onboarding"],
+        decision_maker_name="Jordan Lee",
+        decision_maker_title="VP Operations"
+    )
+    llm = SlowChatModel(reply=outreach_reply, latency=latency, token_latency=token_latency)
+    agent = OutreachAIAgent(llm=llm)
+
+    start = time.perf_counter()
+    await agent.generate_outreach_async(request)
+    single = time.perf_counter() - start
+    print(f"{'single version':<22} {llm.calls:>2} calls  {single:6.2f}s")
+
+    for count in counts:
+        llm = SlowChatModel(reply=outreach_reply, latency=latency, token_latency=token_latency)
+        agent = OutreachAIAgent(llm=llm)
+        start = time.perf_counter()
+        results = await agent.generate_multiple_versions_async(request, count)
+        elapsed = time.perf_counter() - start
+        print(f"{f'{count} versions':<22} {llm.calls:>2} calls  {elapsed:6.2f}s  ({elapsed / single:.2f}x single)  "
+              f"{len(results)} distinct, {len(results[0].alternative_versions)} alternatives")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.8)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--counts", type=int, nargs="+", default=[3, 5])
+    args = parser.parse_args()
+    asyncio.run(run(args.latency, args.token_latency, args.counts))
@@ -0,0 +1,79 @@
+"""Cold-start cost: `import main` time, time until uvicorn accepts a request, time until /ready.
+
+Runs each measurement in a fresh interpreter. Point --app-dir at another
+checkout's backend/ to compare. Run from backend/:  python -m bench.startup
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_time(app_dir: str, env: dict) -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=app_dir, env=env,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def serve_times(app_dir: str, env: dict, ready_timeout: float) -> dict:
+    """Seconds from process start to the first 200 on / and on /ready (None if it never got there)"""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    times = {"first_request": None, "ready": None}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            while time.perf_counter() - start < ready_timeout and server.poll() is None:
+                try:
+                    if times["first_request"] is None and client.get("/").status_code == 200:
+                        times["first_request"] = time.perf_counter() - start
+                    if times["first_request"] is not None:
+                        response = client.get("/ready")
+                        if response.status_code == 200:
+                            times["ready"] = time.perf_counter() - start
+                            break
+                        if response.status_code == 404:  # a tree without /ready
+                            break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.02)
+    finally:
+        server.terminate()
+        server.wait()
+    return times
+
+
+def fmt(seconds) -> str:
+    return "     n/a" if seconds is None else f"{seconds:7.2f}s"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app-dir", default=os.getcwd())
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--ready-timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-bench")}
+    imports = [import_time(args.app_dir, env) for _ in range(args.runs)]
+    print(f"import main: median {statistics.median(imports):.2f}s over {args.runs} runs")
+
+    for run in range(args.runs):
+        times = serve_times(args.app_dir, env, args.ready_timeout)
+        print(f"  run {run + 1}: first accepted request {fmt(times['first_request'])}   /ready {fmt(times['ready'])}")
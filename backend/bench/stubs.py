@@ -0,0 +1,166 @@
+"""Offline stand-ins for OpenAI used by the benchmark scripts"""
+import asyncio
+import hashlib
+import json
+import math
+import re
+import time
+from typing import Any, AsyncIterator, Callable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(str(m.content) for m in messages)
+
+
+def deal_score_reply(messages: List[BaseMessage]) -> str:
+    """Canned DealScore JSON built from the deal in the prompt"""
+    text = _prompt_text(messages)
+    company = re.search(r"Company: (.*)", text)
+    value = re.search(r"Deal Value: \$([\d.]+)", text)
+    return json.dumps({
+        "deal_id": "stub",
+        "company_name": company.group(1).strip() if company else "Unknown",
+        "deal_value": float(value.group(1)) if value else 0.0,
+        "close_probability": 55,
+        "risk_level": "Medium",
+        "reasoning": "Stubbed response",
+        "next_actions": ["Call the champion", "Confirm budget", "Book a demo"]
+    })
+
+
+def deal_batch_reply(messages: List[BaseMessage], drop_every: int = 0) -> str:
+    """Canned DealScoreBatch JSON (or a single DealScore for one-deal prompts); drop_every=n omits every nth deal"""
+    text = _prompt_text(messages)
+    if "Deal ID:" not in text:
+        return deal_score_reply(messages)
+    scores = []
+    for n, block in enumerate(text.split("Deal ID: ")[1:], start=1):
+        if drop_every and n % drop_every == 0:
+            continue
+        score = json.loads(deal_score_reply([AIMessage(content=block)]))
+        score["deal_id"] = block.split("\n", 1)[0].strip()
+        scores.append(score)
+    return json.dumps({"scores": scores})
+
+
+def outreach_reply(messages: List[BaseMessage]) -> str:
+    """Canned outreach JSON; the body follows the prompt's ANGLE line so variants differ"""
+    text = _prompt_text(messages)
+    company = re.search(r"Company: (.*)", text)
+    angle = re.search(r"ANGLE: (.*)", text)
+    opener = angle.group(1).strip() if angle else "Noticed your team is wrestling with the usual growing pains."
+    name = company.group(1).strip() if company else "your team"
+    return json.dumps({
+        "subject": f"{name}: quick idea",
+        "body": f"{opener} At {name}, a 15-minute call could show how peers fixed this. Worth a chat next week?",
+        "reasoning": "Stubbed response",
+        "personalization_elements": [name],
+        "call_to_action": "Book a 15-min discovery call"
+    })
+
+
+class SlowChatModel(BaseChatModel):
+    """Chat model that returns a canned reply after a fixed, injected latency"""
+
+    reply: Callable[[List[BaseMessage]], str] = deal_score_reply
+    latency: float = 0.2
+    # Delay between streamed tokens (astream only); `latency` is then time to first token
+    token_latency: float = 0.0
+    calls: int = 0
+    # Rough token accounting (~4 characters per token)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-stub"
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        self.calls += 1
+        content = self.reply(messages)
+        input_tokens, output_tokens = len(_prompt_text(messages)) // 4, len(content) // 4
+        message = AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens
+        })
+        self.prompt_tokens += input_tokens
+        self.completion_tokens += output_tokens
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generation_time(self, result: ChatResult) -> float:
+        # A non-streamed call still waits for every token to be generated
+        tokens = len(re.findall(r"\S+", result.generations[0].message.content))
+        return self.latency + self.token_latency * max(0, tokens - 1)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        result = self._result(messages)
+        time.sleep(self._generation_time(result))
+        return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        result = self._result(messages)
+        await asyncio.sleep(self._generation_time(result))
+        return result
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        message = self._result(messages).generations[0].message
+        for i, token in enumerate(re.findall(r"\S+\s*", message.content)):
+            if i:
+                await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        # Usage arrives on a final empty chunk, as with OpenAI's stream_usage
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=message.usage_metadata))
+
+
+STOPWORDS = {"a", "an", "the", "is", "are", "what", "whats", "what's", "how", "do", "does", "we",
+             "our", "your", "you", "of", "for", "to", "in", "on", "with", "it", "much", "s", "me", "tell"}
+
+
+class HashingEmbeddings(Embeddings):
+    """Bag-of-words hashing embeddings: texts sharing content words land close together.
+
+    With ignore_codes, tokens containing digits ("v52", "2") are dropped,
+    mimicking a dense model's weak grip on exact identifiers.
+    """
+
+    def __init__(self, size: int = 256, latency: float = 0.0, ignore_codes: bool = False):
+        self.size = size
+        self.latency = latency
+        self.ignore_codes = ignore_codes
+        self.calls = 0
+        self.texts = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            if word not in STOPWORDS and not (self.ignore_codes and any(c.isdigit() for c in word)):
+                digest = hashlib.md5(word.encode()).digest()
+                vector[int.from_bytes(digest[:4], "little") % self.size] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        time.sleep(self.latency)
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        await asyncio.sleep(self.latency)
+        return [self._embed(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
@@ -0,0 +1,438 @@
+"""End-to-end benchmark of every API endpoint against recorded LLM and embedding responses, no network needed.
+
+The app runs in a separate process with GTM_LLM_BACKEND=replay, so the
+numbers are our own code plus the replayed latency. For each endpoint and
+concurrency level it reports throughput and p50/p95/p99 latency, plus
+server RSS, as JSON to diff against a saved baseline.
+
+Fixtures are recorded on first run from the offline stub models; use
+`--record live` (with OPENAI_API_KEY) to record real OpenAI responses instead.
+
+Run from backend/:
+    python -m bench.suite                                   # writes suite.json
+    python -m bench.suite --compare baseline.json           # diff against a saved run
+    python -m bench.suite --latency 0 --jitter 0            # our overhead only
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import pandas as pd
+
+from bench.startup import free_port
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FIXTURES = os.path.join(BACKEND_DIR, "bench", "fixtures", "suite.jsonl")
+# Distinct inputs per scenario; requests cycle through them so every one has a recorded response
+POOL = 16
+FILE_POOL = 4
+
+QUESTIONS = [
+    "What is our enterprise pricing?", "How do we handle the 'too expensive' objection?",
+    "What is the onboarding timeline for new customers?", "How do we compare against Competitor X?",
+    "Which integrations do we support?", "What security certifications do we have?",
+    "How long is a typical sales cycle?", "What discount can a rep approve without sign-off?",
+    "How do we qualify a lead?", "What is the renewal process?",
+    "Who should own the champion relationship?", "What does the Professional plan include?",
+    "How do we run a discovery call?", "What is our churn rate target?",
+    "When do we involve solutions engineering?", "How do we hand off a closed deal to customer success?",
+]
+INDUSTRIES = ["Logistics", "Fintech", "Healthcare", "Retail", "SaaS", "Manufacturing"]
+PAINS = ["manual reporting", "slow onboarding", "churn", "pipeline visibility", "forecast accuracy", "data silos"]
+STAGES = ["Prospecting", "Discovery", "Demo", "Proposal", "Negotiation", "Contract"]
+
+# Replayed responses only match if the server sees the same prompts as when they were recorded
+SERVER_ENV = {
+    "GTM_LLM_BACKEND": "replay",
+    "DEALSENSE_CACHE": "off",
+    "ASKGTM_SEMANTIC_CACHE": "off",
+    "ASKGTM_EMBEDDING_CACHE": "off",
+    "DEALSENSE_JOB_QUEUE_DEPTH": "10000",
+    "ANONYMIZED_TELEMETRY": "False",
+    "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-replay"),
+}
+
+
+def deals(count: int, seed: int) -> List[dict]:
+    rng = random.Random(seed)
+    return [{
+        "deal_id": f"D-{seed}-{i}",
+        "company_name": f"Company {seed}-{i}",
+        "deal_value": rng.randrange(5_000, 500_000, 500),
+        "stage": rng.choice(STAGES),
+        "days_in_pipeline": rng.randint(1, 200),
+        "last_contact_days": rng.randint(0, 60),
+        "decision_maker_engaged": rng.choice(["Yes", "No"]),
+        "has_competitor": rng.choice([True, False]),
+        "budget_confirmed": rng.choice(["Yes", "No"]),
+    } for i in range(count)]
+
+
+def prospect(i: int) -> dict:
+    rng = random.Random(i)
+    return {
+        "company_name": f"Prospect {i}",
+        "industry": rng.choice(INDUSTRIES),
+        "company_size": rng.choice(["10-50", "50-200", "200-500", "500+"]),
+        "pain_points": rng.sample(PAINS, 2),
+        "decision_maker_name": f"Contact {i}",
+        "decision_maker_title": rng.choice(["VP Sales", "COO", "Head of RevOps"]),
+        "channel": rng.choice(["email", "linkedin"]),
+    }
+
+
+def deals_csv(i: int, rows: int) -> bytes:
+    return pd.DataFrame(deals(rows, seed=1000 + i % FILE_POOL)).to_csv(index=False).encode()
+
+
+def prospects_csv(i: int, rows: int) -> bytes:
+    records = [prospect(100 + (i % FILE_POOL) * rows + row) for row in range(rows)]
+    return pd.DataFrame([{**p, "pain_points": ";".join(p["pain_points"])} for p in records]).to_csv(index=False).encode()
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def checked(response: httpx.Response) -> httpx.Response:
+    response.raise_for_status()
+    return response
+
+
+async def read_stream(client: httpx.AsyncClient, method: str, url: str, **kwargs):
+    async with client.stream(method, url, **kwargs) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith('{"type": "error"') or line == "event: error":
+                raise RuntimeError(f"error event from {url}")
+
+
+async def run_job(client: httpx.AsyncClient, i: int):
+    job = checked(await client.post("/dealsense/jobs", files={"file": ("deals.csv", deals_csv(i, 20), "text/csv")})).json()
+    while True:
+        progress = checked(await client.get(f"/dealsense/jobs/{job['job_id']}")).json()
+        if progress["status"] in ("completed", "failed"):
+            break
+        await asyncio.sleep(0.05)
+    checked(await client.get(f"/dealsense/jobs/{job['job_id']}/results"))
+    if progress["status"] == "failed" or progress["failed"]:
+        raise RuntimeError(f"job {job['job_id']}: {progress}")
+
+
+async def run_campaign(client: httpx.AsyncClient, i: int):
+    files = {"file": ("prospects.csv", prospects_csv(i, 10), "text/csv")}
+    async with client.stream("POST", "/outreachai/campaigns", files=files) as response:
+        response.raise_for_status()
+        campaign_id = response.headers["x-campaign-id"]
+        async for line in response.aiter_lines():
+            if line.startswith('{"type": "error"'):
+                raise RuntimeError(line)
+    checked(await client.get(f"/outreachai/campaigns/{campaign_id}"))
+    checked(await client.get(f"/outreachai/campaigns/{campaign_id}/results"))
+
+
+@dataclass
+class Scenario:
+    name: str
+    call: Callable[[httpx.AsyncClient, int], Awaitable]
+    # Heavy scenarios (whole files per request) run fewer requests per level, over FILE_POOL inputs
+    heavy: bool = False
+
+    @property
+    def pool(self) -> int:
+        return FILE_POOL if self.heavy else POOL
+
+
+SCENARIOS = [
+    Scenario("GET /", lambda c, i: c.get("/")),
+    Scenario("GET /ready", lambda c, i: c.get("/ready")),
+    Scenario("GET /metrics", lambda c, i: c.get("/metrics")),
+    Scenario("GET /askgtm/stats", lambda c, i: c.get("/askgtm/stats")),
+    Scenario("GET /outreachai/channels", lambda c, i: c.get("/outreachai/channels")),
+    Scenario("POST /dealsense/analyze-deal", lambda c, i: c.post("/dealsense/analyze-deal", json=deals(POOL, seed=1)[i % POOL])),
+    Scenario("POST /dealsense/analyze-csv", lambda c, i: c.post(
+        "/dealsense/analyze-csv", files={"file": ("deals.csv", deals_csv(i, 25), "text/csv")}), heavy=True),
+    Scenario("POST /dealsense/analyze-csv/stream", lambda c, i: read_stream(
+        c, "POST", "/dealsense/analyze-csv/stream", files={"file": ("deals.csv", deals_csv(i, 25), "text/csv")}), heavy=True),
+    Scenario("POST /dealsense/jobs (to completion)", run_job, heavy=True),
+    Scenario("POST /askgtm/ask", lambda c, i: c.post("/askgtm/ask", json={"question": QUESTIONS[i % POOL]})),
+    Scenario("POST /askgtm/ask/stream", lambda c, i: read_stream(
+        c, "POST", "/askgtm/ask/stream", json={"question": QUESTIONS[i % POOL]})),
+    Scenario("POST /askgtm/reset", lambda c, i: c.post("/askgtm/reset", json={"session_id": f"session-{i}"})),
+    Scenario("POST /outreachai/generate", lambda c, i: c.post("/outreachai/generate", json=prospect(i % POOL))),
+    Scenario("POST /outreachai/generate-multiple", lambda c, i: c.post(
+        "/outreachai/generate-multiple", json={**prospect(i % POOL), "versions_count": 3})),
+    Scenario("POST /outreachai/generate-debug", lambda c, i: c.post("/outreachai/generate-debug", json=prospect(i % POOL))),
+    Scenario("POST /outreachai/campaigns (streamed)", run_campaign, heavy=True),
+    # Knowledge-base writes go last: later answers would otherwise depend on the order writes landed in
+    Scenario("POST /askgtm/add-document", lambda c, i: c.post("/askgtm/add-document", json={
+        "text": f"Field note {i % POOL}: reps should confirm budget owner and timeline before sending a proposal.",
+        "metadata": {"source": f"note-{i % POOL}", "category": "sales"}})),
+    Scenario("POST /askgtm/upload-docs", lambda c, i: c.post("/askgtm/upload-docs", files={"file": ("docs.jsonl", "".join(
+        json.dumps({"content": f"Playbook {i % FILE_POOL}.{n}: follow up within 48 hours of every demo.", "metadata": {"category": "sales"}}) + "\n"
+        for n in range(20)).encode(), "application/jsonl")}), heavy=True),
+]
+
+
+async def measure(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int) -> dict:
+    """Closed loop: `concurrency` clients issuing `requests` requests in total"""
+    latencies, errors = [], []
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                result = await scenario.call(client, i)
+                if isinstance(result, httpx.Response):
+                    checked(result)
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    result = {
+        "requests": requests,
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50), 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 1) if latencies else None,
+    }
+    if errors:
+        result["first_error"] = errors[0][:300]
+    return result
+
+
+def rss_mb(pid: int, field: str) -> Optional[float]:
+    """VmRSS (current) or VmHWM (peak) of a process from /proc; None where /proc is unavailable"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+def start_server(workdir: str, env: dict, log) -> tuple:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "bench.suite", "--serve", "--port", str(port)],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    deadline = time.perf_counter() + 120
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+        while time.perf_counter() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            try:
+                ready = client.get("/ready")
+                if ready.status_code == 200:
+                    return server, port
+                if "failed" in ready.text:
+                    raise RuntimeError(f"agents failed to build: {ready.text}")
+            except httpx.TransportError:
+                pass
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("server not ready after 120s")
+
+
+async def drive(port: int, pid: int, levels: List[int], requests: Optional[int], only: Optional[str]) -> Dict[str, dict]:
+    """Run each scenario at each level; requests=None runs every scenario once over its input pool"""
+    results = {}
+    limits = httpx.Limits(max_connections=max(levels) * 2)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300, limits=limits) as client:
+        # Open the connection pool up front so no level pays for connection setup
+        await asyncio.gather(*(client.get("/") for _ in range(max(levels))))
+        for scenario in SCENARIOS:
+            if only and only not in scenario.name:
+                continue
+            results[scenario.name] = {}
+            if requests is not None:
+                await measure(client, scenario, 1, 1)  # unmeasured warm-up (first-call imports, connection setup)
+            for level in levels:
+                if requests is None:
+                    count = scenario.pool
+                else:
+                    count = max(level, requests // 8) if scenario.heavy else max(level, requests)
+                result = await measure(client, scenario, count, level)
+                result["rss_mb"] = rss_mb(pid, "VmRSS")
+                results[scenario.name][str(level)] = result
+                p = lambda key: "   n/a" if result[key] is None else f"{result[key]:8.1f}"
+                print(f"  {scenario.name:<40} c={level:<3} {result['throughput_rps']:8.1f} req/s   "
+                      f"p50 {p('p50_ms')}  p95 {p('p95_ms')}  p99 {p('p99_ms')} ms"
+                      + (f"   {result['errors']} errors: {result['first_error'][:80]}" if result["errors"] else ""))
+    return results
+
+
+def run_server_phase(env: dict, levels: List[int], requests: Optional[int], only: Optional[str]) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        log_path = os.path.join(workdir, "server.log")
+        with open(log_path, "w") as log:
+            server, port = None, None
+            try:
+                server, port = start_server(workdir, env, log)
+                results = asyncio.run(drive(port, server.pid, levels, requests, only))
+                peak = rss_mb(server.pid, "VmHWM")
+            except Exception:
+                with open(log_path) as f:
+                    print(f.read()[-3000:], file=sys.stderr)
+                raise
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.wait()
+        if peak is None:
+            peak = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+        return {"results": results, "peak_rss_mb": peak}
+
+
+def record(source: str, fixtures: str):
+    """Run every scenario once over its whole input pool, saving each response"""
+    print(f"Recording fixtures from {source} models into {fixtures}")
+    env = {**os.environ, **SERVER_ENV, "GTM_LLM_BACKEND": "record", "GTM_FIXTURES": fixtures,
+           "SUITE_RECORD_SOURCE": source, "PYTHONPATH": BACKEND_DIR}
+    run_server_phase(env, [8], None, None)
+
+
+def serve(port: int):
+    """Server process: replay (or record) through the normal agent constructors; stub recording swaps the models"""
+    import uvicorn
+
+    import main
+    if os.getenv("SUITE_RECORD_SOURCE") == "stub":
+        from agents.askgtm import AskGTMAgent
+        from agents.dealsense import DealSenseAgent
+        from agents.outreachai import OutreachAIAgent
+        from bench.stubs import HashingEmbeddings, SlowChatModel, deal_batch_reply, outreach_reply
+        from core.replay import RecordingChatModel, RecordingEmbeddings, fixture_store
+        from core.routing import tier_models
+        from routers import askgtm, dealsense, outreachai
+
+        fixtures = fixture_store()
+        answer = ("Enterprise is custom priced with unlimited users and a dedicated CSM; Professional is $149 "
+                  "a month for up to 20 users. Lead with ROI and offer a pilot when budget is the objection.")
+
+        def recording(model: str, temperature: float, **stub):
+            return RecordingChatModel(underlying=SlowChatModel(**stub), fixtures=fixtures, model_name=model, temperature=temperature)
+
+        def tiers(temperature: float, **stub):
+            # Replay looks responses up by model, so record under each tier's model name
+            return {tier: recording(model, temperature, **stub) for tier, model in tier_models().items()}
+
+        dealsense.dealsense_agent.set(DealSenseAgent(tiers=tiers(0.3, latency=0.4, reply=deal_batch_reply)))
+        outreachai.outreach_agent.set(OutreachAIAgent(tiers=tiers(0.7, latency=0.8, reply=outreach_reply)))
+        askgtm.askgtm_agent.set(AskGTMAgent(
+            llm=recording("gpt-4o-mini", 0.2, latency=0.3, reply=lambda messages: answer),
+            embeddings=RecordingEmbeddings(HashingEmbeddings(latency=0.05), fixtures, "text-embedding-3-small")
+        ))
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> int:
+    """Print p95 and throughput changes against a baseline; returns the number of regressions"""
+    regressions = 0
+    print(f"\nvs baseline {baseline['meta'].get('git_revision')} (regression = worse by more than {tolerance:.0%})")
+    for name, levels in current["results"].items():
+        for level, now in levels.items():
+            before = baseline["results"].get(name, {}).get(level)
+            if not before or not now["p95_ms"] or not before["p95_ms"]:
+                continue
+            p95 = now["p95_ms"] / before["p95_ms"] - 1
+            rps = now["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+            flag = p95 > tolerance or rps < -tolerance or now["errors"] > before["errors"]
+            regressions += flag
+            print(f"  {'REGRESSION' if flag else '':<10} {name:<40} c={level:<3} p95 {p95:+7.1%}   throughput {rps:+7.1%}")
+    peak = current["peak_rss_mb"] / baseline["peak_rss_mb"] - 1 if baseline.get("peak_rss_mb") else 0.0
+    print(f"  {'REGRESSION' if peak > tolerance else '':<10} peak RSS {peak:+.1%}")
+    return regressions + (peak > tolerance)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--levels", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="requests per endpoint and level (heavy endpoints run 1/8)")
+    parser.add_argument("--latency", default="recorded", help='replayed LLM latency in seconds, or "recorded"')
+    parser.add_argument("--jitter", type=float, default=0.1, help="+/- fraction applied to each replayed latency")
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--record", choices=["stub", "live"], help="(re)record fixtures before replaying")
+    parser.add_argument("--only", help="run scenarios whose name contains this text")
+    parser.add_argument("--out", default="suite.json")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port)
+        sys.exit(0)
+
+    fixtures = os.path.abspath(args.fixtures)
+    if args.record or not os.path.exists(fixtures):
+        if os.path.exists(fixtures):
+            os.remove(fixtures)
+        record(args.record or "stub", fixtures)
+
+    levels = [int(level) for level in args.levels.split(",")]
+    print(f"Replaying {fixtures}: latency {args.latency}, jitter {args.jitter:.0%}, levels {levels}")
+    env = {
+        **os.environ, **SERVER_ENV,
+        "GTM_FIXTURES": fixtures,
+        "GTM_REPLAY_LATENCY": args.latency,
+        "GTM_REPLAY_JITTER": str(args.jitter),
+        "GTM_REPLAY_TOKEN_LATENCY": str(args.token_latency),
+        "GTM_REPLAY_SEED": str(args.seed),
+        "PYTHONPATH": BACKEND_DIR,
+    }
+    phase = run_server_phase(env, levels, args.requests, args.only)
+    output = {
+        "meta": {
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "levels": levels,
+            "requests": args.requests,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "token_latency": args.token_latency,
+            "fixtures": os.path.relpath(fixtures, BACKEND_DIR),
+        },
+        **phase,
+    }
+    with open(args.out, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"peak server RSS {phase['peak_rss_mb']} MB; wrote {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            sys.exit(1 if compare(output, json.load(f), args.tolerance) else 0)
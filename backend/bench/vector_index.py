@@ -0,0 +1,210 @@
+"""Open time, query latency and per-worker memory: Chroma vs the memory-mapped vector index.
+
+For each size a synthetic collection of clustered unit vectors is written to
+a persistent Chroma directory (up to --chroma-max chunks; building the HNSW
+index is the slow part) and snapshotted with build_index; larger sizes are
+written straight through IndexWriter. Then --workers processes per store open
+it at the same time, like uvicorn workers, and each runs --queries searches.
+Memory is read from /proc/<pid>/smaps_rollup while all of them are alive: RSS
+counts shared pages in full for every worker, PSS splits them between the
+workers mapping them. Recall@k is against exact float32 search.
+Run from backend/:  python -m bench.vector_index
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from core.vector_index import IndexWriter, MmapVectorIndex, build_index
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BATCH = 5000
+CATEGORIES = ["sales", "product", "customer-success", "competitive"]
+
+
+def clustered(rng: np.random.Generator, centers: np.ndarray, count: int) -> np.ndarray:
+    """Points scattered around random centers, like embeddings of related documents"""
+    points = centers[rng.integers(len(centers), size=count)] + 0.6 * rng.standard_normal((count, centers.shape[1]))
+    return (points / np.linalg.norm(points, axis=1, keepdims=True)).astype(np.float32)
+
+
+def batches(size: int, dim: int, seed: int):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((256, dim))
+    for start in range(0, size, BATCH):
+        count = min(BATCH, size - start)
+        ids = [f"chunk-{i}" for i in range(start, start + count)]
+        texts = [f"Chunk {i}: notes on {CATEGORIES[i % 4]} topics for account {i % 997}, plan tier {i % 3} "
+                 f"and renewal window {i % 12} months." for i in range(start, start + count)]
+        metadatas = [{"category": CATEGORIES[i % 4], "source": f"doc-{i // 8}"} for i in range(start, start + count)]
+        yield ids, texts, metadatas, clustered(rng, centers, count)
+
+
+def query_vectors(dim: int, count: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # Same centers as the corpus, fresh points
+    centers = rng.standard_normal((256, dim))
+    return clustered(np.random.default_rng(seed + 1), centers, count)
+
+
+def build(directory: str, size: int, dim: int, dtypes: List[str], with_chroma: bool, seed: int) -> Dict[str, float]:
+    """Write the corpus to Chroma (optional) and to one index per dtype; returns build seconds per store"""
+    seconds = {}
+    if with_chroma:
+        from langchain_community.vectorstores import Chroma
+        started = time.perf_counter()
+        collection = Chroma(persist_directory=os.path.join(directory, "chroma"))._collection
+        for ids, texts, metadatas, vectors in batches(size, dim, seed):
+            collection.add(ids=ids, documents=texts, metadatas=metadatas, embeddings=vectors.tolist())
+        seconds["chroma"] = time.perf_counter() - started
+        for dtype in dtypes:
+            started = time.perf_counter()
+            build_index(collection, os.path.join(directory, dtype), dtype)
+            seconds[dtype] = time.perf_counter() - started
+        return seconds
+
+    writers = {dtype: IndexWriter(os.path.join(directory, dtype), size, dim, dtype) for dtype in dtypes}
+    started = time.perf_counter()
+    for ids, texts, metadatas, vectors in batches(size, dim, seed):
+        for writer in writers.values():
+            writer.add(ids, texts, metadatas, vectors)
+    for writer in writers.values():
+        writer.close()
+    seconds.update({dtype: (time.perf_counter() - started) / len(dtypes) for dtype in dtypes})
+    return seconds
+
+
+def worker(store: str, path: str, queries_file: str, k: int, batch: int) -> None:
+    """Child process: open the store, search, report, then stay alive until stdin closes"""
+    # Imports stay outside the timed open
+    from langchain_community.vectorstores import Chroma
+    from bench.stubs import HashingEmbeddings
+    from core.vector_index import MmapVectorStore
+    queries = np.load(queries_file)
+    started = time.perf_counter()
+    if store == "chroma":
+        vectorstore = Chroma(persist_directory=path)
+        opened = time.perf_counter()
+        search = lambda q: vectorstore.similarity_search_by_vector(q.tolist(), k=k)
+        search_batch = lambda qs: vectorstore._collection.query(query_embeddings=qs.tolist(), n_results=k)
+        top_ids = lambda q: vectorstore._collection.query(query_embeddings=[q.tolist()], n_results=k, include=[])["ids"][0]
+    else:
+        vectorstore = MmapVectorStore(MmapVectorIndex.open(path), HashingEmbeddings())
+        opened = time.perf_counter()
+        search = lambda q: vectorstore.similarity_search_by_vector(q, k=k)
+        search_batch = lambda qs: vectorstore.search_by_vectors(qs, k=k)
+        index = vectorstore.index
+        top_ids = lambda q: [index.chunks([p])[p][0] for p in index.search(q, k)[0][0]]
+
+    search(queries[0])
+    first = time.perf_counter()
+    latencies = []
+    for query in queries[1:]:
+        start = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    search_batch(queries[:batch])
+    batched = (time.perf_counter() - start) * 1000 / batch
+    ids = [top_ids(query) for query in queries[:20]]
+    print(json.dumps({
+        "open_ms": (opened - started) * 1000, "first_query_ms": (first - opened) * 1000,
+        "p50_ms": statistics.median(latencies), "p95_ms": sorted(latencies)[int(len(latencies) * 0.95)],
+        "batched_ms": batched, "ids": ids
+    }), flush=True)
+    sys.stdin.read()
+
+
+def memory(pid: int) -> Dict[str, float]:
+    """RSS, PSS and private (unshared) memory of a process in MB"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss": values["Rss"], "pss": values["Pss"],
+            "private": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)}
+
+
+def run_workers(store: str, path: str, queries_file: str, workers: int, k: int, batch: int) -> List[dict]:
+    """Start the workers together, collect their reports and memory while all are alive"""
+    command = [sys.executable, "-m", "bench.vector_index", "--worker", store, "--path", path,
+               "--queries-file", queries_file, "--k", str(k), "--batch", str(batch)]
+    processes = [subprocess.Popen(command, cwd=BACKEND_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL, text=True) for _ in range(workers)]
+    reports = []
+    for process in processes:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"{store} worker exited without a report")
+        reports.append(json.loads(line))
+    for process, report in zip(processes, reports):
+        report.update(memory(process.pid))
+    for process in processes:
+        process.stdin.close()
+        process.wait()
+    return reports
+
+
+def recall(found: List[List[str]], exact: List[List[str]]) -> float:
+    return statistics.mean(len(set(a) & set(b)) / len(b) for a, b in zip(found, exact))
+
+
+def run(args) -> None:
+    sizes = [int(s) for s in args.sizes.split(",")]
+    dtypes = args.dtypes.split(",")
+    print(f"dim {args.dim}, {args.workers} workers per store, {args.queries} queries, k={args.k}, "
+          f"batched search of {args.batch}; memory in MB per worker (PSS shares mapped pages between workers)")
+    for size in sizes:
+        with tempfile.TemporaryDirectory(dir=args.tmp) as directory:
+            with_chroma = size <= args.chroma_max
+            seconds = build(directory, size, args.dim, dtypes, with_chroma, args.seed)
+            queries_file = os.path.join(directory, "queries.npy")
+            np.save(queries_file, query_vectors(args.dim, args.queries, args.seed))
+            stores = (["chroma"] if with_chroma else []) + dtypes
+            exact = None
+            if "float32" in dtypes:
+                index = MmapVectorIndex.open(os.path.join(directory, "float32"))
+                queries = np.load(queries_file)[:20]
+                exact = [[index.chunks([p])[p][0] for p in positions] for positions in index.search(queries, args.k)[0]]
+            built = ", ".join(f"{store} {seconds[store]:.1f}s" for store in stores)
+            print(f"\n{size:,} chunks (built: {built}{'' if with_chroma else '; Chroma skipped above --chroma-max'})")
+            for store in stores:
+                path = os.path.join(directory, "chroma" if store == "chroma" else store)
+                reports = run_workers(store, path, queries_file, args.workers, args.k, args.batch)
+                mean = lambda key: statistics.mean(r[key] for r in reports)
+                accuracy = f"recall@{args.k} {recall(reports[0]['ids'], exact):.3f}" if exact else ""
+                label = "chroma (HNSW)" if store == "chroma" else f"mmap {store}"
+                print(f"  {label:<14} open {mean('open_ms'):7.1f} ms  first query {mean('first_query_ms'):7.1f} ms  "
+                      f"p50 {mean('p50_ms'):7.2f} ms  p95 {mean('p95_ms'):7.2f} ms  batched {mean('batched_ms'):6.2f} ms/query  "
+                      f"RSS {mean('rss'):7.0f}  PSS {mean('pss'):7.0f}  private {mean('private'):7.0f}  {accuracy}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--dtypes", default="float32,int8")
+    parser.add_argument("--chroma-max", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--tmp", default=None, help="directory for the generated stores (needs ~7.5 GB at 1M x 1536)")
+    parser.add_argument("--worker", choices=["chroma", "float32", "int8"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    parser.add_argument("--queries-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args.worker, args.path, args.queries_file, args.k, args.batch)
+    else:
+        run(args)
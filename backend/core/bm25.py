@@ -0,0 +1,96 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from core.facets import FACET_FIELDS, MetadataFilters
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric tokens ("SOC 2" -> soc, 2; "API v52+" -> api, v52)"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """In-process inverted index with Okapi BM25 scoring, maintained incrementally"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.total_length = 0
+        self._positions: Dict[str, int] = {}
+        # Positions per facet value, for filtered search
+        self._facet_positions: Dict[str, Dict[Any, Set[int]]] = {field: defaultdict(set) for field in FACET_FIELDS}
+        self._lock = threading.Lock()
+
+    def add(self, ids: List[str], texts: List[str], metadatas: Optional[List[dict]] = None) -> List[int]:
+        """Index new documents; ids already present are ignored. Returns the input positions that were added"""
+        added = []
+        with self._lock:
+            for i, (doc_id, text) in enumerate(zip(ids, texts)):
+                if doc_id in self._positions:
+                    continue
+                added.append(i)
+                position = len(self.ids)
+                self._positions[doc_id] = position
+                self.ids.append(doc_id)
+                self.texts.append(text)
+                metadata = (metadatas[i] if metadatas else None) or {}
+                self.metadatas.append(metadata)
+                for field, positions in self._facet_positions.items():
+                    if metadata.get(field) is not None:
+                        positions[metadata[field]].add(position)
+                tokens = tokenize(text)
+                self.lengths.append(len(tokens))
+                self.total_length += len(tokens)
+                for term, count in Counter(tokens).items():
+                    self.postings[term][position] = count
+        return added
+
+    def matching(self, filters: MetadataFilters) -> Set[int]:
+        """Positions whose facet fields match the filters (read-only; may be an internal set)"""
+        with self._lock:
+            result = None
+            for field, value in filters.items():
+                index = self._facet_positions.get(field, {})
+                values = value if isinstance(value, list) else [value]
+                if len(values) == 1:
+                    positions = index.get(values[0], set())
+                else:
+                    positions = set().union(*(index.get(v, ()) for v in values))
+                result = positions if result is None else result & positions
+            return result if result is not None else set(range(len(self.ids)))
+
+    def search(self, query: str, k: int = 10, allowed: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """Top-k (position, score) pairs for a query; only postings of query terms are touched.
+
+        `allowed` restricts results to those positions (see matching).
+        """
+        with self._lock:
+            n = len(self.ids)
+            if not n:
+                return []
+            avg_length = self.total_length / n
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for position, tf in postings.items():
+                    if allowed is not None and position not in allowed:
+                        continue
+                    norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[position] / avg_length)
+                    scores[position] += idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def __len__(self) -> int:
+        return len(self.ids)
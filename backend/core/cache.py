@@ -0,0 +1,221 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from core.executor import run_blocking
+from core.metrics import record_cache
+
+# Shared SQLite file for persistent caches and state
+DB_PATH = os.getenv("GTM_DB_PATH", "./gtm_synergy.db")
+
+
+def content_hash(*parts: Any) -> str:
+    """Stable sha256 over JSON-serializable parts (dict keys sorted)"""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def canonical_value(value: Any) -> Any:
+    """Normalize a field so equivalent inputs hash the same (50000 == 50000.0, NaN == None)"""
+    if isinstance(value, bool) or value is None:
+        return value
+    if hasattr(value, "item"):  # NumPy scalars
+        value = value.item()
+    if isinstance(value, (int, float)):
+        return None if isinstance(value, float) and math.isnan(value) else float(value)
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters for one request"""
+    hits: int = 0
+    misses: int = 0
+
+    def record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+
+class LRUCache:
+    """In-process LRU tier with optional TTL"""
+
+    blocking = False
+
+    def __init__(self, max_entries: int = 2048, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache:
+    """Persistent tier in a SQLite table, evicting expired and least recently used rows"""
+
+    blocking = True
+
+    # Writes between eviction sweeps
+    PRUNE_EVERY = 200
+
+    def __init__(self, table: str, path: str = DB_PATH, max_entries: int = 100_000, ttl: Optional[float] = None):
+        self.table = table
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._conn = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened on first use so constructing an agent never touches disk
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if self.ttl is not None and now - row[1] > self.ttl:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return row[0]
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            conn = self._connection()
+            now = time.time()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(conn, now)
+            conn.commit()
+
+    def _prune(self, conn: sqlite3.Connection, now: float):
+        if self.ttl is not None:
+            conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl,))
+        conn.execute(
+            f"DELETE FROM {self.table} WHERE key IN ("
+            f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(f"DELETE FROM {self.table}")
+            conn.commit()
+
+
+class TieredCache:
+    """Looks tiers up in order (fastest first) and backfills faster tiers on a lower-tier hit"""
+
+    def __init__(self, tiers: List, name: str = "cache"):
+        self.tiers = tiers
+        # Label for hit/miss metrics
+        self.name = name
+
+    async def aget(self, key: str) -> Optional[str]:
+        for depth, tier in enumerate(self.tiers):
+            value = await run_blocking(tier.get, key) if tier.blocking else tier.get(key)
+            if value is not None:
+                for upper in self.tiers[:depth]:
+                    upper.set(key, value)
+                record_cache(self.name, True)
+                return value
+        record_cache(self.name, False)
+        return None
+
+    async def aset(self, key: str, value: str):
+        for tier in self.tiers:
+            if tier.blocking:
+                await run_blocking(tier.set, key, value)
+            else:
+                tier.set(key, value)
+
+    def get(self, key: str) -> Optional[str]:
+        for depth, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for upper in self.tiers[:depth]:
+                    upper.set(key, value)
+                record_cache(self.name, True)
+                return value
+        record_cache(self.name, False)
+        return None
+
+    def set(self, key: str, value: str):
+        for tier in self.tiers:
+            tier.set(key, value)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+
+def cache_from_env(prefix: str, table: str) -> Optional[TieredCache]:
+    """Build a response cache from <PREFIX>_CACHE (tiered|memory|sqlite|off), _CACHE_TTL and _CACHE_MAX_ENTRIES"""
+    mode = os.getenv(f"{prefix}_CACHE", "tiered").lower()
+    if mode == "off":
+        return None
+
+    ttl = float(os.getenv(f"{prefix}_CACHE_TTL", "86400"))
+    max_entries = int(os.getenv(f"{prefix}_CACHE_MAX_ENTRIES", "100000"))
+
+    tiers = []
+    if mode in ("tiered", "memory"):
+        tiers.append(LRUCache(max_entries=min(max_entries, 4096), ttl=ttl))
+    if mode in ("tiered", "sqlite"):
+        tiers.append(SQLiteCache(table, max_entries=max_entries, ttl=ttl))
+    return TieredCache(tiers, name=table)
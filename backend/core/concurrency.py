@@ -0,0 +1,88 @@
+import asyncio
+import random
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def retryable_errors() -> Tuple[type, ...]:
+    """Errors worth another attempt after backing off (openai is imported on first failure, not at startup)"""
+    import openai
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        asyncio.TimeoutError,
+    )
+
+
+async def call_with_retry(
+    fn: Callable[[], Awaitable[R]],
+    timeout: Optional[float] = 60.0,
+    max_retries: int = 3,
+    backoff_base: float = 1.0,
+    backoff_max: float = 30.0,
+) -> R:
+    """Await fn() with a per-attempt timeout (None for none), retrying rate limits with exponential backoff"""
+    attempt = 0
+    while True:
+        try:
+            return await asyncio.wait_for(fn(), timeout=timeout)
+        except retryable_errors():
+            if attempt >= max_retries:
+                raise
+            # Full jitter so parallel callers don't retry in lockstep
+            delay = min(backoff_max, backoff_base * 2 ** attempt)
+            attempt += 1
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+
+
+async def map_bounded(
+    fn: Callable[[T], Awaitable[R]],
+    items: Iterable[T],
+    concurrency: int,
+) -> List[R]:
+    """Run fn over items with at most `concurrency` calls in flight, keeping input order"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(item: T) -> R:
+        async with semaphore:
+            return await fn(item)
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+async def stream_bounded(
+    fn: Callable[[T], Awaitable[R]],
+    items: AsyncIterable[T],
+    concurrency: int,
+) -> AsyncIterator[R]:
+    """Run fn over items as they arrive, yielding results in completion order.
+
+    Items are pulled lazily and at most `concurrency` calls are in flight, so
+    memory stays flat however long the input is. Closing the generator
+    cancels whatever is still running.
+    """
+    iterator = items.__aiter__()
+    pending = set()
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < max(1, concurrency):
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                pending.add(asyncio.ensure_future(fn(item)))
+
+            if not pending:
+                return
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from core.cache import DB_PATH, LRUCache
+from core.executor import run_blocking
+from core.metrics import record_cache
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed, persistent cache in front of an embedding model.
+
+    Vectors are stored as float32 blobs in SQLite (4 bytes per dimension)
+    keyed by sha256(namespace, text), with a small in-process LRU for hot
+    query texts. Only cache misses are sent to the provider, in one batch.
+    """
+
+    def __init__(self, underlying: Embeddings, namespace: Optional[str] = None,
+                 path: str = DB_PATH, table: str = "embedding_cache", memory_entries: int = 4096):
+        self.underlying = underlying
+        self.namespace = namespace or getattr(underlying, "model", type(underlying).__name__)
+        self.path = path
+        self.table = table
+        self.memory = LRUCache(max_entries=memory_entries)
+        self.hits = 0
+        self.misses = 0
+        self.provider_calls = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._conn.commit()
+        return self._conn
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def _load(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        missing = []
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector
+            else:
+                missing.append(key)
+        if not missing:
+            return found
+
+        with self._lock:
+            conn = self._connection()
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(missing), 500):
+                batch = missing[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM {self.table} WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[key] = vector
+                    self.memory.set(key, vector)
+        return found
+
+    def _store(self, keys: List[str], vectors: List[List[float]]):
+        arrays = [np.asarray(v, dtype=np.float32) for v in vectors]
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, vector) VALUES (?, ?)",
+                [(key, array.tobytes()) for key, array in zip(keys, arrays)]
+            )
+            conn.commit()
+        for key, array in zip(keys, arrays):
+            self.memory.set(key, array)
+
+    def _misses(self, texts: List[str], keys: List[str], found: Dict[str, np.ndarray]) -> Dict[str, str]:
+        """Unique texts still needing an embedding, by key"""
+        misses = {}
+        for text, key in zip(texts, keys):
+            if key not in found:
+                misses.setdefault(key, text)
+        hits = len(texts) - sum(1 for key in keys if key not in found)
+        self.hits += hits
+        self.misses += len(misses)
+        record_cache("embeddings", True, hits)
+        record_cache("embeddings", False, len(misses))
+        return misses
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._load(keys)
+        misses = self._misses(texts, keys, found)
+        if misses:
+            self.provider_calls += 1
+            vectors = self.underlying.embed_documents(list(misses.values()))
+            self._store(list(misses), vectors)
+            found.update(zip(misses, (np.asarray(v, dtype=np.float32) for v in vectors)))
+        return [found[key].tolist() for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = await run_blocking(self._load, keys)
+        misses = self._misses(texts, keys, found)
+        if misses:
+            self.provider_calls += 1
+            vectors = await self.underlying.aembed_documents(list(misses.values()))
+            await run_blocking(self._store, list(misses), vectors)
+            found.update(zip(misses, (np.asarray(v, dtype=np.float32) for v in vectors)))
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "provider_calls": self.provider_calls,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+def cached_embeddings_from_env(prefix: str, underlying: Embeddings) -> Embeddings:
+    """Wrap embeddings in CachedEmbeddings unless <PREFIX>_EMBEDDING_CACHE=off"""
+    if os.getenv(f"{prefix}_EMBEDDING_CACHE", "on").lower() == "off":
+        return underlying
+    return CachedEmbeddings(underlying)
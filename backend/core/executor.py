@@ -0,0 +1,31 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, TypeVar
+
+R = TypeVar("R")
+
+# Shared, bounded pool for blocking work (Chroma, SQLite, CPU-bound parsing).
+# Installed as the event loop's default executor at startup, so LangChain's
+# run_in_executor fallbacks land here too.
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "16"))
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+
+
+def start_workers() -> None:
+    """Start every worker thread now; otherwise each is started on the event loop by the submit that needs it,
+    which stalls the loop for as long as busy workers hold the GIL"""
+    # Tasks that wait for each other keep every thread busy, so each submit has to start a new one
+    barrier = threading.Barrier(BLOCKING_WORKERS)
+    wait([blocking_executor.submit(barrier.wait, 5) for _ in range(BLOCKING_WORKERS)])
+
+
+async def run_blocking(fn: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+    """Run a synchronous call on the bounded executor without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    # Carry context variables (e.g. the request's metrics labels) into the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(blocking_executor, functools.partial(context.run, fn, *args, **kwargs))
@@ -0,0 +1,69 @@
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Union
+
+# Metadata fields counted per value and accepted as /ask filters
+FACET_FIELDS = ("category", "source")
+
+# Stored on every chunk: hash of the document it was split from, so documents can be counted from chunks
+DOCUMENT_KEY = "doc_hash"
+
+# {"category": "product"} or {"source": ["pricing", "icp"]}
+MetadataFilters = Dict[str, Union[str, List[str]]]
+
+
+def chroma_where(filters: Optional[MetadataFilters]) -> Optional[dict]:
+    """Chroma `where` clause for the filters: equality per field, $in for lists, $and across fields"""
+    clauses = []
+    for field, value in (filters or {}).items():
+        if isinstance(value, list):
+            clauses.append({field: {"$in": value}})
+        else:
+            clauses.append({field: value})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def metadata_matcher(filters: Optional[MetadataFilters]) -> Optional[Callable[[dict], bool]]:
+    """The same filters as a predicate over chunk metadata (for in-process indexes)"""
+    if not filters:
+        return None
+    allowed = {field: set(value) if isinstance(value, list) else {value} for field, value in filters.items()}
+    return lambda metadata: all(metadata.get(field) in values for field, values in allowed.items())
+
+
+class FacetIndex:
+    """Chunk and document counts, overall and per facet value, maintained as chunks are written"""
+
+    def __init__(self, fields=FACET_FIELDS):
+        self.fields = fields
+        self.chunks = 0
+        self._document_chunks: Dict[str, int] = {}
+        self._values: Dict[str, Counter] = {field: Counter() for field in fields}
+        self._lock = threading.Lock()
+
+    def add(self, ids: List[str], metadatas: List[dict]):
+        """Count newly stored chunks (callers pass each chunk id once)"""
+        with self._lock:
+            for chunk_id, metadata in zip(ids, metadatas):
+                metadata = metadata or {}
+                self.chunks += 1
+                # Chunks stored before documents were tagged count as their own document
+                document = metadata.get(DOCUMENT_KEY) or chunk_id
+                seen = self._document_chunks.get(document, 0)
+                self._document_chunks[document] = seen + 1
+                if seen:
+                    continue
+                for field in self.fields:
+                    if metadata.get(field) is not None:
+                        self._values[field][metadata[field]] += 1
+
+    def snapshot(self) -> dict:
+        """Totals and documents per facet value"""
+        with self._lock:
+            return {
+                "documents": len(self._document_chunks),
+                "chunks": self.chunks,
+                "facets": {field: dict(counts.most_common()) for field, counts in self._values.items()}
+            }
@@ -0,0 +1,258 @@
+import codecs
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from itertools import islice
+from typing import IO, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from core.cache import content_hash
+from core.concurrency import map_bounded
+from core.executor import run_blocking
+from core.facets import DOCUMENT_KEY
+from core.metrics import span
+
+# (text, metadata) pairs flowing through the pipeline
+DocumentItem = Tuple[str, dict]
+
+
+def iter_json_documents(stream: IO[bytes], read_size: int = 1 << 16) -> Iterator[DocumentItem]:
+    """Incrementally parse a JSON array or JSONL stream of {"content", "metadata"} objects"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    mode = None
+
+    def chunks():
+        # Incremental: a multi-byte character may straddle two reads
+        utf8 = codecs.getincrementaldecoder("utf-8")()
+        while True:
+            data = stream.read(read_size)
+            if not data:
+                tail = utf8.decode(b"", final=True)
+                if tail:
+                    yield tail
+                return
+            yield utf8.decode(data, final=False) if isinstance(data, bytes) else data
+
+    source = chunks()
+    for data in source:
+        buffer += data
+        if mode is None:
+            buffer = buffer.lstrip()
+            if not buffer:
+                continue
+            mode = "array" if buffer[0] == "[" else "lines"
+            if mode == "array":
+                buffer = buffer[1:]
+
+        if mode == "lines":
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                if line.strip():
+                    yield _document_item(json.loads(line))
+            continue
+
+        # Decode as many complete objects as the buffer holds; keep the partial tail
+        while True:
+            buffer = buffer.lstrip().lstrip(",").lstrip()
+            if not buffer or buffer[0] == "]":
+                break
+            try:
+                obj, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                break
+            yield _document_item(obj)
+            buffer = buffer[end:]
+
+    if mode == "lines" and buffer.strip():
+        yield _document_item(json.loads(buffer))
+    elif mode == "array" and buffer.strip() not in ("", "]"):
+        raise ValueError("Truncated JSON array")
+
+
+def _document_item(obj: dict) -> DocumentItem:
+    return obj["content"], obj.get("metadata") or {}
+
+
+def split_items(items: List[DocumentItem], chunk_size: int, chunk_overlap: int) -> List[DocumentItem]:
+    """Split documents into chunks (module-level so it can run in a worker process)"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return [(chunk, metadata) for text, metadata in items for chunk in splitter.split_text(text)]
+
+
+def chunk_id(text: str, metadata: dict) -> str:
+    """Content-addressed id: re-ingesting an unchanged chunk maps to the same row"""
+    return content_hash(text, metadata)
+
+
+def default_split_processes() -> int:
+    """One splitting process per spare core, up to 4; none on a single core, where a pool only competes with serving"""
+    return max(0, min(4, (os.cpu_count() or 1) - 1))
+
+
+@dataclass
+class IngestReport:
+    documents: int = 0
+    chunks: int = 0
+    chunks_skipped: int = 0
+    chunks_embedded: int = 0
+    embedding_calls: int = 0
+    embedding_calls_saved: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        report = asdict(self)
+        report["docs_per_second"] = round(self.documents / self.seconds, 1) if self.seconds else 0.0
+        return report
+
+
+class IngestionPipeline:
+    """Batched, deduplicated ingestion into a LangChain Chroma store.
+
+    Documents are pulled in batches, split (in a process pool for large
+    batches), hashed, checked against ids already in the collection, and
+    only new chunks are embedded, in provider-sized batches with bounded
+    concurrency. Each batch is written with one upsert and one persist.
+    """
+
+    def __init__(
+        self,
+        vectorstore,
+        embeddings,
+        persist: Optional[Callable[[], None]] = None,
+        on_write: Optional[Callable[[List[str], List[str], List[dict], List[List[float]]], None]] = None,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        batch_docs: Optional[int] = None,
+        embed_batch_size: Optional[int] = None,
+        embed_concurrency: Optional[int] = None,
+        processes: Optional[int] = None
+    ):
+        self.vectorstore = vectorstore
+        self.embeddings = embeddings
+        self.persist = persist
+        # Notified with (ids, texts, metadatas, vectors) after each batch is written (e.g. to keep side indexes in sync)
+        self.on_write = on_write
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.batch_docs = batch_docs or int(os.getenv("ASKGTM_INGEST_BATCH_DOCS", "500"))
+        # OpenAI accepts up to 2048 inputs per request; 1000 chunks stays under its per-request token cap
+        self.embed_batch_size = embed_batch_size or int(os.getenv("ASKGTM_EMBED_BATCH_SIZE", "1000"))
+        self.embed_concurrency = embed_concurrency or int(os.getenv("ASKGTM_EMBED_CONCURRENCY", "4"))
+        self.processes = processes if processes is not None else int(
+            os.getenv("ASKGTM_INGEST_PROCESSES", str(default_split_processes()))
+        )
+        self._pool = None
+
+    def _split(self, items: List[DocumentItem]) -> List[DocumentItem]:
+        # Small batches are cheaper to split in-process than to ship to a worker
+        if self.processes <= 0 or len(items) < 64:
+            return split_items(items, self.chunk_size, self.chunk_overlap)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.processes)
+        size = -(-len(items) // self.processes)
+        parts = self._pool.map(
+            split_items,
+            [items[i:i + size] for i in range(0, len(items), size)],
+            [self.chunk_size] * self.processes,
+            [self.chunk_overlap] * self.processes
+        )
+        return [chunk for part in parts for chunk in part]
+
+    def _prepare(self, items: List[DocumentItem], report: IngestReport) -> Tuple[List[str], List[str], List[dict]]:
+        """Split a batch and keep only chunks not already stored"""
+        # Chunks carry their document's hash; ids stay on the caller's metadata so existing rows still dedupe
+        tagged = [(text, {**metadata, DOCUMENT_KEY: content_hash(text, metadata)}) for text, metadata in items]
+        chunks = {}
+        for text, metadata in self._split(tagged):
+            untagged = {key: value for key, value in metadata.items() if key != DOCUMENT_KEY}
+            chunks.setdefault(chunk_id(text, untagged), (text, metadata))
+        report.chunks += len(chunks)
+
+        ids = list(chunks)
+        with span("vectorstore", "dedupe"):
+            existing = set(self.vectorstore._collection.get(ids=ids, include=[])["ids"]) if ids else set()
+        report.chunks_skipped += len(existing)
+
+        new_ids = [i for i in ids if i not in existing]
+        report.embedding_calls_saved += self._calls_for(len(ids)) - self._calls_for(len(new_ids))
+        return new_ids, [chunks[i][0] for i in new_ids], [chunks[i][1] for i in new_ids]
+
+    def _write(self, ids: List[str], texts: List[str], metadatas: List[dict], vectors: List[List[float]]):
+        with span("vectorstore", "upsert"):
+            self.vectorstore._collection.upsert(
+                ids=ids,
+                embeddings=vectors,
+                documents=texts,
+                metadatas=[metadata or None for metadata in metadatas]
+            )
+            if self.persist:
+                self.persist()
+        if self.on_write:
+            self.on_write(ids, texts, metadatas, vectors)
+
+    def _calls_for(self, chunks: int) -> int:
+        return -(-chunks // self.embed_batch_size)
+
+    def _embedding_batches(self, texts: List[str]) -> List[List[str]]:
+        return [texts[i:i + self.embed_batch_size] for i in range(0, len(texts), self.embed_batch_size)]
+
+    def _count_calls(self, report: IngestReport, chunks: int, calls: int):
+        report.embedding_calls += calls
+        report.chunks_embedded += chunks
+
+    def ingest(self, documents: Iterable[DocumentItem]) -> IngestReport:
+        """Ingest synchronously (single embedding call at a time)"""
+        report = IngestReport()
+        started = time.perf_counter()
+        iterator = iter(documents)
+        while True:
+            items = list(islice(iterator, self.batch_docs))
+            if not items:
+                break
+            report.documents += len(items)
+            report.batches += 1
+            ids, texts, metadatas = self._prepare(items, report)
+            if not ids:
+                continue
+            batches = self._embedding_batches(texts)
+            vectors = [v for batch in batches for v in self.embeddings.embed_documents(batch)]
+            self._count_calls(report, len(texts), len(batches))
+            self._write(ids, texts, metadatas, vectors)
+
+        return self._finish(report, started)
+
+    async def aingest(self, documents: Iterable[DocumentItem]) -> IngestReport:
+        """Ingest without blocking the event loop, embedding batches concurrently"""
+        report = IngestReport()
+        started = time.perf_counter()
+        iterator = iter(documents)
+        while True:
+            # Parsing pulls from the upload file, so read each batch off the loop
+            items = await run_blocking(lambda: list(islice(iterator, self.batch_docs)))
+            if not items:
+                break
+            report.documents += len(items)
+            report.batches += 1
+            ids, texts, metadatas = await run_blocking(self._prepare, items, report)
+            if not ids:
+                continue
+            batches = self._embedding_batches(texts)
+            results = await map_bounded(self.embeddings.aembed_documents, batches, self.embed_concurrency)
+            self._count_calls(report, len(texts), len(batches))
+            await run_blocking(self._write, ids, texts, metadatas, [v for batch in results for v in batch])
+
+        return self._finish(report, started)
+
+    def _finish(self, report: IngestReport, started: float) -> IngestReport:
+        report.seconds = round(time.perf_counter() - started, 3)
+        return report
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
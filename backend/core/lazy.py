@@ -0,0 +1,74 @@
+import logging
+import threading
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+from fastapi import HTTPException
+
+from core.executor import run_blocking
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class LazyAgent(Generic[T]):
+    """Builds an agent on first use, off the event loop, and shares it.
+
+    Instances are FastAPI dependencies: `agent = Depends(lazy_agent)`. If the
+    build fails (e.g. the network is briefly down on a cold start) the request
+    gets a 503 and the next request tries again.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self.factory = factory
+        self.error: Optional[str] = None
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> T:
+        """Build (once) and return the agent; blocking"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    try:
+                        self._instance = self.factory()
+                        self.error = None
+                    except Exception as e:
+                        self.error = f"{type(e).__name__}: {e}"
+                        raise
+        return self._instance
+
+    async def aget(self) -> T:
+        return self._instance if self._instance is not None else await run_blocking(self.get)
+
+    def set(self, instance: T):
+        """Swap in a prebuilt agent (scripts, benchmarks)"""
+        with self._lock:
+            self._instance = instance
+            self.error = None
+
+    def status(self) -> str:
+        if self._instance is not None:
+            return "ready"
+        return f"failed: {self.error}" if self.error else "pending"
+
+    async def __call__(self) -> T:
+        try:
+            return await self.aget()
+        except Exception:
+            raise HTTPException(status_code=503, detail=f"{self.name} is unavailable: {self.error}")
+
+
+async def warm_up(agents: List[LazyAgent]) -> Dict[str, str]:
+    """Build each agent in turn, keeping going past failures; returns name -> status"""
+    for agent in agents:
+        try:
+            await agent.aget()
+        except Exception:
+            logger.exception("Warm-up of %s failed", agent.name)
+    return {agent.name: agent.status() for agent in agents}
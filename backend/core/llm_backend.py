@@ -0,0 +1,52 @@
+import os
+from typing import Any
+
+# GTM_LLM_BACKEND: live (OpenAI), record (OpenAI, saving every response to GTM_FIXTURES) or replay (fixtures only, no network).
+# The record/replay machinery (core.replay) is only imported when selected.
+# Live and recorded async calls share the rate-limit-aware scheduler in core.scheduler unless GTM_LLM_SCHEDULER=off.
+
+
+def llm_backend() -> str:
+    backend = os.getenv("GTM_LLM_BACKEND", "live").lower()
+    if backend not in ("live", "record", "replay"):
+        raise ValueError(f"GTM_LLM_BACKEND must be live, record or replay, not {backend!r}")
+    return backend
+
+
+def _scheduled(kwargs: dict) -> dict:
+    """OpenAI client kwargs with the scheduler's shared async HTTP client"""
+    from core.scheduler import scheduler_enabled
+    if not scheduler_enabled() or "http_async_client" in kwargs:
+        return kwargs
+    from core.scheduler_http import scheduled_http_client
+    return {**kwargs, "http_async_client": scheduled_http_client()}
+
+
+def chat_model(model: str, temperature: float, **kwargs: Any):
+    """Chat model for the configured backend; kwargs go to ChatOpenAI"""
+    backend = llm_backend()
+    if backend == "replay":
+        from core.replay import ReplayChatModel, ReplayTiming, fixture_store
+        return ReplayChatModel(fixtures=fixture_store(), timing=ReplayTiming.from_env(), model_name=model, temperature=temperature)
+
+    from langchain_openai import ChatOpenAI
+    llm = ChatOpenAI(model=model, temperature=temperature, **_scheduled(kwargs))
+    if backend == "record":
+        from core.replay import RecordingChatModel, fixture_store
+        return RecordingChatModel(underlying=llm, fixtures=fixture_store(), model_name=model, temperature=temperature)
+    return llm
+
+
+def embedding_model(model: str):
+    """Embeddings for the configured backend"""
+    backend = llm_backend()
+    if backend == "replay":
+        from core.replay import ReplayEmbeddings, ReplayTiming, fixture_store
+        return ReplayEmbeddings(fixture_store(), model, ReplayTiming.from_env())
+
+    from langchain_openai import OpenAIEmbeddings
+    embeddings = OpenAIEmbeddings(model=model, **_scheduled({}))
+    if backend == "record":
+        from core.replay import RecordingEmbeddings, fixture_store
+        return RecordingEmbeddings(embeddings, fixture_store(), model)
+    return embeddings
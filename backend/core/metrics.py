@@ -0,0 +1,386 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+
+from core.usage import MODEL_PRICES
+
+# GTM_METRICS=off turns every recording call into a no-op; GTM_TIMING_HEADERS=on adds Server-Timing to responses
+ENABLED = os.getenv("GTM_METRICS", "on").lower() != "off"
+TIMING_HEADERS = os.getenv("GTM_TIMING_HEADERS", "off").lower() == "on"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "gtm_stage_seconds": ("histogram", "Latency of LLM, embedding, retriever and vector-store calls, and LLM scheduler queue waits"),
+    "gtm_stage_errors_total": ("counter", "Failed LLM, embedding, retriever and vector-store calls"),
+    "gtm_llm_tokens_total": ("counter", "LLM tokens by prompt stage and type (prompt, completion, cached)"),
+    "gtm_llm_cost_usd_total": ("counter", "Estimated LLM spend at list prices"),
+    "gtm_llm_rate_limited_total": ("counter", "429 responses from the LLM provider by model"),
+    "gtm_coalesced_requests_total": ("counter", "Requests that joined an identical in-flight request instead of calling the LLM"),
+    "gtm_llm_tier_seconds": ("histogram", "Latency of routed structured LLM calls by agent and model tier"),
+    "gtm_llm_tier_requests_total": ("counter", "Routed structured LLM calls by agent, model tier and outcome (ok, invalid, error)"),
+    "gtm_llm_tier_cost_usd_total": ("counter", "Estimated LLM spend by agent and model tier"),
+    "gtm_embedding_texts_total": ("counter", "Texts sent to the embedding provider"),
+    "gtm_cache_requests_total": ("counter", "Cache lookups by cache and result (hit, miss)"),
+    "gtm_http_requests_total": ("counter", "HTTP requests by route, method and status"),
+    "gtm_http_request_seconds": ("histogram", "HTTP request latency by route, until the body is fully sent"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Process-wide counters and histograms rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+
+    def inc(self, name: str, labels: Labels, amount: float = 1.0):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0.0) + amount
+
+    def observe(self, name: str, labels: Labels, value: float):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = Histogram()
+            histogram.observe(value)
+
+    def value(self, name: str, **labels: str) -> float:
+        """Sum of a counter over series matching the given labels"""
+        with self._lock:
+            return sum(
+                v for (n, series), v in self._counters.items()
+                if n == name and all(dict(series).get(k) == want for k, want in labels.items())
+            )
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            lines, described = [], set()
+
+            def describe(name: str):
+                if name not in described:
+                    described.add(name)
+                    kind, text = HELP.get(name, ("untyped", name))
+                    lines.append(f"# HELP {name} {text}")
+                    lines.append(f"# TYPE {name} {kind}")
+
+            for (name, labels), value in counters:
+                describe(name)
+                lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+            for (name, labels), histogram in histograms:
+                describe(name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry()
+
+
+@dataclass
+class RequestContext:
+    """What the current request (or background task) has spent, per kind of call"""
+    scope: Optional[dict] = None
+    label: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    cost_usd: float = 0.0
+    tiers: Dict[str, int] = field(default_factory=dict)
+
+
+_context: contextvars.ContextVar[Optional[RequestContext]] = contextvars.ContextVar("gtm_metrics_context", default=None)
+
+
+def current_endpoint() -> str:
+    """Route template of the request being served (e.g. /dealsense/jobs/{job_id}), or the background label"""
+    context = _context.get()
+    if context is None:
+        return "background"
+    if context.label:
+        return context.label
+    route = context.scope.get("route") if context.scope else None
+    return getattr(route, "path", None) or "unmatched"
+
+
+@contextmanager
+def endpoint(label: str):
+    """Attribute calls made outside a request (background jobs, warm-up) to `label`"""
+    token = _context.set(RequestContext(label=label))
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def observe(kind: str, stage: str, seconds: float, error: bool = False):
+    if not ENABLED:
+        return
+    labels = (("endpoint", current_endpoint()), ("kind", kind), ("stage", stage))
+    registry.observe("gtm_stage_seconds", labels, seconds)
+    if error:
+        registry.inc("gtm_stage_errors_total", labels)
+    context = _context.get()
+    if context is not None:
+        context.timings[kind] = context.timings.get(kind, 0.0) + seconds
+
+
+@contextmanager
+def span(kind: str, stage: str):
+    """Time a block as one call of `kind` (llm, embedding, vectorstore, ...) at `stage`"""
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        observe(kind, stage, time.perf_counter() - start, error)
+
+
+def record_tokens(stage: str, model: str, prompt: int, completion: int, cached: int = 0):
+    if not ENABLED:
+        return
+    endpoint_label = current_endpoint()
+    base = (("endpoint", endpoint_label), ("model", model), ("stage", stage))
+    for kind, count in (("prompt", prompt), ("completion", completion), ("cached", cached)):
+        if count:
+            registry.inc("gtm_llm_tokens_total", base + (("type", kind),), count)
+    prices = MODEL_PRICES.get(model)
+    if prices:
+        input_price, cached_price, output_price = prices
+        cost = ((prompt - cached) * input_price + cached * cached_price + completion * output_price) / 1e6
+        registry.inc("gtm_llm_cost_usd_total", base, cost)
+        context = _context.get()
+        if context is not None:
+            context.cost_usd += cost
+
+
+def record_tier(agent: str, tier: str, outcome: str, seconds: float, cost: Optional[float]):
+    """One routed structured call: latency and spend per model tier, and the tier on the current request"""
+    if not ENABLED:
+        return
+    labels = (("agent", agent), ("tier", tier))
+    registry.observe("gtm_llm_tier_seconds", labels, seconds)
+    registry.inc("gtm_llm_tier_requests_total", labels + (("outcome", outcome),))
+    if cost:
+        registry.inc("gtm_llm_tier_cost_usd_total", labels, cost)
+    context = _context.get()
+    if context is not None and outcome != "error":
+        context.tiers[tier] = context.tiers.get(tier, 0) + 1
+
+
+def record_cache(cache: str, hit: bool, count: int = 1):
+    if ENABLED and count:
+        registry.inc(
+            "gtm_cache_requests_total",
+            (("cache", cache), ("endpoint", current_endpoint()), ("result", "hit" if hit else "miss")),
+            count
+        )
+
+
+def _stage(tags: Optional[List[str]], default: str) -> str:
+    # The last stage:<name> tag is the most specific (local tags follow inherited ones)
+    for tag in reversed(tags or []):
+        if tag.startswith("stage:"):
+            return tag[6:]
+    return default
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """LangChain callbacks that time every LLM and retriever run and count LLM tokens"""
+
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[UUID, Tuple[float, str, str]] = {}
+
+    def _start(self, run_id: UUID, kind: str, stage: str, model: str = ""):
+        self._runs[run_id] = (time.perf_counter(), stage, model)
+
+    def _end(self, run_id: UUID, kind: str, error: bool = False) -> Optional[Tuple[str, str]]:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        started, stage, model = run
+        observe(kind, stage, time.perf_counter() - started, error)
+        return stage, model
+
+    def _llm_start(self, run_id: UUID, tags, metadata, kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = (metadata or {}).get("ls_model_name") or params.get("model_name") or params.get("model") or params.get("_type", "unknown")
+        self._start(run_id, "llm", _stage(tags, "llm"), str(model))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, metadata=None, **kwargs):
+        self._llm_start(run_id, tags, metadata, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, metadata=None, **kwargs):
+        self._llm_start(run_id, tags, metadata, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        ended = self._end(run_id, "llm")
+        if ended is None:
+            return
+        stage, model = ended
+        prompt = completion = cached = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt += usage.get("input_tokens", 0)
+                completion += usage.get("output_tokens", 0)
+                cached += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+        if not (prompt or completion):
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        record_tokens(stage, model, prompt, completion, cached)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "llm", error=True)
+
+    def on_retriever_start(self, serialized, query, *, run_id, tags=None, **kwargs):
+        self._start(run_id, "retriever", _stage(tags, "retrieve"))
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, "retriever")
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "retriever", error=True)
+
+
+handler = MetricsCallbackHandler()
+
+
+def run_config(stage: Optional[str] = None) -> dict:
+    """RunnableConfig that reports the run and everything nested in it to the metrics handler"""
+    config: Dict[str, Any] = {"callbacks": [handler]} if ENABLED else {}
+    if stage:
+        config["tags"] = [f"stage:{stage}"]
+    return config
+
+
+class InstrumentedEmbeddings(Embeddings):
+    """Times calls to an embedding provider and counts the texts sent"""
+
+    def __init__(self, underlying: Embeddings):
+        self.underlying = underlying
+
+    def __getattr__(self, name: str):
+        # Provider-specific attributes (model, call counters) pass through
+        return getattr(self.underlying, name)
+
+    def _count(self, texts: List[str]):
+        if ENABLED:
+            registry.inc("gtm_embedding_texts_total", (("endpoint", current_endpoint()),), len(texts))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._count(texts)
+        with span("embedding", "documents"):
+            return self.underlying.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._count(texts)
+        with span("embedding", "documents"):
+            return await self.underlying.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self._count([text])
+        with span("embedding", "query"):
+            return self.underlying.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        self._count([text])
+        with span("embedding", "query"):
+            return await self.underlying.aembed_query(text)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: per-route request counts and latency, LLM cost and model tier headers, optional Server-Timing"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        context = RequestContext(scope=scope)
+        token = _context.set(context)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Cost and tiers are complete once the handler returns (streamed bodies may still call the LLM)
+                extra = []
+                if context.cost_usd:
+                    extra.append((b"x-llm-cost-usd", f"{context.cost_usd:.6f}".encode()))
+                if context.tiers:
+                    extra.append((b"x-model-tiers", ",".join(f"{t}={n}" for t, n in context.tiers.items()).encode()))
+                if TIMING_HEADERS:
+                    timings = dict(context.timings, app=time.perf_counter() - started)
+                    value = ", ".join(f"{kind};dur={seconds * 1000:.1f}" for kind, seconds in timings.items())
+                    extra.append((b"server-timing", value.encode()))
+                if extra:
+                    message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = current_endpoint()
+            registry.inc("gtm_http_requests_total", (("endpoint", route), ("method", scope["method"]), ("status", str(status))))
+            registry.observe("gtm_http_request_seconds", (("endpoint", route),), time.perf_counter() - started)
+            _context.reset(token)
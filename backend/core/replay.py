@@ -0,0 +1,299 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+DEFAULT_FIXTURES = "./fixtures/llm.jsonl"
+
+
+class ReplayMiss(LookupError):
+    """Raised in replay mode for a request that was never recorded"""
+
+
+class FixtureStore:
+    """Recorded LLM and embedding responses in a JSONL file, keyed by request hash"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Optional[Dict[str, dict]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, dict]:
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self._entries[entry["key"]] = entry
+        return self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            return self._load().get(key)
+
+    def put(self, entry: dict):
+        """Append an entry; the first recording of a request wins"""
+        with self._lock:
+            entries = self._load()
+            if entry["key"] in entries:
+                return
+            entries[entry["key"]] = entry
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+_stores: Dict[str, FixtureStore] = {}
+_stores_lock = threading.Lock()
+
+
+def fixture_store(path: Optional[str] = None) -> FixtureStore:
+    """Process-wide store for a fixtures file (GTM_FIXTURES by default)"""
+    path = os.path.abspath(path or os.getenv("GTM_FIXTURES", DEFAULT_FIXTURES))
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = FixtureStore(path)
+        return _stores[path]
+
+
+def chat_key(model: str, temperature: Optional[float], messages: List[BaseMessage], stop: Optional[List[str]], kwargs: dict) -> str:
+    """Hash of everything that shapes a chat completion"""
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "messages": [(m.type, m.content) for m in messages],
+        "stop": stop,
+        "kwargs": {k: v for k, v in sorted(kwargs.items()) if v is not None}
+    }
+    return "chat:" + hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def embedding_key(model: str, text: str) -> str:
+    return "embedding:" + hashlib.sha256(json.dumps([model, text]).encode()).hexdigest()
+
+
+def _message(entry: dict) -> AIMessage:
+    return AIMessage(content=entry["content"], usage_metadata=entry.get("usage_metadata"))
+
+
+def _encode_vector(vector: List[float]) -> str:
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode()
+
+
+def _decode_vector(data: str) -> List[float]:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32).tolist()
+
+
+class ReplayTiming:
+    """Synthetic latency for replayed calls: recorded (or fixed) delay, scaled by +/- jitter"""
+
+    def __init__(self, latency: Optional[float] = None, jitter: float = 0.0, token_latency: float = 0.0, seed: int = 0):
+        # latency=None replays each call's recorded latency
+        self.latency = latency
+        self.jitter = jitter
+        self.token_latency = token_latency
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ReplayTiming":
+        """GTM_REPLAY_LATENCY (seconds or "recorded"), _JITTER (fraction), _TOKEN_LATENCY and _SEED"""
+        latency = os.getenv("GTM_REPLAY_LATENCY", "recorded")
+        return cls(
+            latency=None if latency == "recorded" else float(latency),
+            jitter=float(os.getenv("GTM_REPLAY_JITTER", "0")),
+            token_latency=float(os.getenv("GTM_REPLAY_TOKEN_LATENCY", "0")),
+            seed=int(os.getenv("GTM_REPLAY_SEED", "0"))
+        )
+
+    def delay(self, entry: dict) -> float:
+        base = entry.get("latency", 0.0) if self.latency is None else self.latency
+        if not self.jitter:
+            return base
+        with self._lock:
+            return max(0.0, base * (1 + self._random.uniform(-self.jitter, self.jitter)))
+
+
+class RecordingChatModel(BaseChatModel):
+    """Passes calls through to a real chat model and records each response and its latency"""
+
+    underlying: Any
+    fixtures: Any
+    model_name: str
+    temperature: Optional[float] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+    def _key(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: dict) -> str:
+        return chat_key(self.model_name, self.temperature, messages, stop, kwargs)
+
+    def _record(self, key: str, message: BaseMessage, started: float) -> ChatResult:
+        entry = {
+            "key": key,
+            "kind": "chat",
+            "model": self.model_name,
+            "content": message.content,
+            "usage_metadata": getattr(message, "usage_metadata", None),
+            "latency": round(time.perf_counter() - started, 4)
+        }
+        self.fixtures.put(entry)
+        return ChatResult(generations=[ChatGeneration(message=_message(entry))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        started = time.perf_counter()
+        message = self.underlying.invoke(messages, stop=stop, **kwargs)
+        return self._record(self._key(messages, stop, kwargs), message, started)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        started = time.perf_counter()
+        message = await self.underlying.ainvoke(messages, stop=stop, **kwargs)
+        return self._record(self._key(messages, stop, kwargs), message, started)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        started = time.perf_counter()
+        full = None
+        async for chunk in self.underlying.astream(messages, stop=stop, **kwargs):
+            full = chunk if full is None else full + chunk
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk.content, usage_metadata=chunk.usage_metadata))
+        if full is not None:
+            self._record(self._key(messages, stop, kwargs), full, started)
+
+
+class ReplayChatModel(BaseChatModel):
+    """Answers from recorded fixtures with synthetic latency; never touches the network"""
+
+    fixtures: Any
+    timing: Any
+    model_name: str
+    temperature: Optional[float] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _entry(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: dict) -> dict:
+        key = chat_key(self.model_name, self.temperature, messages, stop, kwargs)
+        entry = self.fixtures.get(key)
+        if entry is None:
+            raise ReplayMiss(f"No recorded {self.model_name} response for {key} in {self.fixtures.path}")
+        return entry
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        entry = self._entry(messages, stop, kwargs)
+        time.sleep(self.timing.delay(entry))
+        return ChatResult(generations=[ChatGeneration(message=_message(entry))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        entry = self._entry(messages, stop, kwargs)
+        await asyncio.sleep(self.timing.delay(entry))
+        return ChatResult(generations=[ChatGeneration(message=_message(entry))])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        # The delay is time to first token; the rest follows at token_latency per token
+        entry = self._entry(messages, stop, kwargs)
+        await asyncio.sleep(self.timing.delay(entry))
+        for i, token in enumerate(re.findall(r"\S+\s*", entry["content"])):
+            if i and self.timing.token_latency:
+                await asyncio.sleep(self.timing.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=entry.get("usage_metadata")))
+
+
+class RecordingEmbeddings(Embeddings):
+    """Passes embedding calls through and records one vector per text"""
+
+    def __init__(self, underlying: Embeddings, fixtures: FixtureStore, model: str):
+        self.underlying = underlying
+        self.fixtures = fixtures
+        self.model = model
+
+    def _record(self, texts: List[str], vectors: List[List[float]], started: float) -> List[List[float]]:
+        # Batch latency is split evenly so replay can rebuild any batch from per-text entries
+        latency = round((time.perf_counter() - started) / max(len(texts), 1), 6)
+        for text, vector in zip(texts, vectors):
+            self.fixtures.put({
+                "key": embedding_key(self.model, text),
+                "kind": "embedding",
+                "model": self.model,
+                "vector": _encode_vector(vector),
+                "latency": latency
+            })
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        started = time.perf_counter()
+        return self._record(texts, self.underlying.embed_documents(texts), started)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        started = time.perf_counter()
+        return self._record(texts, await self.underlying.aembed_documents(texts), started)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class ReplayEmbeddings(Embeddings):
+    """Recorded vectors with synthetic latency; a batch waits for the sum of its texts' delays"""
+
+    def __init__(self, fixtures: FixtureStore, model: str, timing: ReplayTiming):
+        self.fixtures = fixtures
+        self.model = model
+        self.timing = timing
+
+    def _lookup(self, texts: List[str]) -> Tuple[List[List[float]], float]:
+        entries = []
+        for text in texts:
+            entry = self.fixtures.get(embedding_key(self.model, text))
+            if entry is None:
+                raise ReplayMiss(f"No recorded {self.model} embedding for {text[:60]!r} in {self.fixtures.path}")
+            entries.append(entry)
+        if self.timing.latency is None:
+            delay = sum(self.timing.delay(entry) for entry in entries)
+        else:
+            delay = self.timing.delay({})  # a fixed latency applies once per call, like a real batch request
+        return [_decode_vector(entry["vector"]) for entry in entries], delay
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors, delay = self._lookup(texts)
+        time.sleep(delay)
+        return vectors
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors, delay = self._lookup(texts)
+        await asyncio.sleep(delay)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
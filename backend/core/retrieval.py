@@ -0,0 +1,140 @@
+import asyncio
+import math
+import os
+from typing import Any, List, Optional, Set
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from core.bm25 import BM25Index
+from core.executor import run_blocking
+from core.facets import MetadataFilters, chroma_where, metadata_matcher
+from core.metrics import span
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], rrf_k: int = 60) -> List[Document]:
+    """Fuse ranked lists by sum of 1 / (rrf_k + rank); documents are matched on content"""
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            documents.setdefault(key, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class CrossEncoderReranker:
+    """Re-scores (query, passage) pairs with a small local cross-encoder, loaded on first use"""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+
+    def rerank(self, query: str, documents: List[Document]) -> List[Document]:
+        if not documents:
+            return documents
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name)
+        scores = self._model.predict([(query, doc.page_content) for doc in documents])
+        ranked = sorted(zip(scores, range(len(documents))), reverse=True)
+        return [documents[i] for _, i in ranked]
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 + vector retrieval fused with reciprocal rank fusion, optionally re-ranked locally.
+
+    On the async path the query is embedded with the embedder's async client
+    while BM25 runs on the blocking executor, so neither waits for the other
+    and the event loop waits for neither.
+
+    Metadata filters restrict both sides to matching chunks. Chroma's
+    pre-filter reads the metadata of every matching row, which is cheap for
+    selective filters but slow for broad ones, so when the BM25 facet index
+    shows a filter matching a large share of the collection the vector side
+    over-fetches unfiltered and drops non-matching chunks instead.
+    """
+
+    vectorstore: Any
+    bm25: BM25Index
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    reranker: Optional[CrossEncoderReranker] = None
+    rerank_top_n: int = 12
+    filters: Optional[MetadataFilters] = None
+    # Largest unfiltered over-fetch tried before pushing a filter into Chroma
+    overfetch_max: int = 500
+
+    def _allowed(self) -> Optional[Set[int]]:
+        return self.bm25.matching(self.filters) if self.filters else None
+
+    def _lexical(self, query: str, allowed: Optional[Set[int]]) -> List[Document]:
+        with span("lexical", "bm25"):
+            hits = self.bm25.search(query, self.fetch_k, allowed=allowed)
+        return [
+            Document(page_content=self.bm25.texts[position], metadata=self.bm25.metadatas[position])
+            for position, _ in hits
+        ]
+
+    def _fetch_k(self, allowed: Optional[Set[int]] = None) -> int:
+        # The BM25 index mirrors the collection, so never ask Chroma for more than it holds (or matches)
+        available = len(self.bm25) if allowed is None else len(allowed)
+        return max(1, min(self.fetch_k, available)) if len(self.bm25) else self.fetch_k
+
+    def _overfetch(self, allowed: Optional[Set[int]]) -> int:
+        """Unfiltered results to fetch and trim locally, or 0 to push the filter into Chroma"""
+        if not allowed:
+            return 0
+        needed = min(math.ceil(2 * self._fetch_k(allowed) * len(self.bm25) / len(allowed)), len(self.bm25))
+        return needed if needed <= self.overfetch_max else 0
+
+    def _trim(self, docs: List[Document], k: int) -> Optional[List[Document]]:
+        """Matching docs from an over-fetch, or None if fewer than k survived"""
+        matches = metadata_matcher(self.filters)
+        kept = [doc for doc in docs if matches(doc.metadata)]
+        return kept[:k] if len(kept) >= k else None
+
+    def _fuse(self, query: str, vector_docs: List[Document], lexical_docs: List[Document]) -> List[Document]:
+        fused = reciprocal_rank_fusion([vector_docs, lexical_docs], self.rrf_k)
+        if self.reranker:
+            with span("rerank", "cross_encoder"):
+                fused = self.reranker.rerank(query, fused[:self.rerank_top_n])
+        return fused[:self.k]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        allowed = self._allowed()
+        k, overfetch = self._fetch_k(allowed), self._overfetch(allowed)
+        with span("vectorstore", "similarity_search"):
+            vector_docs = self._trim(self.vectorstore.similarity_search(query, k=overfetch), k) if overfetch else None
+            if vector_docs is None:
+                vector_docs = self.vectorstore.similarity_search(query, k=k, filter=chroma_where(self.filters))
+        return self._fuse(query, vector_docs, self._lexical(query, allowed))
+
+    async def _avector(self, query: str, allowed: Optional[Set[int]]) -> List[Document]:
+        """Vector side of the async path: one async query embedding, then index searches off the event loop"""
+        k, overfetch = self._fetch_k(allowed), self._overfetch(allowed)
+        embedding = await self.vectorstore.embeddings.aembed_query(query)
+        search = self.vectorstore.similarity_search_by_vector
+        with span("vectorstore", "similarity_search"):
+            vector_docs = self._trim(await run_blocking(search, embedding, k=overfetch), k) if overfetch else None
+            if vector_docs is None:
+                vector_docs = await run_blocking(search, embedding, k=k, filter=chroma_where(self.filters))
+        return vector_docs
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        allowed = self._allowed()
+        vector_docs, lexical_docs = await asyncio.gather(
+            self._avector(query, allowed), run_blocking(self._lexical, query, allowed)
+        )
+        if self.reranker:
+            return await run_blocking(self._fuse, query, vector_docs, lexical_docs)
+        return self._fuse(query, vector_docs, lexical_docs)
+
+
+def reranker_from_env(prefix: str) -> Optional[CrossEncoderReranker]:
+    """Local cross-encoder named by <PREFIX>_RERANKER_MODEL (unset disables re-ranking)"""
+    model_name = os.getenv(f"{prefix}_RERANKER_MODEL")
+    return CrossEncoderReranker(model_name) if model_name else None
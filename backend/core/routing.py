@@ -0,0 +1,152 @@
+import os
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, Generic, Optional, Tuple, Type, TypeVar
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import BaseMessage
+from pydantic import BaseModel, ValidationError
+
+from core.concurrency import call_with_retry
+from core.metrics import record_tier, run_config
+from core.usage import TokenUsage
+
+T = TypeVar("T", bound=BaseModel)
+
+# Model tiers, cheapest first; output that fails validation is retried one tier up
+TIERS = ("fast", "quality")
+
+
+def tier_models() -> Dict[str, str]:
+    """Model per tier (GTM_FAST_MODEL, GTM_QUALITY_MODEL)"""
+    return {
+        "fast": os.getenv("GTM_FAST_MODEL", "gpt-4o-mini"),
+        "quality": os.getenv("GTM_QUALITY_MODEL", "gpt-4o"),
+    }
+
+
+@lru_cache(maxsize=None)
+def json_schema_format(schema: Type[BaseModel]) -> dict:
+    """OpenAI response_format that constrains the reply to the schema (Structured Outputs, strict mode)"""
+    from langchain_core.utils.function_calling import convert_to_openai_function
+    function = convert_to_openai_function(schema, strict=True)
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": function["name"], "description": function.get("description", ""),
+                        "schema": function["parameters"], "strict": True}
+    }
+
+
+@dataclass
+class Routed(Generic[T]):
+    """A validated structured answer and what it took to get it"""
+    value: T
+    tier: str
+    escalated: bool
+    seconds: float
+    cost_usd: Optional[float]
+
+
+class StructuredRouter(Generic[T]):
+    """Prompt | model chains compiled once per tier, answering in native JSON-schema mode.
+
+    `check` adds semantic validation on top of the schema (raise ValueError to
+    reject); a rejected or unparseable answer is retried once on the next tier.
+    """
+
+    def __init__(
+        self,
+        agent: str,
+        schema: Type[T],
+        models: Dict[str, Any],
+        prompt=None,
+        check: Optional[Callable[[T], None]] = None
+    ):
+        self.agent = agent
+        self.schema = schema
+        self.models = models
+        self.check = check
+        response_format = json_schema_format(schema)
+        self.chains = {
+            tier: (prompt | llm.bind(response_format=response_format)) if prompt is not None
+            else llm.bind(response_format=response_format)
+            for tier, llm in models.items()
+        }
+
+    def _parse(self, message: BaseMessage) -> T:
+        value = self.schema.model_validate_json(message.content)
+        if self.check:
+            self.check(value)
+        return value
+
+    def _cost(self, tier: str, message: BaseMessage) -> Optional[float]:
+        tokens = TokenUsage()
+        tokens.add(message)
+        return tokens.cost(getattr(self.models[tier], "model_name", ""))
+
+    def _next(self, tier: str) -> Optional[str]:
+        later = [t for t in TIERS[TIERS.index(tier) + 1:] if t in self.chains]
+        return later[0] if later else None
+
+    def _accept(self, tier: str, message: BaseMessage, started: float) -> Tuple[Optional[T], Optional[float]]:
+        """(value, cost of the call); value is None when the answer should be retried on the next tier"""
+        cost = self._cost(tier, message)
+        try:
+            value = self._parse(message)
+        except (ValidationError, ValueError) as e:
+            record_tier(self.agent, tier, "invalid", time.perf_counter() - started, cost)
+            if self._next(tier) is None:
+                raise OutputParserException(f"{self.schema.__name__} failed validation on the {tier} tier: {e}") from e
+            return None, cost
+        record_tier(self.agent, tier, "ok", time.perf_counter() - started, cost)
+        return value, cost
+
+    def _chain(self, tier: str, bind: dict):
+        return self.chains[tier].bind(**bind) if bind else self.chains[tier]
+
+    async def ainvoke(
+        self,
+        inputs: Any,
+        tier: str,
+        stage: str,
+        timeout: Optional[float] = None,
+        max_retries: int = 0,
+        usage: Optional[TokenUsage] = None,
+        **bind: Any
+    ) -> Routed[T]:
+        """Answer on `tier`, escalating on invalid output; timeouts and rate limits are retried on the same tier"""
+        started, total, first = time.perf_counter(), None, tier
+        while True:
+            chain = self._chain(tier, bind)
+            attempt = time.perf_counter()
+            try:
+                message = await call_with_retry(
+                    lambda: chain.ainvoke(inputs, config=run_config(stage)),
+                    timeout=timeout,
+                    max_retries=max_retries
+                )
+            except Exception:
+                record_tier(self.agent, tier, "error", time.perf_counter() - attempt, None)
+                raise
+            if usage is not None:
+                usage.add(message)
+            value, cost = self._accept(tier, message, attempt)
+            total = cost if total is None else total + (cost or 0.0)
+            if value is not None:
+                return Routed(value, tier, tier != first, time.perf_counter() - started, total)
+            tier = self._next(tier)
+
+    def invoke(self, inputs: Any, tier: str, stage: str, usage: Optional[TokenUsage] = None, **bind: Any) -> Routed[T]:
+        """Blocking variant of ainvoke (no timeout or retries)"""
+        started, total, first = time.perf_counter(), None, tier
+        while True:
+            attempt = time.perf_counter()
+            message = self._chain(tier, bind).invoke(inputs, config=run_config(stage))
+            if usage is not None:
+                usage.add(message)
+            value, cost = self._accept(tier, message, attempt)
+            total = cost if total is None else total + (cost or 0.0)
+            if value is not None:
+                return Routed(value, tier, tier != first, time.perf_counter() - started, total)
+            tier = self._next(tier)
@@ -0,0 +1,309 @@
+# Process-wide scheduling of OpenAI requests. Every async ChatOpenAI / OpenAIEmbeddings client built by
+# core.llm_backend shares one httpx client whose transport waits for a slot before each request: per model,
+# token buckets for requests and tokens per minute, the interactive lane ahead of the batch lane (with headroom
+# kept for it), clients served round-robin within a lane, and buckets re-synced from x-ratelimit-* headers.
+# The httpx side lives in core.scheduler_http so importing lanes and the middleware stays cheap.
+import asyncio
+import contextvars
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Mapping, Optional, Tuple
+
+from core.metrics import registry
+
+# Lanes in priority order
+LANES = ("interactive", "batch")
+
+# Requests and tokens per minute per model (OpenAI usage tier 1); headers from the API override them
+DEFAULT_LIMITS = {
+    "gpt-4o": (500, 30_000),
+    "gpt-4o-mini": (500, 200_000),
+    "text-embedding-3-small": (3_000, 1_000_000),
+}
+
+# Bucket depth in seconds of refill. OpenAI may enforce a per-minute limit over shorter windows,
+# so a full minute's burst after an idle spell would be answered with 429s.
+BURST_SECONDS = float(os.getenv("GTM_LLM_BURST_SECONDS", "10"))
+
+_lane: contextvars.ContextVar[Tuple[str, str]] = contextvars.ContextVar("gtm_llm_lane", default=("interactive", "default"))
+
+
+@contextmanager
+def llm_lane(lane: str, client: Optional[str] = None):
+    """Send LLM calls made inside the block through `lane`, queued fairly with other calls from `client`"""
+    if lane not in LANES:
+        raise ValueError(f"Unknown lane {lane!r}")
+    token = _lane.set((lane, client or _lane.get()[1]))
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane() -> Tuple[str, str]:
+    """(lane, client) for LLM calls made here"""
+    return _lane.get()
+
+
+def limits_from_env() -> Dict[str, Tuple[float, float]]:
+    """DEFAULT_LIMITS updated from GTM_LLM_LIMITS, e.g. "gpt-4o=500/30000,gpt-4o-mini=5000/2000000" """
+    limits = dict(DEFAULT_LIMITS)
+    for item in filter(None, os.getenv("GTM_LLM_LIMITS", "").split(",")):
+        model, _, value = item.partition("=")
+        rpm, _, tpm = value.partition("/")
+        limits[model.strip()] = (float(rpm), float(tpm))
+    return limits
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Seconds from a reset header ("1s", "6m0s", "250ms", "0.5")"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+class TokenBucket:
+    """Budget refilled at `per_minute` / 60 per second, holding at most `burst_seconds` worth"""
+
+    def __init__(self, per_minute: float, burst_seconds: float = BURST_SECONDS):
+        self.rate = per_minute / 60
+        self.burst_seconds = burst_seconds
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def capacity(self) -> float:
+        return self.rate * self.burst_seconds
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """Seconds until `amount` can be taken while leaving `reserve` untouched"""
+        self._refill(time.monotonic())
+        target = min(amount + reserve, self.capacity)
+        return 0.0 if self.level >= target else (target - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill(time.monotonic())
+        self.level -= amount
+
+    def sync(self, remaining: Optional[float], limit: Optional[float]):
+        """Adopt the server's per-minute limit and never believe we have more left than it says"""
+        self._refill(time.monotonic())
+        if limit:
+            self.rate = limit / 60
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+
+
+@dataclass
+class _Waiter:
+    tokens: float
+    lane: str
+    client: str
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.perf_counter)
+
+
+class _LoopLanes:
+    """Waiters and the dispatcher of one event loop (sync callers run each call in a fresh asyncio.run loop)"""
+
+    def __init__(self):
+        # lane -> client -> waiters; clients rotate within a lane
+        self.lanes: Dict[str, "OrderedDict[str, Deque[_Waiter]]"] = {lane: OrderedDict() for lane in LANES}
+        self.wakeup = asyncio.Event()
+        self.dispatcher: Optional[asyncio.Task] = None
+
+
+class ModelQueue:
+    """Buckets, lanes and the dispatcher for one model; the buckets are shared by every event loop"""
+
+    def __init__(self, model: str, requests_per_minute: float, tokens_per_minute: float, batch_share: float):
+        self.model = model
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        # Batch calls may only use this share of each bucket; the rest is kept for interactive calls
+        self.batch_share = batch_share
+        self.paused_until = 0.0
+        # Loops may run in different threads at once: the buckets are only touched under the lock
+        self._lock = threading.Lock()
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopLanes]" = weakref.WeakKeyDictionary()
+
+    def _loop_lanes(self) -> _LoopLanes:
+        """This event loop's lanes, with its dispatcher running"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            lanes = self._loops.get(loop)
+            if lanes is None:
+                lanes = self._loops[loop] = _LoopLanes()
+        if lanes.dispatcher is None or lanes.dispatcher.done():
+            lanes.dispatcher = loop.create_task(self._dispatch(lanes))
+        return lanes
+
+    async def acquire(self, tokens: float, lane: str, client: str) -> float:
+        """Wait for this model's turn and budget; returns seconds spent queued"""
+        lanes = self._loop_lanes()
+        waiter = _Waiter(tokens, lane, client, asyncio.get_running_loop().create_future())
+        lanes.lanes[lane].setdefault(client, deque()).append(waiter)
+        lanes.wakeup.set()
+        await waiter.future
+        return time.perf_counter() - waiter.enqueued
+
+    @staticmethod
+    def _head(lanes: _LoopLanes) -> Optional[_Waiter]:
+        """Oldest waiter of the next client in the highest non-empty lane (cancelled waiters are dropped)"""
+        for clients in lanes.lanes.values():
+            while clients:
+                client, waiters = next(iter(clients.items()))
+                while waiters and waiters[0].future.done():
+                    waiters.popleft()
+                if waiters:
+                    return waiters[0]
+                del clients[client]
+        return None
+
+    def _grant(self, lanes: _LoopLanes, waiter: _Waiter) -> bool:
+        """Take the waiter's budget and let it go, if the budget is there; False otherwise"""
+        with self._lock:
+            if self._delay(waiter) > 0:
+                return False
+            self.requests.take(1)
+            self.tokens.take(waiter.tokens)
+        clients = lanes.lanes[waiter.lane]
+        waiters = clients.pop(waiter.client)
+        waiters.popleft()
+        if waiters:
+            clients[waiter.client] = waiters  # back of the rotation
+        waiter.future.set_result(None)
+        return True
+
+    def _delay(self, waiter: _Waiter) -> float:
+        reserve = 0.0 if waiter.lane == LANES[0] else 1.0 - self.batch_share
+        return max(
+            self.paused_until - time.monotonic(),
+            self.requests.wait_time(1, reserve * self.requests.capacity),
+            self.tokens.wait_time(waiter.tokens, reserve * self.tokens.capacity)
+        )
+
+    async def _dispatch(self, lanes: _LoopLanes):
+        while True:
+            waiter = self._head(lanes)
+            if waiter is not None and self._grant(lanes, waiter):
+                continue
+            if waiter is None:
+                delay = None
+            else:
+                with self._lock:
+                    delay = self._delay(waiter)
+            # Sleep until the budget refills or something changes (new waiter, new headers)
+            lanes.wakeup.clear()
+            try:
+                await asyncio.wait_for(lanes.wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def observe_response(self, status: int, headers: Mapping[str, str]):
+        """Re-sync from x-ratelimit-* headers; a 429 pauses the model until the server says it resets"""
+        def number(name: str) -> Optional[float]:
+            try:
+                return float(headers[name])
+            except (KeyError, ValueError):
+                return None
+
+        with self._lock:
+            self.requests.sync(number("x-ratelimit-remaining-requests"), number("x-ratelimit-limit-requests"))
+            self.tokens.sync(number("x-ratelimit-remaining-tokens"), number("x-ratelimit-limit-tokens"))
+        if status == 429:
+            registry.inc("gtm_llm_rate_limited_total", (("model", self.model),))
+            retry_after = parse_reset(headers.get("retry-after-ms"))
+            retry_after = retry_after / 1000 if retry_after is not None else parse_reset(headers.get("retry-after"))
+            if retry_after is None:
+                retry_after = max(
+                    parse_reset(headers.get("x-ratelimit-reset-requests")) or 0,
+                    parse_reset(headers.get("x-ratelimit-reset-tokens")) or 0
+                ) or 1.0
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        # Called on the loop that made the request; other loops re-check when their current wait ends
+        lanes = self._loops.get(asyncio.get_running_loop())
+        if lanes is not None:
+            lanes.wakeup.set()
+
+
+class LLMScheduler:
+    """One ModelQueue per model, created on first use"""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        default_limits: Tuple[float, float] = (500, 200_000),
+        batch_share: float = 0.8
+    ):
+        self.limits = limits if limits is not None else dict(DEFAULT_LIMITS)
+        self.default_limits = default_limits
+        self.batch_share = batch_share
+        self._queues: Dict[str, ModelQueue] = {}
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        return cls(
+            limits=limits_from_env(),
+            default_limits=(float(os.getenv("GTM_LLM_RPM", "500")), float(os.getenv("GTM_LLM_TPM", "200000"))),
+            batch_share=float(os.getenv("GTM_LLM_BATCH_SHARE", "0.8"))
+        )
+
+    def queue(self, model: str) -> ModelQueue:
+        queue = self._queues.get(model)
+        if queue is None:
+            requests_per_minute, tokens_per_minute = self.limits.get(model, self.default_limits)
+            queue = self._queues[model] = ModelQueue(model, requests_per_minute, tokens_per_minute, self.batch_share)
+        return queue
+
+
+def scheduler_enabled() -> bool:
+    return os.getenv("GTM_LLM_SCHEDULER", "on").lower() != "off"
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def shared_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler.from_env()
+    return _scheduler
+
+
+class ClientMiddleware:
+    """ASGI middleware: requests are queued as the client in X-Client-Id, or their address"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        client = dict(scope.get("headers") or []).get(b"x-client-id", b"").decode("latin-1")
+        if not client and scope.get("client"):
+            client = scope["client"][0]
+        token = _lane.set((LANES[0], client or "default"))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _lane.reset(token)
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import threading
+import weakref
+from typing import Callable, Optional
+
+import httpx
+
+from core.metrics import observe
+from core.scheduler import LLMScheduler, current_lane, shared_scheduler
+
+# Tokens counted for a completion whose request sets no max_tokens
+DEFAULT_OUTPUT_TOKENS = 500
+
+
+def _estimate(body: dict) -> float:
+    """Tokens OpenAI counts against the limit at request time: input (~4 chars per token) plus max output"""
+    if "messages" in body:
+        text = sum(len(str(message.get("content") or "")) for message in body["messages"])
+        output = body.get("max_completion_tokens") or body.get("max_tokens") or DEFAULT_OUTPUT_TOKENS
+        return text / 4 + output
+    inputs = body.get("input", [])
+    inputs = inputs if isinstance(inputs, list) else [inputs]
+    # Embedding inputs are either strings or already-tokenized id lists
+    return sum(len(item) if isinstance(item, list) else len(str(item)) / 4 for item in inputs)
+
+
+class LoopLocalTransport(httpx.AsyncBaseTransport):
+    """One transport (connection pool) per event loop: pooled connections only work on the loop that opened them,
+    and sync callers run each call in a fresh asyncio.run loop"""
+
+    def __init__(self, factory: Callable[[], httpx.AsyncBaseTransport]):
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncBaseTransport]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _transport(self) -> httpx.AsyncBaseTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = self._transports[loop] = self.factory()
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self):
+        with self._lock:
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+class ScheduledTransport(httpx.AsyncBaseTransport):
+    """httpx transport that queues each OpenAI request with the scheduler and feeds it the response headers"""
+
+    def __init__(self, scheduler: LLMScheduler, wrapped: Optional[httpx.AsyncBaseTransport] = None):
+        self.scheduler = scheduler
+        self.wrapped = wrapped or LoopLocalTransport(lambda: httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=1000, max_keepalive_connections=100)
+        ))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            body = json.loads(request.content)
+            model = body["model"]
+        except (ValueError, KeyError, TypeError, httpx.RequestNotRead):
+            return await self.wrapped.handle_async_request(request)
+
+        lane, client = current_lane()
+        queue = self.scheduler.queue(model)
+        observe("queue", lane, await queue.acquire(_estimate(body), lane, client))
+        response = await self.wrapped.handle_async_request(request)
+        queue.observe_response(response.status_code, response.headers)
+        return response
+
+    async def aclose(self):
+        await self.wrapped.aclose()
+
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def scheduled_http_client() -> httpx.AsyncClient:
+    """Async httpx client shared by every OpenAI client in the process, on any event loop (see LoopLocalTransport)"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            transport=ScheduledTransport(shared_scheduler()),
+            timeout=httpx.Timeout(600, connect=5.0)
+        )
+    return _http_client
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+
+from core.metrics import record_cache
+
+
+class SemanticCache:
+    """Answers keyed by question embedding, matched by cosine similarity.
+
+    Entries live in a fixed-size ring so lookups are one matrix-vector
+    product. Bumping the generation (e.g. when the knowledge base changes)
+    drops everything, including answers still being computed against the
+    old knowledge base.
+    """
+
+    def __init__(self, threshold: float = 0.92, max_entries: int = 512, ttl: Optional[float] = 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._vectors = None
+        self._payloads: List[Any] = [None] * self.max_entries
+        self._stored_at = np.zeros(self.max_entries)
+        self._size = 0
+        self._next = 0
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def lookup(self, vector: List[float]) -> Optional[Any]:
+        """Return the payload of the most similar live entry above the threshold"""
+        query = self._normalize(vector)
+        with self._lock:
+            if self._size:
+                scores = self._vectors[:self._size] @ query
+                if self.ttl is not None:
+                    scores[self._stored_at[:self._size] < time.time() - self.ttl] = -1.0
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.hits += 1
+                    record_cache("semantic_answers", True)
+                    return self._payloads[best]
+            self.misses += 1
+            record_cache("semantic_answers", False)
+            return None
+
+    def store(self, vector: List[float], payload: Any, generation: Optional[int] = None):
+        """Remember a payload; skipped if the cache was invalidated since `generation` was read"""
+        array = self._normalize(vector)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, array.shape[0]), dtype=np.float32)
+            slot = self._next
+            self._vectors[slot] = array
+            self._payloads[slot] = payload
+            self._stored_at[slot] = time.time()
+            self._next = (slot + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._reset()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "threshold": self.threshold
+        }
+
+
+def semantic_cache_from_env(prefix: str) -> Optional[SemanticCache]:
+    """Build a SemanticCache from <PREFIX>_SEMANTIC_CACHE (on|off), _THRESHOLD, _MAX_ENTRIES and _TTL"""
+    if os.getenv(f"{prefix}_SEMANTIC_CACHE", "on").lower() == "off":
+        return None
+    return SemanticCache(
+        threshold=float(os.getenv(f"{prefix}_SEMANTIC_CACHE_THRESHOLD", "0.92")),
+        max_entries=int(os.getenv(f"{prefix}_SEMANTIC_CACHE_MAX_ENTRIES", "512")),
+        ttl=float(os.getenv(f"{prefix}_SEMANTIC_CACHE_TTL", "3600"))
+    )
@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import List, Optional, Tuple
+
+
+class ConversationSession:
+    """Bounded conversation history: the last `max_turns` turns, capped at `max_chars` in total"""
+
+    def __init__(self, session_id: str, max_turns: int, max_chars: int):
+        self.session_id = session_id
+        self.max_chars = max_chars
+        self.turns = deque(maxlen=max_turns)
+        self.last_used = time.monotonic()
+
+    def add_turn(self, question: str, answer: str):
+        # A single turn may never take more than the whole budget
+        half = self.max_chars // 2
+        self.turns.append((question[:half], answer[:self.max_chars - min(len(question), half)]))
+        while len(self.turns) > 1 and sum(len(q) + len(a) for q, a in self.turns) > self.max_chars:
+            self.turns.popleft()
+
+    def history(self) -> List[Tuple[str, str]]:
+        return list(self.turns)
+
+
+class SessionStore:
+    """Conversation sessions keyed by id, evicted after `idle_ttl` seconds or beyond `max_sessions`"""
+
+    def __init__(self, max_turns: int = 6, max_chars: int = 8000, idle_ttl: float = 1800, max_sessions: int = 10_000):
+        self.max_turns = max_turns
+        self.max_chars = max_chars
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: Optional[str] = None) -> ConversationSession:
+        """Return the session for `session_id`, starting a new one if it is unknown or missing"""
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now)
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None:
+                session = ConversationSession(session_id or uuid.uuid4().hex, self.max_turns, self.max_chars)
+                self._sessions[session.session_id] = session
+            session.last_used = now
+            # Least recently used sessions stay at the front
+            self._sessions.move_to_end(session.session_id)
+            return session
+
+    def reset(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _evict(self, now: float):
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.idle_ttl and len(self._sessions) < self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+def session_store_from_env(prefix: str) -> SessionStore:
+    """Build a SessionStore from <PREFIX>_SESSION_MAX_TURNS, _MAX_CHARS, _IDLE_TTL and _MAX_SESSIONS"""
+    return SessionStore(
+        max_turns=int(os.getenv(f"{prefix}_SESSION_MAX_TURNS", "6")),
+        max_chars=int(os.getenv(f"{prefix}_SESSION_MAX_CHARS", "8000")),
+        idle_ttl=float(os.getenv(f"{prefix}_SESSION_IDLE_TTL", "1800")),
+        max_sessions=int(os.getenv(f"{prefix}_SESSION_MAX_SESSIONS", "10000"))
+    )
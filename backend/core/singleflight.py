@@ -0,0 +1,67 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Tuple, TypeVar
+
+from core.metrics import registry
+
+R = TypeVar("R")
+
+
+def normalize_text(text: str) -> str:
+    """Whitespace-collapsed text for coalescing keys"""
+    return " ".join(str(text).split())
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one in-flight call; its result or error goes to every caller.
+
+    The shared call runs as its own task, so a caller that is cancelled (a
+    client disconnect, a timeout) only stops waiting; the call is cancelled
+    once nobody is waiting for it. Keys are dropped as soon as the call
+    finishes, so this never serves stale results.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.coalesced = 0
+        # key -> (task, callers still waiting)
+        self._flights: Dict[str, Tuple[asyncio.Task, int]] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[R]]) -> R:
+        flight = self._flights.get(key)
+        if flight is None or flight[0].get_loop() is not asyncio.get_running_loop():
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self._flights[key] = (task, 1)
+        else:
+            self.coalesced += 1
+            registry.inc("gtm_coalesced_requests_total", (("agent", self.name),))
+            task = flight[0]
+            self._flights[key] = (task, flight[1] + 1)
+
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done():
+                self._leave(key, task)
+            raise
+
+    def _leave(self, key: str, task: asyncio.Task):
+        flight = self._flights.get(key)
+        if flight is None or flight[0] is not task:
+            return
+        if flight[1] <= 1:
+            task.cancel()
+        else:
+            self._flights[key] = (task, flight[1] - 1)
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self._flights.get(key, (None,))[0] is task:
+            del self._flights[key]
+        # Nobody may be left to retrieve the error
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._flights)}
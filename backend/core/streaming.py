@@ -0,0 +1,15 @@
+import json
+
+
+def ndjson_line(event: str, data: dict) -> str:
+    """One NDJSON record, tagged with its type"""
+    return json.dumps({"type": event, **data}) + "\n"
+
+
+def sse_event(event: str, data: dict) -> str:
+    """One Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Stop proxies (nginx, Railway's edge) from buffering streamed bodies
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
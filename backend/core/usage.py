@@ -0,0 +1,36 @@
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+
+@dataclass
+class TokenUsage:
+    """Token totals accumulated from LangChain messages' usage_metadata"""
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+
+    def add(self, message):
+        usage = getattr(message, "usage_metadata", None) or {}
+        self.calls += 1
+        self.input_tokens += usage.get("input_tokens", 0)
+        self.output_tokens += usage.get("output_tokens", 0)
+        self.cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+
+    def cost(self, model: str) -> Optional[float]:
+        """Estimated USD cost at list prices, or None for an unknown model"""
+        prices = MODEL_PRICES.get(model)
+        if prices is None:
+            return None
+        input_price, cached_price, output_price = prices
+        uncached = self.input_tokens - self.cached_tokens
+        return (uncached * input_price + self.cached_tokens * cached_price + self.output_tokens * output_price) / 1e6
+
+    def as_dict(self) -> dict:
+        return asdict(self)
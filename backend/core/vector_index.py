@@ -0,0 +1,693 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Collection, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from core.executor import run_blocking
+from core.facets import FACET_FIELDS, MetadataFilters, metadata_matcher
+
+INDEX_DTYPES = ("float32", "int8")
+
+# Rows scored per matrix product; bounds the temporary score buffers
+BLOCK_ROWS = 8192
+
+# int8 rows converted to float32 at a time, into one reused cache-sized buffer
+DEQUANTIZE_ROWS = 1024
+
+# Names the published generation directory; replaced atomically when a new one is built
+CURRENT_FILE = "CURRENT"
+
+# flock()ed by the one process at a time that writes Chroma and publishes generations
+LOCK_FILE = "write.lock"
+
+# (chunk id, text, metadata)
+Chunk = Tuple[str, str, dict]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def where_filters(where: Optional[dict]) -> Optional[MetadataFilters]:
+    """MetadataFilters from a Chroma `where` clause as built by facets.chroma_where (equality, $eq, $in, $and)"""
+    if not where:
+        return None
+    filters = {}
+    for clause in where["$and"] if "$and" in where else [where]:
+        (field, condition), = clause.items()
+        if isinstance(condition, dict):
+            (operator, condition), = condition.items()
+            if operator not in ("$eq", "$in"):
+                raise ValueError(f"Unsupported filter operator {operator}")
+        filters[field] = condition
+    return filters
+
+
+def current_generation(directory: str) -> Optional[int]:
+    """Generation number of the published index in `directory`, or None if nothing was published"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return int(f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def _generation_path(directory: str, generation: int) -> str:
+    return os.path.join(directory, f"gen-{generation:06d}")
+
+
+def _read_manifest(path: str) -> dict:
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    # Generations written before segments held all of their rows themselves
+    manifest.setdefault("rows", manifest["count"])
+    manifest.setdefault("segments", [manifest["generation"]])
+    manifest.setdefault("parts", [[manifest["generation"], manifest["count"]]])
+    return manifest
+
+
+class WriterLock:
+    """Exclusive across threads and processes: serializes the writers of one index directory.
+
+    Held from the Chroma write through publishing the generation that
+    snapshots it, so workers sharing the directory take turns and each
+    generation number is allocated once. The OS drops the lock if its
+    holder dies.
+    """
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, LOCK_FILE)
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def acquire(self):
+        import fcntl  # POSIX only; imported here so the module still loads elsewhere
+        self._thread_lock.acquire()
+        f = None
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            f = open(self.path, "a")
+            fcntl.flock(f, fcntl.LOCK_EX)
+        except BaseException:
+            if f is not None:
+                f.close()
+            self._thread_lock.release()
+            raise
+        self._file = f
+
+    def release(self):
+        import fcntl
+        f, self._file = self._file, None
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+        self._thread_lock.release()
+
+    def __enter__(self) -> "WriterLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class IndexWriter:
+    """Writes a new index generation batch by batch; readers only see it once close() publishes it.
+
+    Each generation has a directory of vectors.npy (unit-length rows, float32
+    or int8 with per-row scales in scales.npy), one int32 code column per facet
+    and chunks.sqlite with ids, texts and metadata by row position. A
+    generation's rows are its `segments`, earlier generations' directories
+    followed by its own, so publishing new chunks only writes those. Its
+    directory may also take over rows copied from earlier segments (`parts`,
+    the (generation, rows) they were first published in), which readers use to
+    tell rows they have seen from new ones. Directories are never modified
+    after publishing, so readers can map them without locks. Writers sharing a
+    directory must hold its WriterLock.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        count: int,
+        dim: int,
+        dtype: str = "float32",
+        source: Optional[str] = None,
+        segments: Sequence[Tuple[int, int]] = (),
+        parts: Sequence[Tuple[int, int]] = ()
+    ):
+        if dtype not in INDEX_DTYPES:
+            raise ValueError(f"dtype must be one of {INDEX_DTYPES}, not {dtype}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.count, self.dim, self.dtype, self.source = count, dim, dtype, source
+        # (generation, rows) of the earlier segments kept as they are, and of the rows copied first
+        self.segments, self.parts = list(segments), list(parts)
+        self.path = os.path.join(directory, f"building-{uuid.uuid4().hex}")
+        os.makedirs(self.path)
+        self.written = 0
+
+        self.vectors = self.scales = None
+        self.facets: Dict[str, np.ndarray] = {}
+        if count:
+            self.vectors = np.lib.format.open_memmap(self._file("vectors.npy"), mode="w+", dtype=dtype, shape=(count, dim))
+            if dtype == "int8":
+                self.scales = np.lib.format.open_memmap(self._file("scales.npy"), mode="w+", dtype=np.float32, shape=(count,))
+            self.facets = {
+                field: np.lib.format.open_memmap(self._file(f"facet_{field}.npy"), mode="w+", dtype=np.int32, shape=(count,))
+                for field in FACET_FIELDS
+            }
+        self.facet_values: Dict[str, Dict[Any, int]] = {field: {} for field in FACET_FIELDS}
+        self.db = sqlite3.connect(self._file("chunks.sqlite"))
+        self.db.execute("CREATE TABLE chunks (position INTEGER PRIMARY KEY, id TEXT NOT NULL, document TEXT, metadata TEXT)")
+        self.db.execute("CREATE INDEX chunks_id ON chunks (id)")
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Optional[dict]], vectors: Any):
+        start, end = self.written, self.written + len(ids)
+        if end > self.count:
+            raise ValueError(f"Index was sized for {self.count} chunks")
+        block = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim))
+        if self.dtype == "int8":
+            # Symmetric per-row quantization: row ~= int8 row * scale
+            scales = np.abs(block).max(axis=1) / 127
+            self.vectors[start:end] = np.rint(block / np.where(scales == 0, 1, scales)[:, None]).astype(np.int8)
+            self.scales[start:end] = scales
+        elif end > start:
+            self.vectors[start:end] = block
+
+        metadatas = [metadata or {} for metadata in metadatas]
+        for field, column in self.facets.items():
+            codes = self.facet_values[field]
+            column[start:end] = [
+                codes.setdefault(metadata[field], len(codes)) if metadata.get(field) is not None else -1
+                for metadata in metadatas
+            ]
+        self.db.executemany(
+            "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+            [(start + i, chunk_id, text, json.dumps(metadata))
+             for i, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas))]
+        )
+        self.written = end
+
+    def close(self) -> dict:
+        """Flush, publish as the next generation and return its manifest"""
+        if self.written != self.count:
+            raise ValueError(f"Wrote {self.written} of {self.count} chunks")
+        for array in [self.vectors, self.scales, *self.facets.values()]:
+            if array is not None:
+                array.flush()
+        self.vectors = self.scales = None
+        self.facets = {}
+        self.db.commit()
+        self.db.close()
+
+        generation = (current_generation(self.directory) or 0) + 1
+        new_rows = self.count - sum(rows for _, rows in self.parts)
+        manifest = {
+            "generation": generation,
+            "count": sum(rows for _, rows in self.segments) + self.count,
+            "rows": self.count,
+            "segments": [segment for segment, _ in self.segments] + [generation],
+            "parts": [list(part) for part in self.parts] + ([[generation, new_rows]] if new_rows or not self.parts else []),
+            "dim": self.dim,
+            "dtype": self.dtype,
+            "facets": {field: list(codes) for field, codes in self.facet_values.items()},
+            "source": self.source,
+            "built_at": time.time()
+        }
+        with open(self._file("manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        os.rename(self.path, _generation_path(self.directory, generation))
+
+        pointer = os.path.join(self.directory, f"{CURRENT_FILE}.{uuid.uuid4().hex}")
+        with open(pointer, "w") as f:
+            f.write(str(generation))
+        os.replace(pointer, os.path.join(self.directory, CURRENT_FILE))
+
+        # Readers still mapping an older generation keep their open files; on disk only the segments of
+        # this generation and the previous one are kept
+        keep = set(manifest["segments"])
+        try:
+            keep.update(_read_manifest(_generation_path(self.directory, generation - 1))["segments"])
+        except FileNotFoundError:
+            pass
+        for name in os.listdir(self.directory):
+            if name.startswith("gen-") and int(name[4:]) not in keep:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        return manifest
+
+    def abort(self):
+        self.db.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class IndexSegment:
+    """The rows one generation's directory holds, memory-mapped: vectors, facet columns and chunks by row position"""
+
+    def __init__(self, path: str):
+        self.path = path
+        manifest = _read_manifest(path)
+        self.generation = manifest["generation"]
+        self.rows, self.dim, self.dtype = manifest["rows"], manifest["dim"], manifest["dtype"]
+        self.parts: List[Tuple[int, int]] = [(generation, rows) for generation, rows in manifest["parts"]]
+        self.facet_codes = {field: {value: code for code, value in enumerate(values)}
+                            for field, values in manifest["facets"].items()}
+        if self.rows:
+            self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+            self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r") if self.dtype == "int8" else None
+            self.facets = {field: np.load(os.path.join(path, f"facet_{field}.npy"), mmap_mode="r")
+                           for field in self.facet_codes}
+        else:
+            self.vectors, self.scales, self.facets = np.empty((0, self.dim), dtype=self.dtype), None, {}
+        # Published directories never change, so SQLite can skip locking entirely
+        self._db = sqlite3.connect(f"file:{os.path.join(path, 'chunks.sqlite')}?mode=ro&immutable=1",
+                                   uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def mask(self, filters: MetadataFilters) -> np.ndarray:
+        mask = np.ones(self.rows, dtype=bool)
+        for field, value in filters.items():
+            if field not in self.facet_codes:
+                raise ValueError(f"Can only filter on {list(self.facet_codes)}, not {field}")
+            if not self.rows:
+                break
+            codes = self.facet_codes[field]
+            wanted = [codes[v] for v in (value if isinstance(value, list) else [value]) if v in codes]
+            mask &= np.isin(self.facets[field], wanted)
+        return mask
+
+    def _blocks(self, mask: Optional[np.ndarray]) -> Iterator[Tuple[np.ndarray, Any]]:
+        """(positions, selector) per block of rows to score; filtered searches only read matching rows"""
+        if mask is None:
+            for start in range(0, self.rows, BLOCK_ROWS):
+                end = min(start + BLOCK_ROWS, self.rows)
+                yield np.arange(start, end), slice(start, end)
+            return
+        positions = np.flatnonzero(mask)
+        for start in range(0, len(positions), BLOCK_ROWS):
+            block = positions[start:start + BLOCK_ROWS]
+            yield block, block
+
+    def scores(self, queries: np.ndarray, mask: Optional[np.ndarray] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """(positions, cosine scores) per block of rows, for unit-length query rows"""
+        buffer = np.empty((DEQUANTIZE_ROWS, self.dim), dtype=np.float32) if self.dtype == "int8" else None
+        for positions, selector in self._blocks(mask):
+            if self.dtype == "int8":
+                rows = self.vectors[selector]
+                scores = np.empty((len(queries), len(rows)), dtype=np.float32)
+                for start in range(0, len(rows), DEQUANTIZE_ROWS):
+                    part = rows[start:start + DEQUANTIZE_ROWS]
+                    converted = buffer[:len(part)]
+                    np.copyto(converted, part, casting="unsafe")
+                    scores[:, start:start + len(part)] = queries @ converted.T
+                scores *= self.scales[selector]
+            else:
+                scores = queries @ self.vectors[selector].T
+            yield positions, scores
+
+    def float_vectors(self, start: int, end: int) -> np.ndarray:
+        """Rows start:end as float32 (dequantized for int8)"""
+        if self.dtype == "int8":
+            return self.vectors[start:end].astype(np.float32) * self.scales[start:end, None]
+        return np.asarray(self.vectors[start:end], dtype=np.float32)
+
+    def chunks(self, positions: Sequence[int]) -> Dict[int, Chunk]:
+        """(id, text, metadata) by row position"""
+        positions = [int(p) for p in positions]
+        if not positions:
+            return {}
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT position, id, document, metadata FROM chunks WHERE position IN ({','.join('?' * len(positions))})",
+                positions
+            ).fetchall()
+        return {position: (chunk_id, document or "", json.loads(metadata)) for position, chunk_id, document, metadata in rows}
+
+    def contains(self, ids: Sequence[str]) -> set:
+        """The given chunk ids that are in this segment"""
+        found = set()
+        ids = list(ids)
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            with self._lock:
+                rows = self._db.execute(f"SELECT id FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch).fetchall()
+            found.update(row[0] for row in rows)
+        return found
+
+    def iter_chunks(self, start: int = 0, end: Optional[int] = None,
+                    batch_size: int = 10000) -> Iterator[Tuple[List[str], List[str], List[dict]]]:
+        """Chunks in rows start:end in order, as (ids, texts, metadatas) batches"""
+        end = self.rows if end is None else end
+        for offset in range(start, end, batch_size):
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, document, metadata FROM chunks WHERE position >= ? AND position < ? ORDER BY position",
+                    (offset, min(offset + batch_size, end))
+                ).fetchall()
+            yield [row[0] for row in rows], [row[1] or "" for row in rows], [json.loads(row[2]) for row in rows]
+
+    def close(self):
+        self._db.close()
+
+
+class MmapVectorIndex:
+    """Read-only view of a published index generation: its segments' rows, one after the other.
+
+    Vectors and facet columns are memory-mapped, so every process serving
+    the same generation shares one copy through the OS page cache; search is
+    a blocked matrix product over the mapped rows.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.manifest = _read_manifest(path)
+        self.generation = self.manifest["generation"]
+        self.count, self.dim, self.dtype = self.manifest["count"], self.manifest["dim"], self.manifest["dtype"]
+        directory = os.path.dirname(path)
+        self.segments = [IndexSegment(path if generation == self.generation else _generation_path(directory, generation))
+                         for generation in self.manifest["segments"]]
+        # Row position in the generation where each segment starts
+        self.offsets = np.cumsum([0] + [segment.rows for segment in self.segments])
+
+    @classmethod
+    def open(cls, directory: str) -> "MmapVectorIndex":
+        """Open the generation currently published in `directory`"""
+        generation = current_generation(directory)
+        if generation is None:
+            raise FileNotFoundError(f"No vector index published in {directory}")
+        try:
+            return cls(_generation_path(directory, generation))
+        except FileNotFoundError:
+            # Pruned by a writer that published twice since CURRENT was read
+            return cls(_generation_path(directory, current_generation(directory)))
+
+    @property
+    def covered(self) -> set:
+        """Generations whose published chunks this one holds"""
+        return {generation for segment in self.segments for generation, _ in segment.parts}
+
+    def mask(self, filters: Optional[MetadataFilters]) -> Optional[np.ndarray]:
+        """Rows whose facet values match the filters, or None for no filtering"""
+        if not filters:
+            return None
+        return np.concatenate([segment.mask(filters) for segment in self.segments])
+
+    def search(self, queries: Any, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (positions, cosine scores) per query row, best first; fewer than k are padded with -1 / -inf"""
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        best_positions = np.full((len(queries), 0), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        for segment, offset in zip(self.segments, self.offsets):
+            segment_mask = None if mask is None else mask[offset:offset + segment.rows]
+            for positions, scores in segment.scores(queries, segment_mask):
+                best_scores = np.concatenate([best_scores, scores], axis=1)
+                best_positions = np.concatenate([best_positions, np.broadcast_to(positions + offset, scores.shape)], axis=1)
+                if best_scores.shape[1] > k:
+                    keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                    best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                    best_positions = np.take_along_axis(best_positions, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best_scores, best_positions = np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_positions, order, axis=1)
+        if best_scores.shape[1] < k:
+            padding = k - best_scores.shape[1]
+            best_scores = np.pad(best_scores, ((0, 0), (0, padding)), constant_values=-np.inf)
+            best_positions = np.pad(best_positions, ((0, 0), (0, padding)), constant_values=-1)
+        return best_positions, best_scores
+
+    def chunks(self, positions: Sequence[int]) -> Dict[int, Chunk]:
+        """(id, text, metadata) by row position"""
+        by_segment: Dict[int, List[int]] = {}
+        for position in positions:
+            by_segment.setdefault(int(np.searchsorted(self.offsets, position, side="right")) - 1, []).append(int(position))
+        found = {}
+        for i, wanted in by_segment.items():
+            offset = int(self.offsets[i])
+            found.update({position + offset: chunk
+                          for position, chunk in self.segments[i].chunks([p - offset for p in wanted]).items()})
+        return found
+
+    def contains(self, ids: Sequence[str]) -> set:
+        """The given chunk ids that are in this generation"""
+        found = set()
+        for segment in self.segments:
+            found |= segment.contains([chunk_id for chunk_id in ids if chunk_id not in found])
+        return found
+
+    def iter_chunks(self, batch_size: int = 10000, skip: Collection[int] = ()) -> Iterator[Tuple[List[str], List[str], List[dict]]]:
+        """Every chunk in row order, as (ids, texts, metadatas) batches; except those first published in `skip` generations"""
+        for segment in self.segments:
+            start = 0
+            for generation, rows in segment.parts:
+                if generation not in skip:
+                    yield from segment.iter_chunks(start, start + rows, batch_size)
+                start += rows
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+
+class MmapVectorStore(VectorStore):
+    """LangChain vector store over an MmapVectorIndex (scores are cosine similarity, higher is closer).
+
+    Chunks written after the index was built are kept in memory and
+    searched alongside it until the next build.
+    """
+
+    def __init__(self, index: MmapVectorIndex, embedding: Embeddings):
+        self.index = index
+        self._embedding = embedding
+        self._lock = threading.Lock()
+        self._added_vectors = np.empty((0, index.dim), dtype=np.float32)
+        self._added: List[Chunk] = []
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def count(self) -> int:
+        return self.index.count + len(self._added)
+
+    def add_vectors(self, ids: List[str], texts: List[str], metadatas: List[Optional[dict]], vectors: Any):
+        """Make chunks written since the index was built searchable in this process"""
+        block = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+        with self._lock:
+            added = self._added_vectors if len(self._added) else self._added_vectors.reshape(0, block.shape[1])
+            self._added_vectors = np.vstack([added, block])
+            self._added = self._added + [(i, t, m or {}) for i, t, m in zip(ids, texts, metadatas)]
+
+    def pending(self) -> Tuple[List[str], List[str], List[dict], np.ndarray]:
+        """(ids, texts, metadatas, unit-length vectors) of the chunks added since the index was built"""
+        with self._lock:
+            added, vectors = self._added, self._added_vectors
+        return [chunk[0] for chunk in added], [chunk[1] for chunk in added], [chunk[2] for chunk in added], vectors
+
+    def use_index(self, index: MmapVectorIndex):
+        """Switch to a newer generation, keeping only the added chunks it does not hold yet"""
+        with self._lock:
+            added, added_vectors = self._added, self._added_vectors
+        present = index.contains([chunk_id for chunk_id, _, _ in added])
+        keep = [i for i, (chunk_id, _, _) in enumerate(added) if chunk_id not in present]
+        with self._lock:
+            # Chunks added while the new generation was being opened are kept too
+            later = self._added[len(added):]
+            later_vectors = self._added_vectors[len(added):]
+            self.index = index
+            self._added = [added[i] for i in keep] + later
+            parts = ([added_vectors[keep]] if keep else []) + ([later_vectors] if later else [])
+            self._added_vectors = np.vstack(parts) if parts else np.empty((0, index.dim), dtype=np.float32)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "mmap",
+            "generation": self.index.generation,
+            "segments": len(self.index.segments),
+            "dtype": self.index.dtype,
+            "indexed_chunks": self.index.count,
+            "pending_chunks": len(self._added)
+        }
+
+    def add_texts(self, texts, metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs) -> List[str]:
+        texts = list(texts)
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        self.add_vectors(ids, texts, metadatas or [{}] * len(texts), self._embedding.embed_documents(texts))
+        return ids
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts,
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        directory: Optional[str] = None,
+        dtype: str = "float32",
+        **kwargs
+    ) -> "MmapVectorStore":
+        """Embed texts and publish them as a new generation in `directory` (a fresh temporary directory if omitted)"""
+        texts = list(texts)
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        metadatas = metadatas or [{}] * len(texts)
+        vectors = np.asarray(embedding.embed_documents(texts), dtype=np.float32) if texts else None
+        directory = directory or tempfile.mkdtemp(prefix="vector_index-")
+        with WriterLock(directory):
+            writer = IndexWriter(directory, len(texts), vectors.shape[1] if texts else 0, dtype, source="from_texts")
+            try:
+                if texts:
+                    writer.add(ids, texts, metadatas, vectors)
+                writer.close()
+            except BaseException:
+                writer.abort()
+                raise
+        return cls(MmapVectorIndex.open(directory), embedding)
+
+    def search_by_vectors(self, vectors: Any, k: int = 4, filter: Optional[dict] = None) -> List[List[Tuple[Document, float]]]:
+        """Batched top-k: one best-first (document, score) list per query vector"""
+        filters = where_filters(filter)
+        queries = _normalize(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+        positions, scores = self.index.search(queries, k, self.index.mask(filters))
+        chunks = self.index.chunks(sorted({int(p) for p in positions[np.isfinite(scores)]}))
+        with self._lock:
+            added, added_vectors = self._added, self._added_vectors
+        matches = metadata_matcher(filters)
+        wanted = [i for i, (_, _, metadata) in enumerate(added) if matches is None or matches(metadata)]
+        added_scores = queries @ added_vectors[wanted].T if wanted else None
+
+        results = []
+        for row in range(len(queries)):
+            hits = [(float(score), chunks[int(position)]) for position, score in zip(positions[row], scores[row])
+                    if np.isfinite(score)]
+            if added_scores is not None:
+                hits += [(float(score), added[i]) for i, score in zip(wanted, added_scores[row])]
+            hits.sort(key=lambda hit: hit[0], reverse=True)
+            results.append([(Document(page_content=text, metadata=metadata), score) for score, (_, text, metadata) in hits[:k]])
+        return results
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.search_by_vectors([embedding], k, filter)[0]]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs) -> List[Tuple[Document, float]]:
+        return self.search_by_vectors([self._embedding.embed_query(query)], k, filter)[0]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    async def asimilarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs) -> List[Document]:
+        vector = await self._embedding.aembed_query(query)
+        return await run_blocking(self.similarity_search_by_vector, vector, k, filter)
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1) / 2
+
+
+def build_index(collection, directory: str, dtype: str = "float32", batch_size: int = 5000) -> dict:
+    """Snapshot a Chroma collection (ids, texts, metadata, embeddings) into a new published generation"""
+    count = collection.count()
+    writer = None
+    try:
+        for offset in range(0, count, batch_size):
+            batch = collection.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+            vectors = np.asarray(batch["embeddings"], dtype=np.float32)
+            if writer is None:
+                writer = IndexWriter(directory, count, vectors.shape[1], dtype, source=collection.name)
+            writer.add(batch["ids"], batch["documents"], batch["metadatas"], vectors)
+        if writer is None:
+            writer = IndexWriter(directory, 0, 0, dtype, source=collection.name)
+        return writer.close()
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+
+
+def append_index(
+    directory: str,
+    ids: List[str],
+    texts: List[str],
+    metadatas: List[Optional[dict]],
+    vectors: Any,
+    dtype: str = "float32",
+    source: Optional[str] = None
+) -> dict:
+    """Publish chunks as the next generation: the current one plus a segment holding only them.
+
+    The newest segments are merged into the new one while each is at most
+    twice the rows merged so far, so segments shrink geometrically from the
+    oldest: a generation has O(log n) of them and a row is rewritten O(log n)
+    times. The caller holds the directory's WriterLock.
+    """
+    base = MmapVectorIndex.open(directory)
+    try:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        segments = [segment for segment in base.segments if segment.rows]
+        keep, merged_rows = len(segments), len(ids)
+        while keep and segments[keep - 1].rows <= 2 * merged_rows:
+            keep -= 1
+            merged_rows += segments[keep].rows
+        dims = {segment.dim for segment in segments} | ({vectors.shape[1]} if len(ids) else set())
+        if len(dims) > 1:
+            raise ValueError(f"Embedding dimensions {sorted(dims)} differ: rebuild the index with build_index")
+        merged = segments[keep:]
+        writer = IndexWriter(
+            directory, merged_rows, dims.pop() if dims else 0, dtype, source=source,
+            segments=[(segment.generation, segment.rows) for segment in segments[:keep]],
+            parts=[part for segment in merged for part in segment.parts]
+        )
+        try:
+            for segment in merged:
+                start = 0
+                for batch_ids, batch_texts, batch_metadatas in segment.iter_chunks(batch_size=BLOCK_ROWS):
+                    end = start + len(batch_ids)
+                    writer.add(batch_ids, batch_texts, batch_metadatas, segment.float_vectors(start, end))
+                    start = end
+            if len(ids):
+                writer.add(ids, texts, metadatas, vectors)
+            return writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+    finally:
+        base.close()
+
+
+def vector_index_from_env(prefix: str) -> Optional[Tuple[str, str]]:
+    """(directory, dtype) from <PREFIX>_VECTOR_STORE=mmap, _VECTOR_INDEX_DIR and _VECTOR_INDEX_DTYPE; None keeps Chroma"""
+    if os.getenv(f"{prefix}_VECTOR_STORE", "chroma").lower() != "mmap":
+        return None
+    return (
+        os.getenv(f"{prefix}_VECTOR_INDEX_DIR", "./vector_index"),
+        os.getenv(f"{prefix}_VECTOR_INDEX_DTYPE", "float32")
+    )
+
+
+if __name__ == "__main__":
+    # Build from backend/:  python -m core.vector_index --dtype int8
+    from langchain_community.vectorstores import Chroma
+
+    parser = argparse.ArgumentParser(description="Build a memory-mapped vector index from a Chroma collection")
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--collection", default=Chroma._LANGCHAIN_DEFAULT_COLLECTION_NAME)
+    parser.add_argument("--out", default=os.getenv("ASKGTM_VECTOR_INDEX_DIR", "./vector_index"))
+    parser.add_argument("--dtype", choices=INDEX_DTYPES, default=os.getenv("ASKGTM_VECTOR_INDEX_DTYPE", "float32"))
+    args = parser.parse_args()
+    started = time.perf_counter()
+    # Running workers may be writing: take turns with them
+    with WriterLock(args.out):
+        collection = Chroma(collection_name=args.collection, persist_directory=args.persist_directory)._collection
+        manifest = build_index(collection, args.out, args.dtype)
+    print(f"generation {manifest['generation']}: {manifest['count']} chunks x {manifest['dim']} {manifest['dtype']} "
+          f"in {time.perf_counter() - started:.1f}s -> {args.out}")
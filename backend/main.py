@@ -1,5 +1,13 @@
+from contextlib import asynccontextmanager
+import asyncio
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from core.executor import blocking_executor, start_workers
+from core.lazy import warm_up
+from core.metrics import MetricsMiddleware, registry
+from core.scheduler import ClientMiddleware
 from routers import dealsense
 from routers import askgtm
 from routers import outreachai
@@ -7,10 +15,29 @@ import uvicorn
 from dotenv import load_dotenv
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Route LangChain's sync fallbacks (e.g. Chroma searches) to the bounded pool
+    asyncio.get_running_loop().set_default_executor(blocking_executor)
+    start_workers()
+    
+    # Build agents in the background so the port opens immediately; GTM_WARMUP=off builds on first request
+    warm_up_task = None
+    if os.getenv("GTM_WARMUP", "on").lower() != "off":
+        warm_up_task = asyncio.create_task(warm_up(AGENTS))
+    
+    # DealSense background jobs, resuming any left unfinished by the previous process
+    await dealsense.job_queue.start()
+    yield
+    await dealsense.job_queue.stop()
+    if warm_up_task and not warm_up_task.done():
+        warm_up_task.cancel()
+
 app = FastAPI(
     title="GTM Synergy Suite API",
     description="AI-powered tools for GTM teams",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS
@@ -22,20 +49,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency and Server-Timing (GTM_TIMING_HEADERS=on); GTM_METRICS=off disables all recording
+app.add_middleware(MetricsMiddleware)
+
+# LLM calls are queued fairly per client: the X-Client-Id header, else the caller's address
+app.add_middleware(ClientMiddleware)
+
 # Include routers
 app.include_router(dealsense.router)
 app.include_router(askgtm.router)
 app.include_router(outreachai.router)
 
+AGENTS = [dealsense.dealsense_agent, askgtm.askgtm_agent, outreachai.outreach_agent]
+
 @app.get("/")
-def root():
+async def root():
+    """Liveness: the process is up and serving"""
     return {
         "message": "GTM Synergy Suite API",
         "status": "operational",
         "tools": ["DealSense AI", "AskGTM AI", "OutreachAI"]
     }
 
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once every agent is built, 503 while any is pending or failed"""
+    agents = {agent.name: agent.status() for agent in AGENTS}
+    ready = all(agent.ready for agent in AGENTS)
+    return JSONResponse({"ready": ready, "agents": agents}, status_code=200 if ready else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus exposition: stage latency, tokens, cost, cache hits and errors per endpoint"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
-    import os
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run("main:app", host="0.0.0.0", port=port, reload=False)
\ No newline at end of file
@@ -1,73 +1,108 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, field_validator
 from typing import List, Optional
-from agents.askgtm import AskGTMAgent
-import json
+from core.executor import run_blocking
+from core.facets import FACET_FIELDS, MetadataFilters
+from core.lazy import LazyAgent
+from core.streaming import STREAM_HEADERS, sse_event
 
 router = APIRouter(prefix="/askgtm", tags=["AskGTM"])
 
-# Initialize agent (singleton)
-agent = AskGTMAgent()
+def _build_agent():
+    # Imported here: opening Chroma (and seeding a fresh store) must not delay startup
+    from agents.askgtm import AskGTMAgent
+    return AskGTMAgent()
+
+# Shared agent, built on first use (or by the startup warm-up), not at import
+askgtm_agent = LazyAgent("askgtm", _build_agent)
 
 class QuestionRequest(BaseModel):
     question: str
+    session_id: Optional[str] = None
+    # Only search chunks with these metadata values, e.g. {"category": "product"} or {"source": ["pricing", "icp"]}
+    filters: Optional[MetadataFilters] = None
+    
+    @field_validator("filters")
+    @classmethod
+    def known_fields(cls, filters: Optional[MetadataFilters]) -> Optional[MetadataFilters]:
+        unknown = sorted(set(filters or {}) - set(FACET_FIELDS))
+        if unknown:
+            raise ValueError(f"Can only filter on {list(FACET_FIELDS)}, not {unknown}")
+        if any(value == [] for value in (filters or {}).values()):
+            raise ValueError("Filter value lists must not be empty")
+        return filters
 
 class AnswerResponse(BaseModel):
     answer: str
     sources: List[dict]
+    session_id: str
+    cached: bool = False
+
+class ResetRequest(BaseModel):
+    # Required: history is per session, so a reset without one would reset nothing
+    session_id: str
 
 class DocumentUpload(BaseModel):
     text: str
     metadata: Optional[dict] = None
 
 @router.post("/ask", response_model=AnswerResponse)
-async def ask_question(request: QuestionRequest):
+async def ask_question(request: QuestionRequest, agent=Depends(askgtm_agent)):
     """Ask a question to the GTM knowledge base"""
     try:
-        result = agent.ask(request.question)
+        result = await agent.ask_async(request.question, request.session_id, request.filters)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest, agent=Depends(askgtm_agent)):
+    """Ask a question and stream the answer as Server-Sent Events (sources, token..., done)"""
+    
+    async def events():
+        try:
+            async for event, data in agent.astream_ask(request.question, request.session_id, request.filters):
+                yield sse_event(event, data)
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=STREAM_HEADERS)
+
 @router.post("/reset")
-async def reset_conversation():
-    """Reset conversation history"""
+async def reset_conversation(request: ResetRequest, agent=Depends(askgtm_agent)):
+    """Reset conversation history for one session"""
     try:
-        agent.reset_conversation()
+        agent.reset_conversation(request.session_id)
         return {"message": "Conversation reset successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/add-document")
-async def add_document(doc: DocumentUpload):
+async def add_document(doc: DocumentUpload, agent=Depends(askgtm_agent)):
     """Add a new document to knowledge base"""
     try:
-        agent.add_documents([doc.text], [doc.metadata] if doc.metadata else None)
-        return {"message": "Document added successfully"}
+        report = await agent.add_documents_async([doc.text], [doc.metadata] if doc.metadata else None)
+        return {"message": "Document added successfully", "ingest": report.as_dict()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/upload-docs")
-async def upload_documents(file: UploadFile = File(...)):
-    """Upload multiple documents (JSON format)"""
+async def upload_documents(file: UploadFile = File(...), agent=Depends(askgtm_agent)):
+    """Upload multiple documents (JSON array or JSONL), parsed and ingested incrementally"""
     try:
-        contents = await file.read()
-        docs = json.loads(contents.decode('utf-8'))
-        
-        texts = [doc["content"] for doc in docs]
-        metadatas = [doc.get("metadata", {}) for doc in docs]
-        
-        agent.add_documents(texts, metadatas)
+        report = await agent.ingest_file(file.file)
         
-        return {"message": f"Added {len(docs)} documents successfully"}
+        return {"message": f"Added {report.documents} documents successfully", "ingest": report.as_dict()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/stats")
-async def get_stats():
+async def get_stats(agent=Depends(askgtm_agent)):
     """Get knowledge base statistics"""
     try:
-        stats = agent.get_stats()
+        # Off the event loop: in mmap mode it first catches up with other workers' writes
+        stats = await run_blocking(agent.get_stats)
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
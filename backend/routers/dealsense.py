@@ -1,16 +1,45 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
-import pandas as pd
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Path, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 import io
-from agents.dealsense import DealSenseAgent, DealScore
+import os
+import shutil
+import tempfile
+import time
+from agents.dealsense import PIPELINE_ID_PATTERN, DealSenseAgent, DealScore, PipelineStats
+from agents.dealsense_jobs import DealJobQueue, DealJobStore, JobQueueFull
+from core.executor import run_blocking
+from core.lazy import LazyAgent
+from core.scheduler import llm_lane
+from core.streaming import STREAM_HEADERS, ndjson_line, sse_event
 
 router = APIRouter(prefix="/dealsense", tags=["DealSense"])
 
-agent = DealSenseAgent()
+# Built on first use (or by the startup warm-up), not at import
+dealsense_agent = LazyAgent("dealsense", DealSenseAgent)
+
+REQUIRED_COLUMNS = ['company_name', 'deal_value', 'stage', 'days_in_pipeline']
+
+# Rows parsed per CSV chunk in streaming mode
+CSV_CHUNK_ROWS = int(os.getenv("DEALSENSE_CSV_CHUNK_ROWS", "500"))
+
+# Background jobs: jobs scored at once per process (0 = submit only), the cap on queued + running jobs,
+# the seconds a process's claim on a job lasts without renewal (after a crash, others take over once it runs out)
+# and the runs a job gets before it is marked failed
+job_queue = DealJobQueue(
+    dealsense_agent.aget,
+    DealJobStore(),
+    workers=int(os.getenv("DEALSENSE_JOB_WORKERS", "1")),
+    max_unfinished=int(os.getenv("DEALSENSE_JOB_QUEUE_DEPTH", "20")),
+    chunk_rows=CSV_CHUNK_ROWS,
+    lease=float(os.getenv("DEALSENSE_JOB_LEASE", "60")),
+    max_attempts=int(os.getenv("DEALSENSE_JOB_ATTEMPTS", "3"))
+)
 
 @router.post("/analyze-csv", response_model=List[DealScore])
-async def analyze_deals_csv(file: UploadFile = File(...)):
+async def analyze_deals_csv(response: Response, file: UploadFile = File(...), agent=Depends(dealsense_agent)):
     """Upload CSV of deals and get AI scoring"""
+    import pandas as pd
     
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="File must be CSV")
@@ -21,8 +50,7 @@ async def analyze_deals_csv(file: UploadFile = File(...)):
         df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
         
         # Validate required columns
-        required_cols = ['company_name', 'deal_value', 'stage', 'days_in_pipeline']
-        missing = [col for col in required_cols if col not in df.columns]
+        missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
         
         if missing:
             raise HTTPException(
@@ -30,19 +58,212 @@ async def analyze_deals_csv(file: UploadFile = File(...)):
                 detail=f"Missing required columns: {missing}"
             )
         
-        # Analyze pipeline
-        results = agent.analyze_pipeline(df)
+        # Analyze pipeline; bulk scoring queues behind interactive LLM calls
+        stats = PipelineStats()
+        with llm_lane("batch"):
+            results = await agent.analyze_pipeline_async(df, stats=stats)
+        _set_stats_headers(response, stats)
         
         return results
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/analyze-csv/stream")
+async def analyze_deals_csv_stream(
+    file: UploadFile = File(...),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+    agent=Depends(dealsense_agent)
+):
+    """Upload CSV of deals and stream each DealScore as soon as it is ready (NDJSON or SSE)"""
+    import pandas as pd
+    
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="File must be CSV")
+    
+    # FastAPI closes the upload once this handler returns, before the body
+    # streams, so spool it to our own temp file and parse it in chunks from there
+    spool = tempfile.TemporaryFile()
+    try:
+        await run_blocking(shutil.copyfileobj, file.file, spool)
+        spool.seek(0)
+        reader = pd.read_csv(spool, chunksize=CSV_CHUNK_ROWS)
+        first_chunk = await run_blocking(next, reader, None)
+    except Exception as e:
+        spool.close()
+        raise HTTPException(status_code=400, detail=f"Could not parse CSV: {e}")
+    
+    if first_chunk is None:
+        spool.close()
+        raise HTTPException(status_code=400, detail="CSV has no rows")
+    
+    missing = [col for col in REQUIRED_COLUMNS if col not in first_chunk.columns]
+    if missing:
+        spool.close()
+        raise HTTPException(status_code=400, detail=f"Missing required columns: {missing}")
+    
+    async def chunks():
+        offset = 0
+        chunk = first_chunk
+        while chunk is not None:
+            yield offset, chunk
+            offset += len(chunk)
+            chunk = await run_blocking(next, reader, None)
+    
+    encode = sse_event if format == "sse" else ndjson_line
+    
+    async def events():
+        started = time.perf_counter()
+        stats = PipelineStats()
+        summary = {"total": 0, "scored": 0, "failed": 0, "by_risk": {"Low": 0, "Medium": 0, "High": 0}}
+        try:
+            with llm_lane("batch"):
+                async for index, score, error in agent.stream_pipeline(chunks(), stats=stats):
+                    summary["total"] += 1
+                    if error is not None:
+                        summary["failed"] += 1
+                        yield encode("error", {"row": index, "detail": str(error)})
+                        continue
+                    summary["scored"] += 1
+                    summary["by_risk"][score.risk_level] = summary["by_risk"].get(score.risk_level, 0) + 1
+                    yield encode("deal", {"row": index, "deal": score.model_dump()})
+            
+            summary["cache"] = {"hits": stats.hits, "misses": stats.misses}
+            summary["escalated"] = stats.escalated
+            summary["escalated_fraction"] = stats.escalated_fraction
+            summary["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+            yield encode("summary", summary)
+        finally:
+            spool.close()
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type, headers=STREAM_HEADERS)
+
+@router.post("/jobs", status_code=202)
+async def submit_analysis_job(file: UploadFile = File(...)):
+    """Upload CSV of deals and get a job id right away; deals are scored in the background"""
+    import pandas as pd
+    
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="File must be CSV")
+    
+    try:
+        df = await run_blocking(pd.read_csv, file.file)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse CSV: {e}")
+    
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing required columns: {missing}")
+    
+    try:
+        job_id = await job_queue.submit(df.to_dict(orient="records"))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    
+    return {"job_id": job_id, "status": "queued", "total": len(df)}
+
+@router.get("/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    """Job status and how many deals are scored or failed so far"""
+    progress = await run_blocking(job_queue.store.progress, job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return progress
+
+@router.get("/jobs/{job_id}/results")
+async def get_analysis_job_results(
+    job_id: str,
+    after_row: int = Query(-1, ge=-1),
+    limit: int = Query(500, ge=1, le=5000)
+):
+    """A page of finished deals (partial while the job runs); pass next_after_row to get the next page"""
+    progress = await run_blocking(job_queue.store.progress, job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    
+    results = await run_blocking(job_queue.store.results, job_id, after_row, limit)
+    return {
+        "job_id": job_id,
+        "status": progress["status"],
+        "results": results,
+        "next_after_row": results[-1]["row"] if results else after_row
+    }
+
+# Last scored snapshot per pipeline (pandas/pyarrow load with the first pipeline request)
+_pipeline_snapshots = None
+
+def pipeline_snapshots():
+    global _pipeline_snapshots
+    if _pipeline_snapshots is None:
+        from agents.deal_snapshots import PipelineSnapshots
+        _pipeline_snapshots = PipelineSnapshots()
+    return _pipeline_snapshots
+
+PIPELINE_ID = Path(..., pattern=PIPELINE_ID_PATTERN)
+
+@router.post("/pipelines/{pipeline_id}/analyze-csv")
+async def analyze_pipeline_delta(
+    response: Response,
+    pipeline_id: str = PIPELINE_ID,
+    file: UploadFile = File(...),
+    agent=Depends(dealsense_agent)
+):
+    """Upload the full pipeline export; only deals that are new or changed since the last upload are re-scored"""
+    import pandas as pd
+    from agents.deal_snapshots import deal_ids
+    
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="File must be CSV")
+    
+    try:
+        df = await run_blocking(pd.read_csv, file.file)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse CSV: {e}")
+    
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing required columns: {missing}")
+    try:
+        deal_ids(df)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        stats = PipelineStats()
+        with llm_lane("batch"):
+            delta = await pipeline_snapshots().analyze(agent, pipeline_id, df, stats=stats)
+        _set_stats_headers(response, stats)
+        return delta
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/pipelines/{pipeline_id}")
+async def get_pipeline_scores(
+    pipeline_id: str = PIPELINE_ID,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1)
+):
+    """Current scores for every deal in the pipeline's last upload"""
+    result = await pipeline_snapshots().scores(pipeline_id, offset, limit)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unknown pipeline")
+    return result
+
 @router.post("/analyze-deal", response_model=DealScore)
-async def analyze_single_deal(deal: dict):
+async def analyze_single_deal(deal: dict, response: Response, agent=Depends(dealsense_agent)):
     """Analyze a single deal"""
     try:
-        result = agent.analyze_deal(deal)
+        # Single-deal requests always go to the LLM
+        stats = PipelineStats(deals=1, escalated=1)
+        result = await agent.analyze_deal_async(deal, stats)
+        _set_stats_headers(response, stats)
         return result
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _set_stats_headers(response: Response, stats: PipelineStats):
+    """Report score cache hits/misses and the LLM escalation rate for this request"""
+    response.headers["X-Cache-Hits"] = str(stats.hits)
+    response.headers["X-Cache-Misses"] = str(stats.misses)
+    response.headers["X-Escalated-Fraction"] = str(stats.escalated_fraction)
@@ -1,11 +1,31 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from typing import List, Optional
+import os
+import shutil
+import tempfile
+import uuid
 from agents.outreachai import OutreachAIAgent, OutreachRequest, OutreachResult
+from agents.outreach_campaign import CampaignStore, iter_campaign_rows, run_campaign
+from core.executor import run_blocking
+from core.lazy import LazyAgent
+from core.scheduler import llm_lane
+from core.streaming import STREAM_HEADERS, ndjson_line
 
 router = APIRouter(prefix="/outreachai", tags=["OutreachAI"])
 
-agent = OutreachAIAgent()
+# Built on first use (or by the startup warm-up), not at import
+outreach_agent = LazyAgent("outreachai", OutreachAIAgent)
+
+campaign_store = CampaignStore()
+
+# Campaign limits: prospects in flight, seconds per LLM attempt, retries on rate limits
+CAMPAIGN_CONCURRENCY = int(os.getenv("OUTREACH_CAMPAIGN_CONCURRENCY", "16"))
+CAMPAIGN_TIMEOUT = float(os.getenv("OUTREACH_TIMEOUT", "60"))
+CAMPAIGN_MAX_RETRIES = int(os.getenv("OUTREACH_MAX_RETRIES", "3"))
+
+CAMPAIGN_ID_PATTERN = "^[A-Za-z0-9_-]{1,64}$"
 
 class GenerateOutreachRequest(BaseModel):
     company_name: str
@@ -18,34 +38,34 @@ class GenerateOutreachRequest(BaseModel):
     channel: str = "email"
 
 class MultiVersionRequest(GenerateOutreachRequest):
-    versions_count: int = 3
+    versions_count: int = Field(3, ge=1, le=5)
 
 @router.post("/generate", response_model=OutreachResult)
-async def generate_outreach(request: GenerateOutreachRequest):
+async def generate_outreach(request: GenerateOutreachRequest, agent=Depends(outreach_agent)):
     """Generate personalized outreach message"""
     try:
         outreach_request = OutreachRequest(**request.dict())
-        result = agent.generate_outreach(outreach_request)
+        result = await agent.generate_outreach_async(outreach_request)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/generate-multiple", response_model=List[OutreachResult])
-async def generate_multiple_versions(request: MultiVersionRequest):
+async def generate_multiple_versions(request: MultiVersionRequest, agent=Depends(outreach_agent)):
     """Generate multiple versions for A/B testing"""
     try:
         outreach_request = OutreachRequest(**request.dict(exclude={'versions_count'}))
-        results = agent.generate_multiple_versions(outreach_request, request.versions_count)
+        results = await agent.generate_multiple_versions_async(outreach_request, request.versions_count)
         return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/generate-debug")
-async def generate_outreach_debug(request: GenerateOutreachRequest):
+async def generate_outreach_debug(request: GenerateOutreachRequest, agent=Depends(outreach_agent)):
     """Debug version that shows raw output"""
     try:
         outreach_request = OutreachRequest(**request.dict())
-        result = agent.generate_outreach(outreach_request)
+        result = await agent.generate_outreach_async(outreach_request)
         
         # Return both raw result and parsed result
         return {
@@ -59,6 +79,93 @@ async def generate_outreach_debug(request: GenerateOutreachRequest):
             "traceback": traceback.format_exc()
         }
 
+@router.post("/campaigns")
+async def run_outreach_campaign(
+    file: UploadFile = File(...),
+    campaign_id: Optional[str] = Query(None, pattern=CAMPAIGN_ID_PATTERN),
+    agent=Depends(outreach_agent)
+):
+    """Upload a CSV/JSONL of prospects and stream each OutreachResult as NDJSON.
+    
+    Pass the same campaign_id again (e.g. after a crash) to resume; rows that
+    already completed are skipped.
+    """
+    name = file.filename.lower()
+    if name.endswith(".csv"):
+        fmt = "csv"
+    elif name.endswith((".jsonl", ".ndjson")):
+        fmt = "jsonl"
+    else:
+        raise HTTPException(status_code=400, detail="File must be CSV or JSONL")
+    
+    # The upload is closed before the body streams; keep our own copy
+    spool = tempfile.TemporaryFile()
+    try:
+        await run_blocking(shutil.copyfileobj, file.file, spool)
+        spool.seek(0)
+        reader = iter_campaign_rows(spool, fmt)
+        first_chunk = await run_blocking(next, reader, None)
+    except Exception as e:
+        spool.close()
+        raise HTTPException(status_code=400, detail=f"Could not parse {fmt.upper()}: {e}")
+    
+    if first_chunk is None:
+        spool.close()
+        raise HTTPException(status_code=400, detail="Campaign file has no rows")
+    
+    async def rows():
+        chunk = first_chunk
+        while chunk is not None:
+            for row in chunk:
+                yield row
+            chunk = await run_blocking(next, reader, None)
+    
+    campaign_id = campaign_id or uuid.uuid4().hex
+    
+    async def events():
+        try:
+            # Campaign generations queue behind interactive LLM calls, fairly with other campaigns
+            with llm_lane("batch", client=f"campaign:{campaign_id}"):
+                async for event, data in run_campaign(
+                    agent, rows(), campaign_store, campaign_id,
+                    concurrency=CAMPAIGN_CONCURRENCY, timeout=CAMPAIGN_TIMEOUT, max_retries=CAMPAIGN_MAX_RETRIES
+                ):
+                    yield ndjson_line(event, data)
+        finally:
+            spool.close()
+    
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={**STREAM_HEADERS, "X-Campaign-Id": campaign_id}
+    )
+
+@router.get("/campaigns/{campaign_id}")
+async def get_campaign_progress(campaign_id: str):
+    """How many rows of a campaign have completed"""
+    progress = await run_blocking(campaign_store.progress, campaign_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Unknown campaign")
+    return progress
+
+@router.get("/campaigns/{campaign_id}/results")
+async def get_campaign_results(campaign_id: str):
+    """Stream every stored result of a campaign as NDJSON, in row order"""
+    if await run_blocking(campaign_store.progress, campaign_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown campaign")
+    
+    async def events():
+        after_row = -1
+        while True:
+            page = await run_blocking(campaign_store.results, campaign_id, after_row)
+            if not page:
+                return
+            for row, result in page:
+                yield ndjson_line("result", {"row": row, "result": result})
+            after_row = page[-1][0]
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson", headers=STREAM_HEADERS)
+
 @router.get("/channels")
 async def get_supported_channels():
     """Get list of supported outreach channels"""
@@ -18,6 +18,7 @@ export default function AskGTMPage() {
     const [messages, setMessages] = useState<Message[]>([])
     const [input, setInput] = useState('')
     const [loading, setLoading] = useState(false)
+    const [sessionId, setSessionId] = useState<string | null>(null)
     // eslint-disable-next-line @typescript-eslint/no-explicit-any
     const [stats, setStats] = useState<any>(null)
     const messagesEndRef = useRef<HTMLDivElement>(null)
@@ -56,10 +57,11 @@ export default function AskGTMPage() {
             const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/askgtm/ask`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ question: input }),
+                body: JSON.stringify({ question: input, session_id: sessionId }),
             })
 
             const data = await res.json()
+            setSessionId(data.session_id)
 
             const assistantMessage: Message = {
                 role: 'assistant',
@@ -82,9 +84,15 @@ export default function AskGTMPage() {
 
     const handleReset = async () => {
         try {
-            await fetch(`${process.env.NEXT_PUBLIC_API_URL}/askgtm/reset`, {
-                method: 'POST',
-            })
+            // Nothing to reset before the first answer has assigned a session
+            if (sessionId) {
+                await fetch(`${process.env.NEXT_PUBLIC_API_URL}/askgtm/reset`, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ session_id: sessionId }),
+                })
+            }
+            setSessionId(null)
             setMessages([])
         } catch (error) {
             console.error('Error resetting:', error)